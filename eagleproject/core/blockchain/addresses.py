@@ -98,6 +98,8 @@ ONE_INCH_V3 = "0x11111112542d85b3ef69ae05771c2dccff4faa26"
 SUSHISWAP = "0xd9e1ce17f2641f24ae83637ab66a2cca9c378b9f"
 UNISWAP_V2 = "0x7a250d5630b4cf539739df2c5dacb4c659f2488d"
 MISTX_ROUTER = "0xa58f22e0766b3764376c92915ba545d583c19dbc"
+MULTICALL = "0xeefba1e63905ef1d7acba5a8513c70307c1ce441"
+MULTICALL2 = "0x5ba1e12693dc8f9c48aad8770482f4739beed696"
 
 # Curve Governance
 
@@ -0,0 +1,305 @@
+""" asyncio JSON-RPC and Etherscan client
+
+Keeps many requests in flight from a single worker, bounded by a semaphore.
+Retries follow the same rules as core.transport.
+
+Usage:
+
+    async with AsyncRPCClient() as client:
+        txs = await asyncio.gather(*[
+            client.get_transaction(tx_hash) for tx_hash in tx_hashes
+        ])
+
+JSON-RPC requests pick a provider each and fail over between providers
+like core.blockchain.providers.post().  A provider URL can be given
+explicitly instead, e.g. to run against a local mock JSON-RPC server.
+"""
+import os
+import json
+import time
+import asyncio
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core import cassette, metrics, transport
+from core.blockchain import providers
+from core.blockchain.rpc import TooManyResults
+from core.etherscan import ETHERSCAN_ENDPOINT, is_empty, throttle
+from core.logging import get_logger
+
+log = get_logger(__name__)
+
+# Max concurrent requests per client
+ASYNC_CONCURRENCY = int(os.environ.get("RPC_ASYNC_CONCURRENCY", 200))
+
+
+class AsyncRPCError(Exception):
+    """ A request failed or was refused """
+    pass
+
+
+class AsyncTransportError(AsyncRPCError):
+    """ A request failed after exhausting all retries """
+    pass
+
+
+class AsyncRPCClient:
+    def __init__(
+            self,
+            url=None,
+            concurrency=ASYNC_CONCURRENCY,
+            etherscan_url=ETHERSCAN_ENDPOINT,
+            etherscan_api_key=None):
+        self.url = url
+
+        self.concurrency = concurrency
+        self.etherscan_url = etherscan_url
+        self.etherscan_api_key = (
+            etherscan_api_key or settings.ETHERSCAN_API_KEY or ""
+        )
+        self.semaphore = None
+        self.session = None
+        self.request_id = 0
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=transport.CONNECT_TIMEOUT,
+                sock_read=transport.READ_TIMEOUT,
+            ),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def send(self, method, url, max_retries=None, **kwargs):
+        """ Send an HTTP request and return the decoded JSON body, retrying
+        like core.transport.send()
+        """
+        if max_retries is None:
+            max_retries = transport.MAX_RETRIES
+
+        if cassette.MODE == cassette.REPLAY:
+            status, body = cassette.replay(
+                self.cassette_key(method, url, kwargs)
+            )
+            if cassette.LATENCY:
+                await asyncio.sleep(cassette.LATENCY)
+            if status != 200:
+                raise AsyncRPCError("{} {} failed ({})".format(
+                    method,
+                    transport.host(url),
+                    status,
+                ))
+            return json.loads(body)
+
+        attempt = 0
+
+        while True:
+            status = None
+            data = None
+            retry_after = None
+            error = None
+
+            async with self.semaphore:
+                try:
+                    async with self.session.request(
+                        method,
+                        url,
+                        **kwargs
+                    ) as response:
+                        status = response.status
+                        retry_after = response.headers.get("Retry-After")
+                        if status == 200:
+                            body = await response.text()
+                            data = json.loads(body)
+
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    error = err
+
+            if status == 200 and not transport.is_rate_limited(data):
+                if cassette.MODE == cassette.RECORD:
+                    cassette.record(
+                        self.cassette_key(method, url, kwargs),
+                        status,
+                        body
+                    )
+                return data
+
+            if (
+                error is None
+                and status != 200
+                and status < 500
+                and status not in transport.RETRY_STATUS_CODES
+            ):
+                raise AsyncRPCError("{} {} failed ({})".format(
+                    method,
+                    transport.host(url),
+                    status,
+                ))
+
+            if attempt >= max_retries:
+                raise AsyncTransportError(
+                    "{} {} failed after {} retries: {}".format(
+                        method,
+                        transport.host(url),
+                        attempt,
+                        error or status,
+                    )
+                )
+
+            delay = transport.backoff_delay(attempt, retry_after)
+
+            log.warning("Retrying {} {} in {:.2f}s ({})".format(
+                method,
+                transport.host(url),
+                delay,
+                error or status,
+            ))
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def cassette_key(self, method, url, kwargs):
+        return cassette.request_key(
+            method,
+            url,
+            kwargs.get("params"),
+            kwargs.get("json"),
+        )
+
+    async def post(self, payload, archive=False):
+        """ Send a JSON-RPC payload, failing over between providers """
+        if self.url is not None:
+            return await self.send("POST", self.url, json=payload)
+
+        providers.check_health()
+
+        tried = []
+
+        while True:
+            provider = providers.select(archive=archive, exclude=tried)
+            tried.append(provider)
+            last = not providers.candidates(archive, tried)
+
+            # Waits in the same priority queue as synchronous requests, so
+            # harvesting can't starve page loads
+            await provider.bucket.acquire_async()
+
+            provider.start_request()
+            start = time.time()
+
+            try:
+                # Only keep retrying a provider when there's nowhere else
+                # to go
+                data = await self.send(
+                    "POST",
+                    provider.url,
+                    max_retries=None if last else 0,
+                    json=payload
+                )
+
+            except AsyncTransportError:
+                provider.record_failure()
+                if last:
+                    raise
+                continue
+
+            finally:
+                provider.end_request()
+
+            provider.record_success(time.time() - start)
+            return data
+
+    async def request(self, method, params):
+        self.request_id += 1
+        start = time.time()
+        data = await self.post({
+            "jsonrpc": "2.0",
+            "id": self.request_id,
+            "method": method,
+            "params": params,
+        }, archive=providers.needs_archive(method, params))
+        metrics.record_rpc(
+            [(method, params)],
+            time.time() - start,
+            errors=1 if "error" in data else 0
+        )
+        return data
+
+    async def call(self, method, params):
+        """ Make a JSON-RPC request and return its result, raising
+        AsyncRPCError if the provider returned an error
+        """
+        data = await self.request(method, params)
+
+        if "error" in data:
+            raise AsyncRPCError("{} failed: {}".format(method, data["error"]))
+
+        return data.get("result")
+
+    async def get_transaction(self, tx_hash):
+        return await self.call("eth_getTransactionByHash", [tx_hash])
+
+    async def get_transaction_receipt(self, tx_hash):
+        return await self.call("eth_getTransactionReceipt", [tx_hash])
+
+    async def debug_trace_transaction(self, tx_hash):
+        data = await self.request("trace_transaction", [tx_hash])
+        return data.get("result", {})
+
+    async def get_block(self, block_number):
+        return await self.call(
+            "eth_getBlockByNumber",
+            [hex(block_number), False]
+        )
+
+    async def get_logs(self, address, start_block, end_block):
+        """ Logs of contracts in a block range.  Raises TooManyResults like
+        rpc.get_logs() when the provider refuses the range.
+        """
+        data = await self.request("eth_getLogs", [{
+            "fromBlock": hex(start_block),
+            "toBlock": hex(end_block),
+            "address": address,
+        }])
+
+        if "error" in data:
+            if transport.is_result_limit(data):
+                raise TooManyResults(data["error"].get("message"))
+            raise AsyncRPCError("eth_getLogs failed: {}".format(
+                data["error"]
+            ))
+
+        return data["result"]
+
+    async def get_internal_transactions(self, tx_hash):
+        """ Etherscan txlistinternal for a transaction, or None if Etherscan
+        returned an error
+        """
+        # Shares the Etherscan rate limit with the synchronous client
+        await sync_to_async(throttle, thread_sensitive=False)()
+        data = await self.send("GET", self.etherscan_url, params={
+            "module": "account",
+            "action": "txlistinternal",
+            "txhash": tx_hash,
+            "apikey": self.etherscan_api_key,
+        })
+
+        if is_empty(data):
+            return []
+
+        if data.get("status") != "1":
+            log.warning(
+                "Unexpected internal transactions response for {}: {}".format(
+                    tx_hash,
+                    data.get("result") or data.get("message")
+                )
+            )
+            return None
+
+        return data.get("result")
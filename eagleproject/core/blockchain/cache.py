@@ -0,0 +1,253 @@
+""" Cache for eth_call and eth_getStorageAt results at fixed blocks
+
+State at a given block number never changes, so responses for requests
+pinned to a numeric block can be kept forever.  Requests against "latest" (or
+any other tag) are never cached.
+
+There are two tiers.  An in-process LRU, and the CallCache table shared
+between processes, which is trimmed to a max number of rows.
+
+When a reorg is rolled back, its Rollback row tells every process to drop its
+in-memory caches (see check_generation()), since they may hold results from
+blocks that are no longer part of the chain.  Processes look for new
+Rollback rows at most every RPC_CACHE_ROLLBACK_INTERVAL seconds, so memory
+hits don't cost a query.
+
+Configuration (environment variables):
+
+ - RPC_CACHE_ENABLED - Set to "false" to disable caching (default: true)
+ - RPC_CACHE_MEMORY_SIZE - Max entries in the in-process LRU (default: 20000)
+ - RPC_CACHE_MAX_ROWS - Max rows in the CallCache table (default: 1000000)
+ - RPC_CACHE_ROLLBACK_INTERVAL - Seconds between checks for reorgs rolled
+   back by other processes (default: 5)
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from django.db import DatabaseError
+
+from core import metrics
+from core.logging import get_logger
+from core.models import CallCache, Rollback
+
+log = get_logger(__name__)
+
+ENABLED = os.environ.get("RPC_CACHE_ENABLED", "true").lower() != "false"
+MEMORY_SIZE = int(os.environ.get("RPC_CACHE_MEMORY_SIZE", 20000))
+MAX_ROWS = int(os.environ.get("RPC_CACHE_MAX_ROWS", 1000000))
+ROLLBACK_INTERVAL = float(os.environ.get("RPC_CACHE_ROLLBACK_INTERVAL", 5))
+
+# How many rows to write between checks of the table size
+EVICT_INTERVAL = 1000
+
+CACHEABLE_METHODS = ("eth_call", "eth_getStorageAt")
+
+
+class LRU:
+    """ Thread-safe bounded mapping that drops the least recently used key """
+
+    # Every LRU in the process, for check_generation()
+    instances = weakref.WeakSet()
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        LRU.instances.add(self)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                return None
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+memory = LRU(MEMORY_SIZE)
+_writes_since_evict = 0
+# Latest Rollback id this process has seen
+_generation = None
+_generation_checked = None
+
+
+def check_generation(force=False):
+    """ Clear every in-memory cache of the process if a reorg was rolled back
+    since the last check, by this or any other process.  Only checks once per
+    ROLLBACK_INTERVAL unless forced.
+    """
+    global _generation, _generation_checked
+
+    now = time.monotonic()
+
+    if not force and _generation_checked is not None and (
+        now - _generation_checked < ROLLBACK_INTERVAL
+    ):
+        return
+
+    _generation_checked = now
+
+    try:
+        latest = (
+            Rollback.objects.order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+        )
+    except DatabaseError:
+        log.exception("Failed to check for reorg rollbacks")
+        return
+
+    if latest == _generation:
+        return
+
+    for lru in list(LRU.instances):
+        lru.clear()
+
+    _generation = latest
+
+
+def block_of(method, params):
+    """ Get the block number a request is pinned to, or None if it isn't
+    cacheable
+    """
+    if not ENABLED or method not in CACHEABLE_METHODS:
+        return None
+
+    tag = params[-1]
+
+    if not isinstance(tag, str) or not tag.startswith("0x"):
+        return None
+
+    return int(tag, 16)
+
+
+def cache_key(method, params):
+    """ Content address of a request """
+    return hashlib.sha256(
+        json.dumps([method, params], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def lookup_many(requests):
+    """ Look up cached results for a list of (method, params).  Returns a list
+    of result strings, with None where there is no cached result.
+    """
+    results = [None] * len(requests)
+    missing = {}
+
+    if any(block_of(method, params) is not None for method, params in requests):
+        check_generation()
+
+    for i, (method, params) in enumerate(requests):
+        if block_of(method, params) is None:
+            continue
+
+        key = cache_key(method, params)
+        result = memory.get(key)
+
+        if result is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            results[i] = result
+
+    if missing:
+        try:
+            for key, result in CallCache.objects.filter(
+                key__in=list(missing.keys())
+            ).values_list("key", "result"):
+                memory.set(key, result)
+                for i in missing[key]:
+                    results[i] = result
+
+        except DatabaseError:
+            log.exception("Failed to read from the call cache")
+
+    for method in set(x[0] for x in requests):
+        metrics.record_cache_hits(method, len([
+            x for x, result in zip(requests, results)
+            if x[0] == method and result is not None
+        ]))
+
+    return results
+
+
+def store_many(requests, responses):
+    """ Store successful responses for a list of (method, params) """
+    global _writes_since_evict
+
+    rows = {}
+
+    for (method, params), response in zip(requests, responses):
+        block_number = block_of(method, params)
+
+        if (
+            block_number is None
+            or "error" in response
+            or response.get("result") is None
+        ):
+            continue
+
+        key = cache_key(method, params)
+        memory.set(key, response["result"])
+        rows[key] = CallCache(
+            key=key,
+            block_number=block_number,
+            result=response["result"],
+        )
+
+    if not rows:
+        return
+
+    try:
+        CallCache.objects.bulk_create(rows.values(), ignore_conflicts=True)
+
+        _writes_since_evict += len(rows)
+        if _writes_since_evict >= EVICT_INTERVAL:
+            _writes_since_evict = 0
+            evict()
+
+    except DatabaseError:
+        log.exception("Failed to write to the call cache")
+
+
+def lookup(method, params):
+    """ Get a cached response for a request, or None """
+    result = lookup_many([(method, params)])[0]
+    if result is None:
+        return None
+    return {"result": result}
+
+
+def store(method, params, response):
+    """ Cache the response of a request if possible """
+    store_many([(method, params)], [response])
+
+
+def evict():
+    """ Trim the CallCache table down to MAX_ROWS, oldest first """
+    cutoff = (
+        CallCache.objects.order_by("-created")
+        .values_list("created", flat=True)[MAX_ROWS:MAX_ROWS + 1]
+    )
+
+    if cutoff:
+        deleted, _ = CallCache.objects.filter(created__lte=cutoff[0]).delete()
+        log.info("Evicted {} rows from the call cache".format(deleted))
@@ -0,0 +1,144 @@
+""" Compiled eth_call plans
+
+A CallPlan parses a function signature once, keeping the selector and an
+argument encoder, so repeated calls don't hash the signature or parse the
+types again.  Common static argument types are encoded directly without
+going through eth_abi.
+
+Decoders for common return values are built once per scale and reused.
+"""
+import re
+from decimal import Decimal
+from functools import lru_cache
+from eth_abi import encode_single
+from eth_hash.auto import keccak
+from eth_utils import encode_hex, is_checksum_address, remove_0x_prefix
+
+from core.blockchain.const import TRUE_256BIT
+from core.blockchain.decode import SIG_PATTERN
+
+MAX_UINT256 = 2 ** 256 - 1
+
+HEX_ADDRESS = re.compile(r"^(0x)?[0-9a-fA-F]{40}$")
+
+
+def encode_address(value):
+    if not isinstance(value, str) or not HEX_ADDRESS.match(value):
+        raise ValueError("Invalid address: {}".format(value))
+
+    address = remove_0x_prefix(value)
+
+    # Like eth_abi, mixed case is only accepted as a valid checksum
+    if address not in (address.lower(), address.upper()) and (
+        not is_checksum_address("0x" + address)
+    ):
+        raise ValueError("Invalid address checksum: {}".format(value))
+
+    return address.lower().rjust(64, "0")
+
+
+def encode_uint256(value):
+    # bool is an int, but eth_abi doesn't take it as one
+    if (
+        not isinstance(value, int)
+        or isinstance(value, bool)
+        or value < 0
+        or value > MAX_UINT256
+    ):
+        raise ValueError("Invalid uint256: {}".format(value))
+    return format(value, "064x")
+
+
+def encode_bool(value):
+    if not isinstance(value, bool):
+        raise ValueError("Invalid bool: {}".format(value))
+    return format(int(value), "064x")
+
+
+STATIC_ENCODERS = {
+    "address": encode_address,
+    "uint256": encode_uint256,
+    "bool": encode_bool,
+}
+
+
+class CallPlan:
+    """ Selector and argument encoder for a function signature, e.g.
+    "balanceOf(address)"
+    """
+
+    def __init__(self, signature):
+        match = re.match(SIG_PATTERN, signature)
+
+        if not match:
+            raise ValueError("Invalid signature: {}".format(signature))
+
+        self.signature = signature
+        self.selector = encode_hex(keccak(signature.encode("utf-8")))[:10]
+
+        types_string = match.groups()[1]
+        self.types = [
+            x.strip() for x in types_string.split(",")
+        ] if types_string else []
+        self.arg_sig = "({})".format(",".join(self.types))
+
+        if all(x in STATIC_ENCODERS for x in self.types):
+            self.encoders = [STATIC_ENCODERS[x] for x in self.types]
+        else:
+            self.encoders = None
+
+    def __repr__(self):
+        return "<CallPlan {}>".format(self.signature)
+
+    def encode(self, args):
+        """ Encode call arguments as a hex payload (without selector) """
+        assert len(self.types) == len(args), "args do not match signature"
+
+        if not self.types:
+            return ""
+
+        if self.encoders is not None:
+            try:
+                return "".join(
+                    encode(arg) for encode, arg in zip(self.encoders, args)
+                )
+            except ValueError:
+                # Let eth_abi handle conversion or raise a proper error
+                pass
+
+        return encode_single(self.arg_sig, args).hex()
+
+
+@lru_cache(maxsize=None)
+def call_plan(signature):
+    """ Get the compiled plan for a signature """
+    return CallPlan(signature)
+
+
+@lru_cache(maxsize=None)
+def scaled_decoder(decimals, slot=0):
+    """ Get a decoder for a 256bit slot of a response scaled down by the given
+    decimals
+    """
+    scale = Decimal(10 ** decimals)
+    start = 2 + slot * 64
+    end = start + 64
+
+    def decode(data):
+        return Decimal(int(data["result"][start:end], 16)) / scale
+
+    return decode
+
+
+def decode_uint(data):
+    """ Decode the first slot of a response as an int """
+    return int(data["result"][2:66], 16)
+
+
+def decode_address(data):
+    """ Decode the first slot of a response as an address """
+    return "0x" + data["result"][26:66].lower()
+
+
+def decode_bool(data):
+    return data["result"] == TRUE_256BIT
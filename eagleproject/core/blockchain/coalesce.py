@@ -0,0 +1,101 @@
+""" Coalescing of concurrent identical RPC requests
+
+When several threads make the same request at the same time, only the first
+one goes to the provider and the others wait for and share its response.
+Successful responses to requests against "latest" are also reused for a short
+freshness window, since the chain only moves every few seconds.
+
+Configuration (environment variables):
+
+ - RPC_LATEST_TTL - Seconds to reuse responses for "latest" (default: 2)
+"""
+import os
+import json
+import time
+import threading
+
+from core.blockchain.cache import LRU
+
+LATEST_TTL = float(os.environ.get("RPC_LATEST_TTL", 2))
+
+_lock = threading.Lock()
+_in_flight = {}
+_recent = LRU(1000)
+
+
+class Flight:
+    """ A request in progress """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+def request_key(method, params):
+    return json.dumps([method, params], sort_keys=True)
+
+
+def is_latest(params):
+    return bool(params) and params[-1] == "latest"
+
+
+def recent(method, params):
+    """ Get a response to a "latest" request still within the freshness
+    window, or None
+    """
+    if not LATEST_TTL or not is_latest(params):
+        return None
+
+    entry = _recent.get(request_key(method, params))
+
+    if entry is None or entry[0] < time.time():
+        return None
+
+    return entry[1]
+
+
+def remember(method, params, response):
+    """ Keep a response to a "latest" request for the freshness window """
+    if LATEST_TTL and is_latest(params) and "error" not in response:
+        _recent.set(
+            request_key(method, params),
+            (time.time() + LATEST_TTL, response)
+        )
+
+
+def do(method, params, fetch):
+    """ Get the response of a request with fetch(), sharing it with any
+    identical concurrent requests
+    """
+    response = recent(method, params)
+    if response is not None:
+        return response
+
+    key = request_key(method, params)
+
+    with _lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.response
+
+    try:
+        flight.response = fetch()
+        remember(method, params, flight.response)
+        return flight.response
+
+    except Exception as err:
+        flight.error = err
+        raise
+
+    finally:
+        with _lock:
+            del _in_flight[key]
+        flight.done.set()
@@ -39,6 +39,9 @@ START_OF_EVERYTHING_TIME = datetime.strptime("18-9-2020", "%d-%m-%Y")
 START_OF_CURVE_CAMPAIGN_TIME = datetime.strptime("11-11-2021", "%d-%m-%Y")
 START_OF_OUSD_V2 = 11596940
 START_OF_OUSD_V2_TIME = datetime.strptime("29-12-2020", "%d-%m-%Y")
+# Deployment blocks of Multicall (aggregate) and Multicall2 (tryAggregate)
+START_OF_MULTICALL = 7929876
+START_OF_MULTICALL2 = 12336033
 
 CONTRACT_FOR_SYMBOL = {
     "DAI": DAI,
@@ -0,0 +1,419 @@
+""" Decoded events
+
+Logs of the events in core.blockchain.sigs are decoded once when they're
+stored.  Log.event_name gets the event's name and Log.args its arguments by
+name, so readers can use the values directly:
+
+    Log.objects.filter(topic_0=SIG_EVENT_MINT, args__addr=account)
+    log.args["value"]
+
+Argument names are the ones from the contract ABIs in snake_case.  Integers
+and bools are stored as they are, bytes as 0x-prefixed hex and arrays as
+lists.  Logs of unknown events are left with an empty event_name.  Logs that
+don't match their event's ABI (e.g. the same signature with different
+indexed arguments) get the event name and empty args, so they aren't tried
+again.
+
+Logs stored before decoding was added can be decoded with the decode_logs
+management command.  Until then, args_of() decodes them on the fly.
+"""
+import re
+from collections import namedtuple
+
+from eth_abi import decode_single
+from eth_utils import decode_hex, encode_hex
+
+from core.blockchain import sigs
+from core.logging import get_logger
+from core.models import Log
+
+log = get_logger(__name__)
+
+Event = namedtuple("Event", ["name", "params"])
+Param = namedtuple("Param", ["name", "type", "indexed"])
+
+EVENT_PATTERN = r"^([A-Za-z_0-9]+)\((.*)\)$"
+
+# Topic 0 to event declaration
+DECLARATIONS = {
+    # Chainlink KeeperRegistry
+    sigs.EVENT_KEEPER_UPKEEP_PERFORMED: (
+        "UpkeepPerformed(uint256 indexed id, bool indexed success, "
+        "address indexed from, uint96 payment, bytes perform_data)"
+    ),
+    sigs.EVENT_KEEPER_UPKEEP_CANCELLED: (
+        "UpkeepCanceled(uint256 indexed id, uint64 indexed at_block_height)"
+    ),
+    sigs.EVENT_KEEPER_FUNDS_ADDED: (
+        "FundsAdded(uint256 indexed id, address indexed from, uint96 amount)"
+    ),
+    sigs.EVENT_KEEPER_FUNDS_WITHDRAWN: (
+        "FundsWithdrawn(uint256 indexed id, uint256 amount, address to)"
+    ),
+    # ERC20
+    sigs.TRANSFER: (
+        "Transfer(address indexed from, address indexed to, uint256 value)"
+    ),
+    # OGN Staking
+    sigs.SIG_EVENT_STAKED: (
+        "Staked(address indexed user, uint256 amount, uint256 duration, "
+        "uint256 rate)"
+    ),
+    sigs.SIG_EVENT_WITHDRAWN: (
+        "Withdrawn(address indexed user, uint256 amount, "
+        "uint256 staked_amount)"
+    ),
+    sigs.DEPRECATED_SIG_EVENT_STAKED: (
+        "Staked(address indexed user, uint256 amount)"
+    ),
+    sigs.DEPRECATED_SIG_EVENT_WITHDRAWN: (
+        "Withdrawn(address indexed user, uint256 amount)"
+    ),
+    sigs.SIG_EVENT_STAKING_PAUSED: "Paused(address indexed user, bool yes)",
+    sigs.SIG_EVENT_NEW_DURATIONS: (
+        "NewDurations(address indexed user, uint256[] durations)"
+    ),
+    sigs.SIG_EVENT_NEW_RATES: "NewRates(address indexed user, uint256[] rates)",
+    # OUSD
+    sigs.SIG_EVENT_TOTAL_SUPPLY_UPDATED: (
+        "TotalSupplyUpdated(uint256 total_supply, uint256 rebasing_credits, "
+        "uint256 rebasing_credits_per_token)"
+    ),
+    sigs.SIG_EVENT_TOTAL_SUPPLY_UPDATED_HIRES: (
+        "TotalSupplyUpdatedHighres(uint256 total_supply, "
+        "uint256 rebasing_credits, uint256 rebasing_credits_per_token)"
+    ),
+    # Vault
+    sigs.SIG_EVENT_MINT: "Mint(address addr, uint256 value)",
+    sigs.SIG_EVENT_REDEEM: "Redeem(address addr, uint256 value)",
+    sigs.SIG_EVENT_CAPITAL_PAUSED: "CapitalPaused()",
+    sigs.SIG_EVENT_CAPITAL_UNPAUSED: "CapitalUnpaused()",
+    sigs.SIG_EVENT_REBASE_PAUSED: "RebasePaused()",
+    sigs.SIG_EVENT_REBASE_UNPAUSED: "RebaseUnpaused()",
+    sigs.SIG_EVENT_STRATEGY_ADDED: "StrategyAdded(address addr)",
+    sigs.SIG_EVENT_STRATEGY_REMOVED: "StrategyRemoved(address addr)",
+    sigs.SIG_EVENT_WEIGHTS_UPDATED: (
+        "StrategyWeightsUpdated(address[] assets, uint256[] weights)"
+    ),
+    sigs.SIG_EVENT_ASSET_SUPPORTED: "AssetSupported(address asset)",
+    sigs.SIG_EVENT_BUFFER_UPDATE: "VaultBufferUpdated(uint256 vault_buffer)",
+    sigs.SIG_EVENT_REDEEM_FEE: "RedeemFeeUpdated(uint256 redeem_fee_bps)",
+    sigs.SIG_EVENT_PRICE_PROVIDER: (
+        "PriceProviderUpdated(address price_provider)"
+    ),
+    sigs.SIG_EVENT_ALLOCATE_THRESHOLD: (
+        "AllocateThresholdUpdated(uint256 threshold)"
+    ),
+    sigs.SIG_EVENT_REBASE_THRESHOLD: (
+        "RebaseThresholdUpdated(uint256 threshold)"
+    ),
+    sigs.SIG_EVENT_UNISWAP: "UniswapUpdated(address addr)",
+    sigs.SIG_EVENT_STRATEGIST: "StrategistUpdated(address addr)",
+    sigs.SIG_EVENT_MAX_SUPPLY_DIFF: (
+        "MaxSupplyDiffChanged(uint256 max_supply_diff)"
+    ),
+    sigs.SIG_EVENT_DEFAULT_STRATEGY: (
+        "AssetDefaultStrategyUpdated(address asset, address strategy)"
+    ),
+    sigs.SIG_EVENT_STRATEGY_APPROVED: "StrategyApproved(address addr)",
+    sigs.SIG_EVENT_YIELD_DISTRIBUTION: (
+        "YieldDistribution(address to, uint256 yield, uint256 fee)"
+    ),
+    sigs.SIG_EVENT_TRUSTEE_FEE_CHANGED: "TrusteeFeeBpsChanged(uint256 bps)",
+    sigs.SIG_EVENT_TRUSTEE_ADDRESS_CHANGED: (
+        "TrusteeAddressChanged(address addr)"
+    ),
+    # Governable
+    sigs.SIG_EVENT_PENDING_TRANSFER: (
+        "PendingGovernorshipTransfer(address indexed previous_governor, "
+        "address indexed new_governor)"
+    ),
+    sigs.SIG_EVENT_TRANSFER: (
+        "GovernorshipTransferred(address indexed previous_governor, "
+        "address indexed new_governor)"
+    ),
+    # Proxy
+    sigs.SIG_EVENT_UPGRADED: "Upgraded(address indexed implementation)",
+    # Timelock
+    sigs.SIG_EVENT_NEW_ADMIN: "NewAdmin(address indexed new_admin)",
+    sigs.SIG_EVENT_NEW_PENDING_ADMIN: (
+        "NewPendingAdmin(address indexed new_pending_admin)"
+    ),
+    sigs.SIG_EVENT_DELAY: "NewDelay(uint256 indexed new_delay)",
+    # Strategy
+    sigs.SIG_EVENT_DEPOSIT: (
+        "Deposit(address indexed asset, address p_token, uint256 amount)"
+    ),
+    sigs.SIG_EVENT_WITHDRAWAL: (
+        "Withdrawal(address indexed asset, address p_token, uint256 amount)"
+    ),
+    sigs.SIG_EVENT_PTOKEN_ADDED: (
+        "PTokenAdded(address indexed asset, address p_token)"
+    ),
+    sigs.SIG_EVENT_PTOKEN_REMOVED: (
+        "PTokenRemoved(address indexed asset, address p_token)"
+    ),
+    sigs.SIG_EVENT_REWARDS_COLLECTED: (
+        "RewardTokenCollected(address recipient, uint256 amount)"
+    ),
+    # Compound Timelock
+    sigs.SIG_EVENT_CANCEL_TRANSACTION: (
+        "CancelTransaction(bytes32 indexed tx_hash, address indexed target, "
+        "uint256 value, string signature, bytes data, uint256 eta)"
+    ),
+    sigs.SIG_EVENT_EXECUTE_TRANSACTION: (
+        "ExecuteTransaction(bytes32 indexed tx_hash, address indexed target, "
+        "uint256 value, string signature, bytes data, uint256 eta)"
+    ),
+    sigs.SIG_EVENT_QUEUE_TRANSACTION: (
+        "QueueTransaction(bytes32 indexed tx_hash, address indexed target, "
+        "uint256 value, string signature, bytes data, uint256 eta)"
+    ),
+    # Compound GovernorAlpha, GovernorBravo
+    sigs.SIG_EVENT_PROPOSAL_CREATED: (
+        "ProposalCreated(uint256 id, address proposer, address[] targets, "
+        "uint256[] values, string[] signatures, bytes[] calldatas, "
+        "uint256 start_block, uint256 end_block, string description)"
+    ),
+    sigs.SIG_EVENT_VOTE_CAST: (
+        "VoteCast(address voter, uint256 proposal_id, bool support, "
+        "uint256 votes)"
+    ),
+    sigs.SIG_EVENT_PROPOSAL_CANCELED: "ProposalCanceled(uint256 id)",
+    sigs.SIG_EVENT_PROPOSAL_QUEUED: "ProposalQueued(uint256 id, uint256 eta)",
+    sigs.SIG_EVENT_PROPOSAL_EXECUTED: "ProposalExecuted(uint256 id)",
+    # Compound GovernorBravo
+    sigs.SIG_EVENT_VOTE_CAST_BRAVO: (
+        "VoteCast(address indexed voter, uint256 proposal_id, uint8 support, "
+        "uint256 votes, string reason)"
+    ),
+    sigs.SIG_EVENT_NEW_IMPLEMENTATION_BRAVO: (
+        "NewImplementation(address old_implementation, "
+        "address new_implementation)"
+    ),
+    sigs.SIG_EVENT_VOTING_DELAY_SET: (
+        "VotingDelaySet(uint256 old_voting_delay, uint256 new_voting_delay)"
+    ),
+    sigs.SIG_EVENT_VOTING_PERIOD_SET: (
+        "VotingPeriodSet(uint256 old_voting_period, uint256 new_voting_period)"
+    ),
+    sigs.SIG_EVENT_PROPOSAL_THRESHOLD_SET: (
+        "ProposalThresholdSet(uint256 old_proposal_threshold, "
+        "uint256 new_proposal_threshold)"
+    ),
+    sigs.SIG_EVENT_NEW_PENDING_ADMIN_BRAVO: (
+        "NewPendingAdmin(address old_pending_admin, address new_pending_admin)"
+    ),
+    sigs.SIG_EVENT_NEW_ADMIN_BRAVO: (
+        "NewAdmin(address old_admin, address new_admin)"
+    ),
+    # Origin Governor
+    sigs.SIG_EVENT_GOVERNOR_PROPOSAL_CREATED: (
+        "ProposalCreated(uint256 id, address proposer, address[] targets, "
+        "string[] signatures, bytes[] calldatas, string description)"
+    ),
+    sigs.SIG_EVENT_GOVERNOR_PROPOSAL_CANCELLED: "ProposalCancelled(uint256 id)",
+    # Aave LendingPool
+    sigs.SIG_EVENT_PAUSED: "Paused()",
+    sigs.SIG_EVENT_UNPAUSED: "Unpaused()",
+    # Aave AaveProtoGovernance
+    sigs.SIG_EVENT_AAVE_PROPOSAL_CREATED: (
+        "ProposalCreated(uint256 indexed proposal_id, "
+        "bytes32 indexed ipfs_hash, bytes32 indexed proposal_type, "
+        "uint256 proposition_power_of_creator, uint256 threshold, "
+        "uint256 max_moves_to_voting_allowed, "
+        "uint256 voting_blocks_duration, uint256 validating_blocks_duration, "
+        "address proposal_executor)"
+    ),
+    sigs.SIG_EVENT_STATUS_CHANGE_TO_VOTING: (
+        "StatusChangeToVoting(uint256 indexed proposal_id, "
+        "uint256 moves_to_voting)"
+    ),
+    sigs.SIG_EVENT_STATUS_CHANGE_TO_VALIDATING: (
+        "StatusChangeToValidating(uint256 indexed proposal_id)"
+    ),
+    sigs.SIG_EVENT_STATUS_CHANGE_TO_EXECUTED: (
+        "StatusChangeToExecuted(uint256 indexed proposal_id)"
+    ),
+    sigs.SIG_EVENT_WINS_YES: (
+        "YesWins(uint256 indexed proposal_id, "
+        "uint256 abstain_voting_power, uint256 yes_voting_power, "
+        "uint256 no_voting_power)"
+    ),
+    sigs.SIG_EVENT_WINS_NO: (
+        "NoWins(uint256 indexed proposal_id, "
+        "uint256 abstain_voting_power, uint256 yes_voting_power, "
+        "uint256 no_voting_power)"
+    ),
+    sigs.SIG_EVENT_WINS_ABSTAIN: (
+        "AbstainWins(uint256 indexed proposal_id, "
+        "uint256 abstain_voting_power, uint256 yes_voting_power, "
+        "uint256 no_voting_power)"
+    ),
+    # Curve Aragon Voting fork
+    sigs.SIG_EVENT_START_VOTE: (
+        "StartVote(uint256 indexed vote_id, address indexed creator, "
+        "string metadata, uint256 min_balance, uint256 min_time, "
+        "uint256 total_supply, uint256 creator_voting_power)"
+    ),
+    sigs.SIG_EVENT_EXECUTE_VOTE: "ExecuteVote(uint256 indexed vote_id)",
+    sigs.SIG_EVENT_CHANGE_SUPPORT_REQUIRED: (
+        "ChangeSupportRequired(uint64 support_required_pct)"
+    ),
+    sigs.SIG_EVENT_CHANGE_MIN_QUORUM: (
+        "ChangeMinQuorum(uint64 min_accept_quorum_pct)"
+    ),
+    sigs.SIG_EVENT_MIN_BALANCE_SET: "MinimumBalanceSet(uint256 min_balance)",
+    sigs.SIG_EVENT_MIN_TIME_SET: "MinimumTimeSet(uint256 min_time)",
+    sigs.SIG_EVENT_SCRIPT_RESULT: (
+        "ScriptResult(address indexed executor, bytes script, bytes input, "
+        "bytes return_data)"
+    ),
+    sigs.SIG_EVENT_RECOVER_TO_VAULT: (
+        "RecoverToVault(address indexed vault, address indexed token, "
+        "uint256 amount)"
+    ),
+    sigs.SIG_EVENT_SET_APP: (
+        "SetApp(bytes32 indexed namespace, bytes32 indexed app_id, "
+        "address app)"
+    ),
+    sigs.SIG_EVENT_CLAIMED_TOKENS: (
+        "ClaimedTokens(address indexed token, address indexed controller, "
+        "uint256 amount)"
+    ),
+    sigs.SIG_EVENT_NEW_CLONE_TOKEN: (
+        "NewCloneToken(address indexed clone_token, uint256 snapshot_block)"
+    ),
+}
+
+
+def parse_declaration(declaration):
+    """ Parse an event declaration like "Name(address indexed a, uint256 b)"
+    """
+    match = re.match(EVENT_PATTERN, declaration)
+    name, params_string = match.groups()
+
+    params = []
+    for param in filter(None, params_string.split(",")):
+        parts = param.split()
+        params.append(Param(parts[-1], parts[0], "indexed" in parts[1:-1]))
+
+    return Event(name, params)
+
+
+EVENTS = {
+    topic: parse_declaration(declaration)
+    for topic, declaration in DECLARATIONS.items()
+}
+
+
+def to_json(value):
+    """ Convert a decoded ABI value to something that can be stored as JSON
+    """
+    if isinstance(value, bytes):
+        return encode_hex(value)
+    elif isinstance(value, (list, tuple)):
+        return [to_json(x) for x in value]
+    return value
+
+
+def decode_log(topics, data):
+    """ Decode a log of a known event.  Returns its event name and args,
+    ("", {}) if the event isn't known, or the name and {} if the log doesn't
+    match the event's ABI.
+    """
+    if not topics or topics[0] not in EVENTS:
+        return "", {}
+
+    event = EVENTS[topics[0]]
+    indexed = [x for x in event.params if x.indexed]
+    unindexed = [x for x in event.params if not x.indexed]
+
+    if len(topics) != len(indexed) + 1:
+        # Same signature with different indexing, like ERC721 Transfer
+        return event.name, {}
+
+    try:
+        args = {}
+
+        for param, topic in zip(indexed, topics[1:]):
+            # Dynamic types are only indexed by their hash
+            if param.type in ("string", "bytes") or param.type.endswith("]"):
+                args[param.name] = topic
+            else:
+                args[param.name] = to_json(
+                    decode_single(param.type, decode_hex(topic))
+                )
+
+        if unindexed:
+            values = decode_single(
+                "({})".format(",".join(x.type for x in unindexed)),
+                decode_hex(data)
+            )
+            for param, value in zip(unindexed, values):
+                args[param.name] = to_json(value)
+
+    except Exception:
+        log.debug("Failed to decode {} log".format(event.name), exc_info=True)
+        return event.name, {}
+
+    return event.name, args
+
+
+def decode_log_record(log_record):
+    """ Set the event name and args of a Log record from its topics and data.
+    Returns True if it's a known event.  Its args are empty if it couldn't be
+    decoded.
+    """
+    topics = [
+        x for x in (
+            log_record.topic_0,
+            log_record.topic_1,
+            log_record.topic_2,
+            log_record.topic_3,
+        ) if x
+    ]
+    log_record.event_name, log_record.args = decode_log(
+        topics,
+        log_record.data
+    )
+    return log_record.event_name != ""
+
+
+def args_of(log_record):
+    """ Decoded args of a Log, decoding them now if it was stored before logs
+    were decoded at ingest
+    """
+    if not log_record.event_name:
+        decode_log_record(log_record)
+    return log_record.args
+
+
+def undecoded(logs):
+    """ Filter a Log queryset to logs of known events that haven't been
+    decoded
+    """
+    return logs.filter(event_name="", topic_0__in=list(EVENTS.keys()))
+
+
+def decode_logs(logs, batch_size=1000):
+    """ Decode and store the args of logs of known events that were stored
+    without them.  Returns the number of logs updated.
+    """
+    decoded = 0
+    batch = []
+
+    for log_record in undecoded(logs).iterator(chunk_size=batch_size):
+        if decode_log_record(log_record):
+            batch.append(log_record)
+
+        if len(batch) >= batch_size:
+            Log.objects.bulk_update(batch, ["event_name", "args"])
+            decoded += len(batch)
+            batch = []
+
+    if batch:
+        Log.objects.bulk_update(batch, ["event_name", "args"])
+        decoded += len(batch)
+
+    return decoded
@@ -1,3 +1,6 @@
+from django.conf import settings
+
+from core import metrics
 from core.blockchain.const import AAVE_ASSETS, COMPOUND_FOR_SYMBOL
 from core.blockchain.harvest.snapshots import (
     ensure_3pool_snapshot,
@@ -8,34 +11,56 @@ from core.blockchain.harvest.snapshots import (
     ensure_staking_snapshot,
     ensure_oracle_snapshot,
 )
+from core.blockchain.harvest import async_transactions, reorgs, traces
 from core.blockchain.harvest.transactions import (
+    enrich_transactions,
     ensure_all_transactions,
     ensure_latest_logs,
 )
 
 
 def refresh_transactions(block_number):
-    ensure_latest_logs(block_number)
-    ensure_all_transactions(block_number)
+    with metrics.run(metrics.TRANSACTIONS):
+        reorgs.handle_reorgs(block_number)
+        if settings.ASYNC_HARVEST and not settings.LOG_FIRST_HARVEST:
+            async_transactions.ensure_latest_logs(block_number)
+        else:
+            ensure_latest_logs(block_number)
+        ensure_all_transactions(block_number)
+
+
+def enrich(limit=None):
+    """ Fetch the full data of transactions stored straight from logs """
+    with metrics.run(metrics.BACKFILL):
+        return enrich_transactions(limit)
+
+
+def fetch_traces(limit=None):
+    """ Work through the queue of transactions missing traces and internal
+    transactions
+    """
+    with metrics.run(metrics.BACKFILL):
+        return traces.process_queue(limit)
 
 
 def snap(block_number):
     """ Take snapshots of assets """
-    ensure_asset("DAI", block_number)
-    ensure_asset("USDT", block_number)
-    ensure_asset("USDC", block_number)
-    ensure_asset("COMP", block_number)
-    ensure_supply_snapshot(block_number)
-    ensure_staking_snapshot(block_number)
-    ensure_oracle_snapshot(block_number)
+    with metrics.run(metrics.SNAPSHOT):
+        ensure_asset("DAI", block_number)
+        ensure_asset("USDT", block_number)
+        ensure_asset("USDC", block_number)
+        ensure_asset("COMP", block_number)
+        ensure_supply_snapshot(block_number)
+        ensure_staking_snapshot(block_number)
+        ensure_oracle_snapshot(block_number)
 
-    for symbol in COMPOUND_FOR_SYMBOL:
-        ensure_ctoken_snapshot(symbol, block_number)
+        for symbol in COMPOUND_FOR_SYMBOL:
+            ensure_ctoken_snapshot(symbol, block_number)
 
-    for symbol in AAVE_ASSETS:
-        ensure_aave_snapshot(symbol, block_number)
+        for symbol in AAVE_ASSETS:
+            ensure_aave_snapshot(symbol, block_number)
 
-    ensure_3pool_snapshot(block_number)
+        ensure_3pool_snapshot(block_number)
 
 
 def reload_all(block_number):
@@ -0,0 +1,273 @@
+""" Concurrent transaction harvesting
+
+Fetches logs, transactions, receipts, traces, blocks and internal transactions
+with many requests in flight using AsyncRPCClient, then writes the records
+with the same code as the synchronous harvester.  Enabled with
+ASYNC_HARVEST=true.
+
+Log ranges of a contract are requested a few at a time, sized with the same
+adaptive window as the synchronous harvester.
+
+Configuration (environment variables):
+
+ - ASYNC_LOG_CONCURRENCY - Log ranges requested at once per contract
+   (default: 10)
+"""
+import os
+import asyncio
+from datetime import datetime, timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core.blockchain import store
+from core.blockchain.async_rpc import AsyncRPCClient
+from core.blockchain.const import LOG_CONTRACTS, START_OF_EVERYTHING
+from core.blockchain.harvest.blocks import ensure_block
+from core.blockchain.harvest import leases, reorgs, traces
+from core.blockchain.harvest.traces import ETHERSCAN_INDEX_DELAY
+from core.blockchain.harvest.transactions import (
+    LOG_SPARSE_RESULTS,
+    LOG_WINDOW_INITIAL,
+    LOG_WINDOW_MAX,
+    save_transaction_and_downstream,
+)
+from core.blockchain.rpc import TooManyResults
+from core.blockchain.harvest.writer import BulkWriter
+from core.logging import get_logger
+from core.models import LogPointer
+
+logger = get_logger(__name__)
+
+LOG_CONCURRENCY = int(os.environ.get("ASYNC_LOG_CONCURRENCY", 10))
+
+
+async def fetch_stored(kind, key, fetch):
+    """ Get an object from the chain object store or fetch it """
+    obj = await sync_to_async(store.get)(kind, key)
+    if obj is not None:
+        return obj, False
+    return await fetch(key), True
+
+
+async def fetch_stored_only(kind, key):
+    """ Get an object from the chain object store, or None """
+    return await sync_to_async(store.get)(kind, key), False
+
+
+async def fetch_transaction_and_downstream(client, tx_hash):
+    """ Fetch everything needed to store a transaction.  With DEFER_TRACES,
+    the trace and internal transactions are only taken from the store.
+    """
+    (raw_transaction, _), (receipt, _), (debug, _) = (
+        await asyncio.gather(
+            fetch_stored(
+                store.TRANSACTION,
+                tx_hash,
+                client.get_transaction
+            ),
+            fetch_stored(
+                store.RECEIPT,
+                tx_hash,
+                client.get_transaction_receipt
+            ),
+            fetch_stored_only(store.TRACE, tx_hash)
+            if settings.DEFER_TRACES else
+            fetch_stored(
+                store.TRACE,
+                tx_hash,
+                client.debug_trace_transaction
+            ),
+        )
+    )
+
+    block_number = int(raw_transaction["blockNumber"], 16)
+
+    (raw_block, _), (internal_transactions, internal_fetched) = (
+        await asyncio.gather(
+            fetch_stored(store.BLOCK, block_number, client.get_block),
+            fetch_stored_only(store.INTERNAL_TRANSACTIONS, tx_hash)
+            if settings.DEFER_TRACES else
+            fetch_stored(
+                store.INTERNAL_TRANSACTIONS,
+                tx_hash,
+                client.get_internal_transactions
+            ),
+        )
+    )
+
+    return {
+        "tx_hash": tx_hash,
+        "raw_transaction": raw_transaction,
+        "receipt": receipt,
+        "debug": debug,
+        "raw_block": raw_block,
+        "internal_transactions": internal_transactions,
+        "internal_fetched": internal_fetched,
+    }
+
+
+def save_fetched(fetched, writer=None):
+    """ Store fetched chain objects and write the transaction records """
+    tx_hash = fetched["tx_hash"]
+    block_number = int(fetched["raw_transaction"]["blockNumber"], 16)
+
+    store.put(store.TRANSACTION, tx_hash, fetched["raw_transaction"])
+    store.put(store.RECEIPT, tx_hash, fetched["receipt"])
+    # Only traces of mined transactions have any entries
+    if fetched["debug"]:
+        store.put(store.TRACE, tx_hash, fetched["debug"])
+    store.put(store.BLOCK, block_number, fetched["raw_block"])
+
+    block = ensure_block(block_number, fetched["raw_block"])
+
+    # None when Etherscan returned an error, which is left to the trace queue
+    internal_transactions = fetched["internal_transactions"]
+    if (
+        fetched["internal_fetched"]
+        and internal_transactions is not None
+        and (
+            internal_transactions
+            or block.block_time
+            < datetime.now(timezone.utc) - ETHERSCAN_INDEX_DELAY
+        )
+    ):
+        store.put(
+            store.INTERNAL_TRANSACTIONS,
+            tx_hash,
+            fetched["internal_transactions"]
+        )
+
+    db_tx = save_transaction_and_downstream(
+        tx_hash,
+        block,
+        fetched["raw_transaction"],
+        fetched["receipt"],
+        fetched["debug"],
+        fetched["internal_transactions"],
+        writer,
+    )
+
+    if fetched["debug"] is None or fetched["internal_transactions"] is None:
+        traces.enqueue([tx_hash])
+
+    return db_tx
+
+
+async def ensure_transaction_and_downsteam_hashes(client, tx_hashes):
+    """ Fetch transactions concurrently and store them in order """
+    for kind in (
+        store.TRANSACTION,
+        store.RECEIPT,
+        store.TRACE,
+        store.INTERNAL_TRANSACTIONS,
+    ):
+        await sync_to_async(store.prefetch)(kind, tx_hashes)
+
+    results = await asyncio.gather(*[
+        fetch_transaction_and_downstream(client, tx_hash)
+        for tx_hash in tx_hashes
+    ])
+
+    writer = BulkWriter()
+
+    for fetched in results:
+        await sync_to_async(save_fetched)(fetched, writer)
+
+    await sync_to_async(writer.flush)()
+
+
+async def download_logs_from_contract(client, contract, start_block, end_block):
+    """ Get the transaction hashes and number of logs of a contract in a block
+    range
+    """
+    logger.info("D {} {} {}".format(contract, start_block, end_block))
+    logs = await client.get_logs(contract, start_block, end_block)
+    return set([x["transactionHash"] for x in logs]), len(logs)
+
+
+async def ensure_latest_logs_for_contract(client, contract, lease, upto):
+    """ Fetch the log ranges of a contract LOG_CONCURRENCY at a time, then
+    store transactions and advance the pointer range by range.  The window
+    grows while results are sparse and is halved when the provider refuses a
+    range, as in transactions.download_leased_logs().
+    """
+    start_block = lease.pointers[contract].last_block + 1
+    window = LOG_WINDOW_INITIAL
+    # Largest window not known to return too many results
+    ceiling = LOG_WINDOW_MAX
+
+    while start_block <= upto:
+        ranges = []
+        next_block = start_block
+        while next_block <= upto and len(ranges) < LOG_CONCURRENCY:
+            end_block = min(next_block + window - 1, upto)
+            ranges.append((next_block, end_block))
+            next_block = end_block + 1
+
+        results = await asyncio.gather(
+            *[
+                download_logs_from_contract(client, contract, start, end)
+                for start, end in ranges
+            ],
+            return_exceptions=True
+        )
+
+        for (start, end), result in zip(ranges, results):
+            if isinstance(result, TooManyResults):
+                if end == start:
+                    raise result
+                # Ranges after this one are fetched again with the new window
+                window = max(1, (end - start + 1) // 2)
+                ceiling = window
+                logger.info("Too many logs, shrinking window to {}".format(
+                    window
+                ))
+                break
+
+            if isinstance(result, BaseException):
+                raise result
+
+            tx_hashes, count = result
+            await ensure_transaction_and_downsteam_hashes(
+                client,
+                list(tx_hashes)
+            )
+
+            # Keep the hash of the pointer block, so reorgs below it are
+            # noticed
+            if end > upto - reorgs.CONFIRMATIONS:
+                await sync_to_async(ensure_block)(end)
+
+            await sync_to_async(lease.advance)(contract, end)
+            start_block = end + 1
+
+            # Let the ceiling recover after dense ranges have passed
+            if window == ceiling and count < LOG_SPARSE_RESULTS // 10:
+                ceiling = min(ceiling * 2, LOG_WINDOW_MAX)
+
+            if count < LOG_SPARSE_RESULTS:
+                window = min(window * 2, ceiling)
+
+
+async def async_ensure_latest_logs(upto, url=None):
+    lease = await sync_to_async(leases.claim)(
+        LogPointer,
+        LOG_CONTRACTS,
+        START_OF_EVERYTHING
+    )
+    lease.keep_alive()
+
+    try:
+        async with AsyncRPCClient(url=url) as client:
+            await asyncio.gather(*[
+                ensure_latest_logs_for_contract(client, contract, lease, upto)
+                for contract in lease.pointers
+            ])
+
+    finally:
+        await sync_to_async(lease.release)()
+
+
+def ensure_latest_logs(upto, url=None):
+    """ Synchronous entry point matching transactions.ensure_latest_logs """
+    asyncio.run(async_ensure_latest_logs(upto, url=url))
@@ -0,0 +1,310 @@
+""" Parallel historical log backfill
+
+A backfill job splits a block range into BackfillChunks.  Worker processes
+lease chunks from the table one at a time, ingest their logs window by window
+with download_logs(), and checkpoint each window in the chunk's next_block.
+A crashed worker's lease expires and another worker resumes its chunk from the
+checkpoint.  Running the same job again only does what's left, and plans
+chunks for any part of the new range the job doesn't cover yet.
+
+A worker only checkpoints a chunk while it holds the chunk's lease, and gives
+the chunk up (ChunkLost) once another worker has taken it over.
+
+Once every chunk of a job is done, the LogPointers of its contracts are moved
+to the end of the range, if the job covered everything after them without
+gaps.  Pointers are moved under a lease (see
+core.blockchain.harvest.leases), so ones a harvest run holds are left alone.
+
+Usage:
+
+    plan("rebuild", START_OF_EVERYTHING, latest, 10000, LOG_CONTRACTS)
+    run("rebuild", workers=8)
+"""
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import F, Q, Sum
+from django.db.transaction import atomic
+
+from core.blockchain.const import START_OF_EVERYTHING
+from core.blockchain.harvest import executor, leases
+from core.blockchain.harvest.transactions import (
+    LOG_WINDOW_INITIAL,
+    LOG_WINDOW_MAX,
+    LOG_SPARSE_RESULTS,
+    download_logs,
+)
+from core.blockchain.rpc import TooManyResults
+from core.logging import get_logger
+from core.models import BackfillChunk, LogPointer
+
+logger = get_logger(__name__)
+
+# How long a worker holds a chunk without checkpointing before others may
+# take it over
+LEASE = timedelta(minutes=10)
+MAX_BACKOFF = timedelta(hours=1)
+
+
+class ChunkLost(Exception):
+    """ A chunk's lease expired and it may have been taken over by another
+    worker
+    """
+    pass
+
+
+def gaps(ranges, start_block, end_block):
+    """ Parts of a block range not covered by a list of (start, end) ranges """
+    out = []
+    next_block = start_block
+
+    for start, end in sorted(ranges):
+        if start > next_block:
+            out.append((next_block, min(start - 1, end_block)))
+        next_block = max(next_block, end + 1)
+        if next_block > end_block:
+            break
+
+    if next_block <= end_block:
+        out.append((next_block, end_block))
+
+    return [x for x in out if x[0] <= x[1]]
+
+
+def plan(job, start_block, end_block, chunk_size, contracts):
+    """ Split the parts of a block range the job doesn't cover yet into
+    chunks, so running again with a later end block extends the job.
+    Returns the number of new chunks.
+    """
+    existing = list(
+        BackfillChunk.objects.filter(job=job)
+        .values_list("start_block", "end_block")
+    )
+
+    chunks = [
+        BackfillChunk(
+            job=job,
+            start_block=start,
+            end_block=min(start + chunk_size - 1, gap_end),
+            next_block=start,
+            contracts=contracts,
+        )
+        for gap_start, gap_end in gaps(existing, start_block, end_block)
+        for start in range(gap_start, gap_end + 1, chunk_size)
+    ]
+
+    BackfillChunk.objects.bulk_create(chunks, ignore_conflicts=True)
+    return len(chunks)
+
+
+def lease(job, worker):
+    """ Claim the next available chunk of a job, or None """
+    now = datetime.now(timezone.utc)
+
+    with atomic():
+        chunk = (
+            BackfillChunk.objects.select_for_update(skip_locked=True)
+            .filter(job=job, done=False)
+            .filter(Q(leased_until__isnull=True) | Q(leased_until__lt=now))
+            .order_by("start_block")
+            .first()
+        )
+
+        if chunk is None:
+            return None
+
+        chunk.leased_until = now + LEASE
+        chunk.worker = worker
+        chunk.save(update_fields=["leased_until", "worker", "updated_at"])
+
+    return chunk
+
+
+def held(chunk, now):
+    """ Query for a chunk if its lease is still held by the worker """
+    return BackfillChunk.objects.filter(
+        pk=chunk.pk,
+        worker=chunk.worker,
+        leased_until__gt=now,
+    )
+
+
+def checkpoint(chunk, next_block):
+    """ Record progress through a chunk and extend its lease.  Raises
+    ChunkLost if the lease has expired.
+    """
+    now = datetime.now(timezone.utc)
+    done = next_block > chunk.end_block
+    leased_until = None if done else now + LEASE
+
+    updated = held(chunk, now).update(
+        next_block=next_block,
+        done=done,
+        leased_until=leased_until,
+        updated_at=now,
+    )
+
+    if not updated:
+        raise ChunkLost("Lost the lease on backfill chunk {}-{}".format(
+            chunk.start_block,
+            chunk.end_block
+        ))
+
+    chunk.next_block = next_block
+    chunk.done = done
+    chunk.leased_until = leased_until
+
+
+def ingest_chunk(chunk):
+    """ Download the logs of a chunk from its checkpoint onwards, halving the
+    window when the provider returns too many results
+    """
+    window = LOG_WINDOW_INITIAL
+    start_block = chunk.next_block
+
+    while start_block <= chunk.end_block:
+        end_block = min(start_block + window - 1, chunk.end_block)
+
+        try:
+            count = download_logs(chunk.contracts, start_block, end_block)
+
+        except TooManyResults:
+            if window == 1:
+                raise
+            window = max(1, window // 2)
+            continue
+
+        checkpoint(chunk, end_block + 1)
+        start_block = end_block + 1
+
+        if count < LOG_SPARSE_RESULTS:
+            window = min(window * 2, LOG_WINDOW_MAX)
+
+
+def progress(job):
+    """ Blocks done and total blocks of a job """
+    totals = BackfillChunk.objects.filter(job=job).aggregate(
+        done=Sum(F("next_block") - F("start_block")),
+        total=Sum(F("end_block") - F("start_block") + 1),
+    )
+    return totals["done"] or 0, totals["total"] or 0
+
+
+def work(task):
+    """ Lease and ingest chunks of a job until there are none left """
+    job, worker = task
+    start = time.time()
+    initial_done, _ = progress(job)
+
+    while True:
+        chunk = lease(job, worker)
+        if chunk is None:
+            break
+
+        try:
+            ingest_chunk(chunk)
+
+        except ChunkLost as err:
+            logger.warning(err)
+            continue
+
+        except Exception as err:
+            logger.exception("Backfill chunk {}-{} failed".format(
+                chunk.start_block,
+                chunk.end_block
+            ))
+            now = datetime.now(timezone.utc)
+            # Leave it for a while, keeping the checkpoint
+            held(chunk, now).update(
+                attempts=chunk.attempts + 1,
+                last_error="{}: {}".format(err.__class__.__name__, err),
+                leased_until=now + min(
+                    timedelta(seconds=30 * 2 ** min(chunk.attempts + 1, 10)),
+                    MAX_BACKOFF
+                ),
+                updated_at=now,
+            )
+            continue
+
+        done, total = progress(job)
+        elapsed = time.time() - start
+        # Every worker starts at about the same time, so this is close to the
+        # rate of the whole job
+        rate = (done - initial_done) / elapsed if elapsed else 0
+        remaining = (total - done) / rate if rate else 0
+
+        logger.info(
+            "Backfill {}: {}/{} blocks ({:.1%}), {:.0f} blocks/s, "
+            "ETA {}".format(
+                job,
+                done,
+                total,
+                done / total if total else 1,
+                rate,
+                timedelta(seconds=int(remaining)),
+            )
+        )
+
+
+def finish(job):
+    """ Move the LogPointers of a completed job's contracts to its end.
+    Returns False if the job isn't complete.
+    """
+    chunks = BackfillChunk.objects.filter(job=job)
+
+    if not chunks.exists() or chunks.filter(done=False).exists():
+        return False
+
+    ranges = sorted(chunks.values_list("start_block", "end_block"))
+    start_block = ranges[0][0]
+    end_block = max(x[1] for x in ranges)
+
+    holes = gaps(ranges, start_block, end_block)
+    if holes:
+        logger.error("Backfill {} doesn't cover blocks {}, not moving log "
+                     "pointers".format(job, holes))
+        return False
+
+    contracts = set()
+    for x in chunks.values_list("contracts", flat=True):
+        contracts.update(x)
+
+    with leases.lease_pointers(
+        LogPointer,
+        sorted(contracts),
+        START_OF_EVERYTHING
+    ) as lease:
+        for contract, pointer in lease.pointers.items():
+            if start_block <= pointer.last_block + 1 <= end_block:
+                lease.advance(contract, end_block)
+
+    if len(lease.pointers) < len(contracts):
+        logger.warning(
+            "Backfill {} didn't move {} log pointers leased by a harvest "
+            "run".format(job, len(contracts) - len(lease.pointers))
+        )
+
+    return True
+
+
+def run(job, workers=None):
+    """ Work through a job with a pool of worker processes.  Returns the list
+    of executor Failures.
+    """
+    workers = workers or executor.WORKERS
+    name = "{}-{}".format(socket.gethostname(), os.getpid())
+
+    failures = executor.run(
+        work,
+        [(job, "{}-{}".format(name, i)) for i in range(workers)],
+        workers=workers,
+        chunk_size=1,
+        label="backfill {}".format(job)
+    )
+
+    if finish(job):
+        logger.info("Backfill {} complete".format(job))
+
+    return failures
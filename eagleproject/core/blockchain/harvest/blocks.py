@@ -1,34 +1,151 @@
+""" Block headers
+
+Block records of final blocks never change once stored, so they are kept in a
+process-wide cache, which is dropped when a reorg is rolled back.
+ensure_blocks() looks up every block a batch of work needs at once: from the
+cache, then the database, then the chain object store, and finally fetches
+the rest in a single JSON-RPC batch.  New records are inserted with one
+bulk_create that skips rows another worker inserted first.
+
+Configuration (environment variables):
+
+ - BLOCK_CACHE_SIZE - Block records kept in memory (default: 100000)
+"""
+import os
 from datetime import datetime, timezone
-from core.blockchain.rpc import (
-    get_block,
-)
+
+from core.blockchain import store
+from core.blockchain.cache import LRU, check_generation
+from core.blockchain.rpc import Batch
 from core.logging import get_logger
 from core.models import (
     Block,
 )
 
-from django.db.utils import IntegrityError
-
 logger = get_logger(__name__)
 
+CACHE_SIZE = int(os.environ.get("BLOCK_CACHE_SIZE", 100000))
+
+# Block number to Block record
+cache = LRU(CACHE_SIZE)
 
-def ensure_block(block_number):
-    blocks = list(Block.objects.filter(block_number=block_number))
-    if len(blocks) > 0:
-        return blocks[0]
-    
-    raw_block = get_block(block_number)
-    block_time = datetime.fromtimestamp(
-        int(raw_block["timestamp"], 16),
-        timezone.utc
+
+def block_from_raw(block_number, raw_block):
+    return Block(
+        block_number=block_number,
+        block_time=datetime.fromtimestamp(
+            int(raw_block["timestamp"], 16),
+            timezone.utc
+        ),
+        block_hash=raw_block.get("hash") or "",
+        parent_hash=raw_block.get("parentHash") or "",
     )
 
-    block = Block(block_number=block_number, block_time=block_time)
-    try:
-        block.save()
-    except IntegrityError:
-        # do nothing... when multiple threads are fetching transactions sometimes 2 threads
-        # try to save the same block with the same number. We just ignore this type of error.
-        print("Warning: caught an error trying to save 2 blocks with the same block_number")
 
-    return block
+def fetch_raw_blocks(block_numbers):
+    """ Get raw blocks from the chain object store, or from the RPC source in
+    a single batch.  Returns a dict of block number to raw block.
+    """
+    raw_blocks = store.get_many(store.BLOCK, block_numbers)
+    missing = [x for x in block_numbers if x not in raw_blocks]
+
+    if not missing:
+        return raw_blocks
+
+    batch = Batch()
+    requests = {x: batch.get_block(x) for x in missing}
+    batch.execute()
+
+    fetched = {}
+    for block_number, req in requests.items():
+        if req.result is None:
+            raise ValueError("Block {} not found".format(block_number))
+        fetched[block_number] = req.result
+
+    store.put_many(store.BLOCK, fetched)
+    raw_blocks.update(fetched)
+
+    logger.debug("Fetched {} blocks".format(len(fetched)))
+
+    return raw_blocks
+
+
+def check_parents(new_blocks):
+    """ Warn about new blocks that don't follow on from the stored block
+    before them.  The rollback itself is left to core.blockchain.harvest.reorgs
+    """
+    parents = {
+        x.block_number: x.block_hash
+        for x in Block.objects.filter(
+            block_number__in=[x.block_number - 1 for x in new_blocks]
+        ).exclude(block_hash="")
+    }
+
+    for block in new_blocks:
+        parent_hash = parents.get(block.block_number - 1)
+        if parent_hash and block.parent_hash != parent_hash:
+            logger.warning("Block {} has parent {} but {} is stored".format(
+                block.block_number,
+                block.parent_hash,
+                parent_hash
+            ))
+
+
+def ensure_blocks(block_numbers, raw_blocks=None):
+    """ Get Block records for many block numbers, creating any that don't
+    exist from raw_blocks (a dict of block number to raw block) or from the
+    RPC source.  Returns a dict of block number to Block.
+    """
+    blocks = {}
+    missing = []
+
+    check_generation()
+
+    for block_number in set(block_numbers):
+        block = cache.get(block_number)
+        if block is None:
+            missing.append(block_number)
+        else:
+            blocks[block_number] = block
+
+    if not missing:
+        return blocks
+
+    for block in Block.objects.filter(block_number__in=missing):
+        cache.set(block.block_number, block)
+        blocks[block.block_number] = block
+
+    missing = [x for x in missing if x not in blocks]
+
+    if not missing:
+        return blocks
+
+    raw_blocks = dict(raw_blocks or {})
+    raw_blocks.update(fetch_raw_blocks(
+        [x for x in missing if x not in raw_blocks]
+    ))
+
+    new_blocks = [block_from_raw(x, raw_blocks[x]) for x in missing]
+    check_parents(new_blocks)
+
+    # Another worker may have inserted some of these in the meantime
+    Block.objects.bulk_create(new_blocks, ignore_conflicts=True)
+
+    for block in new_blocks:
+        cache.set(block.block_number, block)
+        blocks[block.block_number] = block
+
+    return blocks
+
+
+def ensure_block(block_number, raw_block=None):
+    """ Get the Block record for a block number, creating it from raw_block
+    or from the RPC source if it doesn't exist
+    """
+    raw_blocks = {block_number: raw_block} if raw_block is not None else None
+    return ensure_blocks([block_number], raw_blocks)[block_number]
+
+
+def block_time(block_number):
+    """ Time of a block """
+    return ensure_block(block_number).block_time
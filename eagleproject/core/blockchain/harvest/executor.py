@@ -0,0 +1,129 @@
+""" Bounded worker pool for harvest stages
+
+Runs a function over many items with a fixed number of worker processes,
+instead of forking a process per item.  Items are dispatched to workers in
+chunks, and each worker keeps its own DB connection for its whole life, so the
+number of Postgres connections is bounded by the pool size.
+
+An item that raises doesn't stop the others.  Its error is logged and
+returned, so the caller can retry or report it.
+
+Usage:
+
+    failures = executor.run(ensure_transaction_and_downstream, tx_hashes)
+
+Configuration (environment variables):
+
+ - HARVEST_WORKERS - Worker processes per pool (default: number of CPUs)
+ - HARVEST_CHUNK_SIZE - Items sent to a worker at a time (default: 10)
+"""
+import os
+import time
+from collections import namedtuple
+from multiprocessing import Pool
+
+from django import db
+
+from core import cassette, metrics
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+WORKERS = int(os.environ.get("HARVEST_WORKERS", 0)) or os.cpu_count() or 1
+CHUNK_SIZE = int(os.environ.get("HARVEST_CHUNK_SIZE", 10))
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 10
+
+Failure = namedtuple("Failure", ["item", "error"])
+
+
+def call(task):
+    """ Run fn on an item in a worker, returning an error string instead of
+    raising
+    """
+    fn, item, subsystem = task
+
+    try:
+        with metrics.subsystem(subsystem):
+            fn(item)
+        return item, None
+
+    except Exception as err:
+        logger.exception("{} failed for {}".format(fn.__name__, item))
+        return item, "{}: {}".format(err.__class__.__name__, err)
+
+    finally:
+        # Pool workers are terminated without running exit handlers
+        cassette.flush()
+
+
+class Progress:
+    """ Periodic log of items done out of a total """
+
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.time()
+        self.reported = self.start
+
+    def update(self, error=None):
+        self.done += 1
+        if error is not None:
+            self.failed += 1
+
+        now = time.time()
+        if now - self.reported >= PROGRESS_INTERVAL or self.done == self.total:
+            self.reported = now
+            self.report(now)
+
+    def report(self, now):
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed else 0
+        remaining = (self.total - self.done) / rate if rate else 0
+
+        logger.info(
+            "{}: {}/{} done ({} failed), {:.1f}/s, {:.0f}s remaining".format(
+                self.label,
+                self.done,
+                self.total,
+                self.failed,
+                rate,
+                remaining,
+            )
+        )
+
+
+def run(fn, items, workers=None, chunk_size=None, label=None):
+    """ Call fn(item) for every item on a pool of worker processes.  fn must
+    be a module level function.  Returns a list of Failures for items that
+    raised.
+    """
+    items = list(items)
+    workers = min(workers or WORKERS, len(items))
+    progress = Progress(label or fn.__name__, len(items))
+    subsystem = metrics.current_subsystem()
+    tasks = ((fn, item, subsystem) for item in items)
+    failures = []
+
+    def collect(results):
+        for item, error in results:
+            progress.update(error)
+            if error is not None:
+                failures.append(Failure(item, error))
+
+    if workers <= 1:
+        collect(map(call, tasks))
+        return failures
+
+    # Forked workers would share the parent's open DB connections.  Closing
+    # them first makes every worker open its own on first use, which it then
+    # keeps for the life of the pool.  The parent reconnects lazily.
+    db.connections.close_all()
+
+    with Pool(workers) as pool:
+        collect(pool.imap_unordered(call, tasks, chunk_size or CHUNK_SIZE))
+
+    return failures
@@ -0,0 +1,175 @@
+""" Leases on harvest pointers
+
+Several instances can run ingestion at the same time.  Each one claims the
+LogPointer or EtherscanPointer rows it will work on with SELECT ... FOR UPDATE
+SKIP LOCKED, and marks them leased until a deadline that is pushed back every
+time any of the run's pointers advances, and by a heartbeat thread while
+the run is busy with one long window.  Other instances skip leased pointers,
+and a pointer whose holder died becomes claimable again once its lease
+expires.  A pointer is only advanced by the holder of its lease.
+
+Usage:
+
+    with lease_pointers(LogPointer, CONTRACTS, START_OF_EVERYTHING) as lease:
+        for contract, pointer in lease.pointers.items():
+            ...
+            lease.advance(contract, end_block)
+
+Configuration (environment variables):
+
+ - POINTER_LEASE_SECONDS - How long a lease lasts without progress
+   (default: 300)
+ - POINTER_LEASE_COUNT - Max pointers one instance claims at a time, to
+   split contracts between instances (default: 0, all available)
+"""
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.db.transaction import atomic
+
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+LEASE = timedelta(seconds=int(os.environ.get("POINTER_LEASE_SECONDS", 300)))
+LEASE_COUNT = int(os.environ.get("POINTER_LEASE_COUNT", 0))
+
+
+class LeaseLost(Exception):
+    """ A pointer's lease expired and was taken over by another instance """
+    pass
+
+
+class Lease:
+    """ Pointers claimed by one harvest run """
+
+    def __init__(self, model, token, pointers):
+        self.model = model
+        self.token = token
+        self.pointers = pointers
+        self.stopped = threading.Event()
+
+    def held(self):
+        return self.model.objects.filter(
+            pk__in=[x.pk for x in self.pointers.values()],
+            leased_by=self.token,
+        )
+
+    def advance(self, contract, last_block):
+        """ Move a pointer forward and extend the leases """
+        pointer = self.pointers[contract]
+
+        updated = self.model.objects.filter(
+            pk=pointer.pk,
+            leased_by=self.token,
+        ).update(
+            last_block=last_block,
+            leased_until=datetime.now(timezone.utc) + LEASE,
+        )
+
+        if not updated:
+            raise LeaseLost("Lost the lease on {} pointer {}".format(
+                self.model.__name__,
+                contract
+            ))
+
+        pointer.last_block = last_block
+
+        # Pointers are usually worked through one after another, so the
+        # ones not reached yet need extending too
+        self.renew()
+
+    def renew(self):
+        """ Extend the leases on all pointers still held.  Returns how many
+        are held.
+        """
+        return self.held().update(
+            leased_until=datetime.now(timezone.utc) + LEASE
+        )
+
+    def keep_alive(self):
+        """ Renew the leases from a background thread until released """
+        def heartbeat():
+            try:
+                while not self.stopped.wait(LEASE.total_seconds() / 3):
+                    try:
+                        self.renew()
+                    except DatabaseError:
+                        logger.exception("Failed to renew pointer leases")
+            finally:
+                connection.close()
+
+        threading.Thread(
+            target=heartbeat,
+            name="lease-heartbeat",
+            daemon=True
+        ).start()
+
+    def release(self):
+        self.stopped.set()
+        self.held().update(leased_until=None, leased_by="")
+
+
+def claim(model, contracts, last_block):
+    """ Lease the available pointers of the given contracts, creating any
+    that don't exist at last_block
+    """
+    existing = set(
+        model.objects.filter(contract__in=contracts)
+        .values_list("contract", flat=True)
+    )
+    model.objects.bulk_create(
+        [
+            model(contract=x, last_block=last_block)
+            for x in contracts if x not in existing
+        ],
+        ignore_conflicts=True
+    )
+
+    now = datetime.now(timezone.utc)
+    token = "{}:{}".format(socket.gethostname(), uuid.uuid4().hex[:12])
+
+    with atomic():
+        query = (
+            model.objects.select_for_update(skip_locked=True)
+            .filter(contract__in=contracts)
+            .filter(Q(leased_until__isnull=True) | Q(leased_until__lt=now))
+            .order_by("last_block")
+        )
+        if LEASE_COUNT:
+            query = query[:LEASE_COUNT]
+
+        pointers = list(query)
+
+        model.objects.filter(pk__in=[x.pk for x in pointers]).update(
+            leased_until=now + LEASE,
+            leased_by=token,
+        )
+
+    if len(pointers) < len(contracts):
+        logger.info("Leased {} of {} {}s".format(
+            len(pointers),
+            len(contracts),
+            model.__name__
+        ))
+
+    return Lease(model, token, {x.contract: x for x in pointers})
+
+
+@contextmanager
+def lease_pointers(model, contracts, last_block):
+    """ Hold leases on the available pointers of the given contracts for the
+    duration of the block
+    """
+    lease = claim(model, contracts, last_block)
+    lease.keep_alive()
+    try:
+        yield lease
+    finally:
+        lease.release()
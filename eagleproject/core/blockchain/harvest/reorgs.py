@@ -0,0 +1,182 @@
+""" Chain reorganisation handling
+
+Blocks are stored with their hash.  Blocks more than CONFIRMATIONS behind the
+head are final and never looked at again.  Before each ingestion run, the
+stored blocks that aren't final yet are compared with the canonical chain.
+If one was replaced, everything ingested from the first replaced block
+onwards is deleted, including snapshots, and the log pointers are moved
+back, so the next run ingests it again.
+
+The LogPointers' last blocks are always stored (see ensure_latest_logs), so a
+reorg is noticed even when the replaced blocks had none of our transactions.
+
+Configuration (environment variables):
+
+ - REORG_CONFIRMATIONS - Blocks after which data counts as final
+   (default: 12)
+"""
+import os
+
+from django.db.transaction import atomic
+
+from core.blockchain import cache, store
+from core.blockchain.rpc import Batch
+from core.logging import get_logger
+from core.models import (
+    AaveLendingPoolCoreSnapshot,
+    AssetBlock,
+    Block,
+    CallCache,
+    CTokenSnapshot,
+    EtherscanPointer,
+    FollowerCursor,
+    Log,
+    LogPointer,
+    OgnStaked,
+    OgnStakingSnapshot,
+    OracleSnapshot,
+    OusdTransfer,
+    Rollback,
+    SupplySnapshot,
+    ThreePoolSnapshot,
+    TraceRequest,
+    Transaction,
+)
+
+logger = get_logger(__name__)
+
+CONFIRMATIONS = int(os.environ.get("REORG_CONFIRMATIONS", 12))
+
+# Records of contract state at a block, taken by the snapshot stage
+SNAPSHOT_MODELS = [
+    AaveLendingPoolCoreSnapshot,
+    AssetBlock,
+    CTokenSnapshot,
+    OgnStakingSnapshot,
+    OracleSnapshot,
+    SupplySnapshot,
+    ThreePoolSnapshot,
+]
+
+
+def canonical_hashes(block_numbers):
+    """ Get the current hash of blocks from the RPC source, bypassing the
+    chain object store
+    """
+    batch = Batch(use_cache=False)
+    requests = {x: batch.get_block(x) for x in block_numbers}
+    batch.execute()
+
+    return {
+        block_number: (req.result or {}).get("hash")
+        for block_number, req in requests.items()
+    }
+
+
+def find_fork(head):
+    """ Get the first stored block that is no longer part of the chain, or
+    None if there wasn't a reorg.  Blocks the provider doesn't know yet don't
+    count as replaced.
+    """
+    final = head - CONFIRMATIONS
+    recent = list(
+        Block.objects.filter(block_number__gt=final)
+        .exclude(block_hash="")
+        .order_by("block_number")
+    )
+
+    if not recent:
+        return None
+
+    # A block's hash commits to all its ancestors, so if the latest one is
+    # unchanged, so are the others
+    latest = recent[-1]
+    if canonical_hashes([latest.block_number])[latest.block_number] == (
+        latest.block_hash
+    ):
+        return None
+
+    hashes = canonical_hashes([x.block_number for x in recent])
+
+    fork = final + 1
+    for block in recent:
+        canonical = hashes[block.block_number]
+        if canonical is None:
+            # Not known to the provider yet, e.g. one lagging behind the
+            # provider the block came from
+            continue
+        if canonical != block.block_hash:
+            return fork
+        fork = block.block_number + 1
+
+    return None
+
+
+def rollback(fork):
+    """ Delete everything ingested from a block onwards and move the
+    pointers back to re-ingest it
+    """
+    tx_hashes = list(
+        Transaction.objects.filter(block_number__gte=fork)
+        .values_list("tx_hash", flat=True)
+    )
+    block_numbers = list(
+        Block.objects.filter(block_number__gte=fork)
+        .values_list("block_number", flat=True)
+    )
+
+    with atomic():
+        Log.objects.filter(block_number__gte=fork).delete()
+        OusdTransfer.objects.filter(tx_hash__in=tx_hashes).delete()
+        OgnStaked.objects.filter(tx_hash__in=tx_hashes).delete()
+        TraceRequest.objects.filter(tx_hash__in=tx_hashes).delete()
+        Transaction.objects.filter(tx_hash__in=tx_hashes).delete()
+        Block.objects.filter(block_number__gte=fork).delete()
+        CallCache.objects.filter(block_number__gte=fork).delete()
+        # ensure_*_snapshot() would keep returning state from orphaned blocks
+        for model in SNAPSHOT_MODELS:
+            model.objects.filter(block_number__gte=fork).delete()
+
+        for kind in (
+            store.TRANSACTION,
+            store.RECEIPT,
+            store.TRACE,
+            store.INTERNAL_TRANSACTIONS,
+        ):
+            store.delete_many(kind, tx_hashes)
+        store.delete_many(store.BLOCK, block_numbers)
+
+        LogPointer.objects.filter(last_block__gte=fork).update(
+            last_block=fork - 1
+        )
+        # Transactions without logs are only found through Etherscan
+        EtherscanPointer.objects.filter(last_block__gte=fork).update(
+            last_block=fork - 1
+        )
+        FollowerCursor.objects.filter(block_number__gte=fork).update(
+            block_number=fork - 1
+        )
+        # Tells every process to start its in-memory caches over
+        Rollback.objects.create(fork_block=fork)
+
+    cache.check_generation(force=True)
+
+    logger.warning(
+        "Rolled back reorg from block {}: {} transactions, {} blocks".format(
+            fork,
+            len(tx_hashes),
+            len(block_numbers),
+        )
+    )
+
+
+def handle_reorgs(head):
+    """ Roll back stored data from blocks that were reorged away.  Returns
+    the first rolled back block, or None.
+    """
+    fork = find_fork(head)
+
+    if fork is not None:
+        rollback(fork)
+
+    return fork
@@ -1,3 +1,4 @@
+import math
 from decimal import Decimal
 from datetime import datetime, timezone
 
@@ -25,7 +26,9 @@ from core.blockchain.const import (
     COMPOUND_FOR_SYMBOL,
     CONTRACT_FOR_SYMBOL,
     DECIMALS_FOR_SYMBOL,
+    SYMBOL_FOR_CONTRACT,
 )
+from core.blockchain.multicall import Multicall
 from core.blockchain.rpc import (
     AaveLendingPoolCore,
     ThreePool,
@@ -64,6 +67,11 @@ from core.models import (
 logger = get_logger(__name__)
 
 
+def sum_results(batch_requests):
+    """ Sum the decoded results of executed batch requests """
+    return sum((x.result for x in batch_requests), Decimal(0))
+
+
 def isbetween(start, end, v):
     if not isinstance(v, int):
         return False
@@ -76,121 +84,137 @@ def isbetween(start, end, v):
 
 def build_asset_block(symbol, block_number):
     symbol = symbol.upper()
-    compstrat_holding = Decimal(0)
-    aavestrat_holding = Decimal(0)
-    threepoolstrat_holding = Decimal(0)
+    batch = Multicall()
+    compstrat_holdings = []
+    aavestrat_holdings = []
+    threepoolstrat_holdings = []
 
     # Compound Strats
     if isbetween(11060000, 13399969, block_number):
         if symbol in ["USDC", "USDT", "DAI"]:
-            compstrat_holding += balanceOfUnderlying(
+            compstrat_holdings.append(balanceOfUnderlying(
                 COMPOUND_FOR_SYMBOL[symbol],
                 STRATCOMP1,
                 DECIMALS_FOR_SYMBOL[symbol],
                 block_number,
-            )
+                batch=batch,
+            ))
         elif symbol == "COMP":
-            compstrat_holding += balanceOf(
+            compstrat_holdings.append(balanceOf(
                 CONTRACT_FOR_SYMBOL[symbol],
                 STRATCOMP1,
                 DECIMALS_FOR_SYMBOL[symbol],
                 block_number,
-            )
+                batch=batch,
+            ))
     if block_number == "latest" or block_number > 13399969:
         if symbol in ["USDC", "USDT", "DAI"]:
-            compstrat_holding += balanceOfUnderlying(
+            compstrat_holdings.append(balanceOfUnderlying(
                 COMPOUND_FOR_SYMBOL[symbol],
                 STRATCOMP2,
                 DECIMALS_FOR_SYMBOL[symbol],
                 block_number,
-            )
+                batch=batch,
+            ))
         elif symbol == "COMP":
-            compstrat_holding += balanceOf(
+            compstrat_holdings.append(balanceOf(
                 CONTRACT_FOR_SYMBOL[symbol],
                 STRATCOMP2,
                 DECIMALS_FOR_SYMBOL[symbol],
                 block_number,
-            )
+                batch=batch,
+            ))
 
     # AAVE Strats
     if block_number < 11096410:
        pass 
     elif block_number < 13399969:
         if symbol == "DAI":
-            aavestrat_holding += strategyCheckBalance(
+            aavestrat_holdings.append(strategyCheckBalance(
                 STRATAAVEDAI,
                 DAI,
                 DECIMALS_FOR_SYMBOL[symbol],
                 block_number,
-            )
+                batch=batch,
+            ))
     elif block_number < 14040716:
         if symbol in ["DAI"]:
-            aavestrat_holding += strategyCheckBalance(
+            aavestrat_holdings.append(strategyCheckBalance(
                 STRATAAVE2,
                 CONTRACT_FOR_SYMBOL[symbol],
                 DECIMALS_FOR_SYMBOL[symbol],
                 block_number,
-            )
+                batch=batch,
+            ))
     else:
         if symbol in ["DAI", "USDT"]:
-            aavestrat_holding += strategyCheckBalance(
+            aavestrat_holdings.append(strategyCheckBalance(
                 STRATAAVE2,
                 CONTRACT_FOR_SYMBOL[symbol],
                 DECIMALS_FOR_SYMBOL[symbol],
                 block_number,
-            )
+                batch=batch,
+            ))
 
     # 3pool
     if(block_number == "latest"
         or block_number > 13677000
         and symbol in ("USDC", "USDT", "DAI")
         ):
-        threepoolstrat_holding += strategyCheckBalance(
+        threepoolstrat_holdings.append(strategyCheckBalance(
             STRATCONVEX1,
             CONTRACT_FOR_SYMBOL[symbol],
             DECIMALS_FOR_SYMBOL[symbol],
             block_number,
-        )
+            batch=batch,
+        ))
     elif (
         block_number > 11831747
         and symbol in ("USDC", "USDT", "DAI")
         ):
-        threepoolstrat_holding += strategyCheckBalance(
+        threepoolstrat_holdings.append(strategyCheckBalance(
             STRAT3POOL,
             CONTRACT_FOR_SYMBOL[symbol],
             DECIMALS_FOR_SYMBOL[symbol],
             block_number,
-        )
+            batch=batch,
+        ))
 
     ora_tok_usd_min = (
-        0 if symbol == "COMP" else priceUSDMint(
+        None if symbol == "COMP" else priceUSDMint(
             VAULT,
             CONTRACT_FOR_SYMBOL[symbol],
-            block_number
+            block_number,
+            batch=batch,
         )
     )
     ora_tok_usd_max = (
-        0 if symbol == "COMP" else priceUSDRedeem(
+        None if symbol == "COMP" else priceUSDRedeem(
             VAULT,
             CONTRACT_FOR_SYMBOL[symbol],
-            block_number
+            block_number,
+            batch=batch,
         )
     )
+    vault_holding = balanceOf(
+        CONTRACT_FOR_SYMBOL[symbol],
+        VAULT,
+        DECIMALS_FOR_SYMBOL[symbol],
+        block_number,
+        batch=batch,
+    )
+
+    batch.execute()
 
     return AssetBlock(
         symbol=symbol,
         block_number=block_number,
-        ora_tok_usd_min=ora_tok_usd_min,
-        ora_tok_usd_max=ora_tok_usd_max,
-        vault_holding=balanceOf(
-            CONTRACT_FOR_SYMBOL[symbol],
-            VAULT,
-            DECIMALS_FOR_SYMBOL[symbol],
-            block_number,
-        ),
-        compstrat_holding=compstrat_holding,
-        threepoolstrat_holding=threepoolstrat_holding,
-        aavestrat_holding=aavestrat_holding,
+        ora_tok_usd_min=0 if ora_tok_usd_min is None else ora_tok_usd_min.result,
+        ora_tok_usd_max=0 if ora_tok_usd_max is None else ora_tok_usd_max.result,
+        vault_holding=vault_holding.result,
+        compstrat_holding=sum_results(compstrat_holdings),
+        threepoolstrat_holding=sum_results(threepoolstrat_holdings),
+        aavestrat_holding=sum_results(aavestrat_holdings),
     )
 
 
@@ -213,18 +237,31 @@ def ensure_supply_snapshot(block_number):
         usdt = ensure_asset("USDT", block_number).total()
         usdc = ensure_asset("USDC", block_number).total()
 
+        batch = Multicall()
+        rebasing_credits = ousd_rebasing_credits(block_number, batch=batch)
+        reported_supply = totalSupply(OUSD, 18, block_number, batch=batch)
+        non_rebasing_supply = ousd_non_rebasing_supply(
+            block_number,
+            batch=batch
+        )
+        credits_per_token = rebasing_credits_per_token(
+            block_number,
+            batch=batch
+        )
+        batch.execute()
+
         s = SupplySnapshot()
         s.block_number = block_number
         s.non_rebasing_credits = Decimal(0)  # No longer used in contract
-        s.credits = ousd_rebasing_credits(block_number) + s.non_rebasing_credits
+        s.credits = rebasing_credits.result + s.non_rebasing_credits
         s.computed_supply = dai + usdt + usdc
-        s.reported_supply = totalSupply(OUSD, 18, block_number)
-        s.non_rebasing_supply = ousd_non_rebasing_supply(block_number)
+        s.reported_supply = reported_supply.result
+        s.non_rebasing_supply = non_rebasing_supply.result
         s.credits_ratio = s.computed_supply / s.credits
         future_fee = (s.computed_supply - s.reported_supply) * Decimal(0.1)
         next_rebase_supply = s.computed_supply - s.non_rebasing_supply - future_fee
         s.rebasing_credits_ratio = next_rebase_supply / s.credits
-        s.rebasing_credits_per_token = rebasing_credits_per_token(block_number)
+        s.rebasing_credits_per_token = credits_per_token.result
         s.save()
         return s
 
@@ -235,14 +272,16 @@ def ensure_staking_snapshot(block_number):
     except OgnStakingSnapshot.DoesNotExist:
         pass
 
-    ogn_balance = balanceOf(OGN, OGN_STAKING, 18, block=block_number)
-    total_outstanding = ogn_staking_total_outstanding(block_number)
+    batch = Multicall()
+    ogn_balance = balanceOf(OGN, OGN_STAKING, 18, block=block_number, batch=batch)
+    total_outstanding = ogn_staking_total_outstanding(block_number, batch=batch)
+    batch.execute()
     user_count = OgnStaked.objects.values('user_address').distinct().count()
 
     return OgnStakingSnapshot.objects.create(
         block_number=block_number,
-        ogn_balance=ogn_balance,
-        total_outstanding=total_outstanding,
+        ogn_balance=ogn_balance.result,
+        total_outstanding=total_outstanding.result,
         user_count=user_count,
     )
 
@@ -254,59 +293,59 @@ def ensure_oracle_snapshot(block_number):
         return existing_snaps
 
     snaps = []
+    batch = Multicall()
 
     # USD price of ETH
-    usd_eth_price = chainlink_ethUsdPrice()
-    if usd_eth_price:
+    usd_eth_price = chainlink_ethUsdPrice(batch=batch)
+
+    # Get oracle prices for all OUSD minting assets
+    ticker_prices = [
+        (
+            ticker,
+            # ETH price
+            chainlink_tokEthPrice(ticker, batch=batch),
+            # USD price
+            # Doesn't currently work?  reverts: "Price is not direct to usd"
+            # chainlink_tokUsdPrice(ticker, batch=batch),
+            # Open Oracle
+            open_oracle_price(ticker, batch=batch),
+        )
+        for ticker in ASSET_TICKERS
+    ]
+
+    batch.execute()
+
+    if usd_eth_price.result:
         snaps.append(
             OracleSnapshot.objects.create(
                 block_number=block_number,
                 oracle=CHAINLINK_ORACLE,
                 ticker_left="ETH",
                 ticker_right="USD",
-                price=usd_eth_price
+                price=usd_eth_price.result
             )
         )
 
-    # Get oracle prices for all OUSD minting assets
-    for ticker in ASSET_TICKERS:
-        # ETH price
-        eth_price = chainlink_tokEthPrice(ticker)
-        if eth_price:
+    for ticker, eth_price, usd_price in ticker_prices:
+        if eth_price.result:
             snaps.append(
                 OracleSnapshot.objects.create(
                     block_number=block_number,
                     oracle=CHAINLINK_ORACLE,
                     ticker_left=ticker,
                     ticker_right="ETH",
-                    price=eth_price
+                    price=eth_price.result
                 )
             )
 
-        # USD price
-        # Doesn't currently work?  reverts: "Price is not direct to usd"
-        # usd_price = chainlink_tokUsdPrice(ticker)
-        # if usd_price:
-        #     snaps.append(
-        #         OracleSnapshot.objects.create(
-        #             block_number=block_number,
-        #             oracle=CHAINLINK_ORACLE,
-        #             ticker_left=ticker,
-        #             ticker_right="USD",
-        #             price=usd_price
-        #         )
-        #     )
-
-        # Open Oracle
-        usd_price = open_oracle_price(ticker)
-        if usd_price:
+        if usd_price.result:
             snaps.append(
                 OracleSnapshot.objects.create(
                     block_number=block_number,
                     oracle=OPEN_ORACLE,
                     ticker_left=ticker,
                     ticker_right="USD",
-                    price=usd_price
+                    price=usd_price.result
                 )
             )
 
@@ -329,42 +368,50 @@ def ensure_ctoken_snapshot(underlying_symbol, block_number):
         return q.first()
 
     else:
-        borrow_rate = borrowRatePerBlock(ctoken_address, block_number)
-        supply_rate = supplyRatePerBlock(ctoken_address, block_number)
-
-        borrow_apy = borrow_rate * Decimal(BLOCKS_PER_YEAR)
-        supply_apy = supply_rate * Decimal(BLOCKS_PER_YEAR)
-
-        total_supply = totalSupply(ctoken_address, 8, block_number)
+        batch = Multicall()
+        borrow_rate = borrowRatePerBlock(ctoken_address, block_number, batch)
+        supply_rate = supplyRatePerBlock(ctoken_address, block_number, batch)
+        total_supply = totalSupply(ctoken_address, 8, block_number, batch)
         exchange_rate_stored = exchangeRateStored(
             ctoken_address,
-            block_number
+            block_number,
+            batch
         )
-
-        s = CTokenSnapshot()
-        s.block_number = block_number
-        s.address = ctoken_address
-        s.borrow_rate = borrow_rate
-        s.borrow_apy = borrow_apy
-        s.supply_rate = supply_rate
-        s.supply_apy = supply_apy
-        s.total_supply = total_supply
-        s.total_borrows = totalBorrows(
+        total_borrows = totalBorrows(
             ctoken_address,
             underlying_decimals,
-            block_number
+            block_number,
+            batch
         )
-        s.total_cash = getCash(
+        total_cash = getCash(
             ctoken_address,
             underlying_decimals,
-            block_number
+            block_number,
+            batch
         )
-        s.total_reserves = totalReserves(
+        total_reserves = totalReserves(
             ctoken_address,
             underlying_decimals,
-            block_number
+            block_number,
+            batch
         )
-        s.exchange_rate_stored = exchange_rate_stored
+        batch.execute()
+
+        borrow_apy = borrow_rate.result * Decimal(BLOCKS_PER_YEAR)
+        supply_apy = supply_rate.result * Decimal(BLOCKS_PER_YEAR)
+
+        s = CTokenSnapshot()
+        s.block_number = block_number
+        s.address = ctoken_address
+        s.borrow_rate = borrow_rate.result
+        s.borrow_apy = borrow_apy
+        s.supply_rate = supply_rate.result
+        s.supply_apy = supply_apy
+        s.total_supply = total_supply.result
+        s.total_borrows = total_borrows.result
+        s.total_cash = total_cash.result
+        s.total_reserves = total_reserves.result
+        s.exchange_rate_stored = exchange_rate_stored.result
         s.save()
 
         return s
@@ -387,34 +434,52 @@ def ensure_aave_snapshot(underlying_symbol, block_number):
         return q.first()
 
     else:
-
-        s = AaveLendingPoolCoreSnapshot()
-        s.block_number = block_number
-        s.asset = asset_address
-        s.borrowing_enabled = AaveLendingPoolCore.isReserveBorrowingEnabled(
-            asset_address
+        batch = Multicall()
+        borrowing_enabled = AaveLendingPoolCore.isReserveBorrowingEnabled(
+            asset_address,
+            batch=batch
         )
-        s.available_liquidity = AaveLendingPoolCore.getReserveAvailableLiquidity(
-            asset_address
+        available_liquidity = AaveLendingPoolCore.getReserveAvailableLiquidity(
+            asset_address,
+            batch=batch
         )
-        s.total_borrows_stable = AaveLendingPoolCore.getReserveTotalBorrowsStable(
-            asset_address
+        total_borrows_stable = AaveLendingPoolCore.getReserveTotalBorrowsStable(
+            asset_address,
+            batch=batch
         )
-        s.total_borrows_variable = AaveLendingPoolCore.getReserveTotalBorrowsVariable(
-            asset_address
+        total_borrows_variable = AaveLendingPoolCore.getReserveTotalBorrowsVariable(
+            asset_address,
+            batch=batch
         )
-        s.total_liquidity = AaveLendingPoolCore.getReserveTotalLiquidity(
-            asset_address
+        total_liquidity = AaveLendingPoolCore.getReserveTotalLiquidity(
+            asset_address,
+            batch=batch
         )
-        s.current_liquidity_rate = AaveLendingPoolCore.getReserveCurrentLiquidityRate(
-            asset_address
+        current_liquidity_rate = AaveLendingPoolCore.getReserveCurrentLiquidityRate(
+            asset_address,
+            batch=batch
         )
-        s.variable_borrow_rate = AaveLendingPoolCore.getReserveCurrentVariableBorrowRate(
-            asset_address
+        variable_borrow_rate = AaveLendingPoolCore.getReserveCurrentVariableBorrowRate(
+            asset_address,
+            batch=batch
         )
-        s.stable_borrow_rate = AaveLendingPoolCore.getReserveCurrentStableBorrowRate(
-            asset_address
+        stable_borrow_rate = AaveLendingPoolCore.getReserveCurrentStableBorrowRate(
+            asset_address,
+            batch=batch
         )
+        batch.execute()
+
+        s = AaveLendingPoolCoreSnapshot()
+        s.block_number = block_number
+        s.asset = asset_address
+        s.borrowing_enabled = borrowing_enabled.result
+        s.available_liquidity = available_liquidity.result
+        s.total_borrows_stable = total_borrows_stable.result
+        s.total_borrows_variable = total_borrows_variable.result
+        s.total_liquidity = total_liquidity.result
+        s.current_liquidity_rate = current_liquidity_rate.result
+        s.variable_borrow_rate = variable_borrow_rate.result
+        s.stable_borrow_rate = stable_borrow_rate.result
         s.save()
 
         return s
@@ -427,21 +492,38 @@ def ensure_3pool_snapshot(block_number):
         return ThreePoolSnapshot.objects.get(block_number=block_number)
 
     except ThreePoolSnapshot.DoesNotExist:
-        balances = ThreePool.get_all_balances(block_number)
+        batch = Multicall()
+        coins = [ThreePool.coins(i, batch=batch) for i in range(3)]
+        balances = [
+            ThreePool.balances(i, block_number, batch=batch)
+            for i in range(3)
+        ]
+        initial_a = ThreePool.initial_A(block_number, batch=batch)
+        future_a = ThreePool.future_A(block_number, batch=batch)
+        initial_a_time = ThreePool.initial_A_time(block_number, batch=batch)
+        future_a_time = ThreePool.future_A_time(block_number, batch=batch)
+        batch.execute()
+
+        balance_for_symbol = {}
+        for coin, balance in zip(coins, balances):
+            symbol = SYMBOL_FOR_CONTRACT[coin.result.lower()]
+            balance_for_symbol[symbol] = Decimal(balance.result) / Decimal(
+                math.pow(10, DECIMALS_FOR_SYMBOL[symbol])
+            )
 
         s = ThreePoolSnapshot()
         s.block_number = block_number
-        s.dai_balance = balances.get("DAI")
-        s.usdc_balance = balances.get("USDC")
-        s.usdt_balance = balances.get("USDT")
-        s.initial_a = ThreePool.initial_A(block_number)
-        s.future_a = ThreePool.future_A(block_number)
+        s.dai_balance = balance_for_symbol.get("DAI")
+        s.usdc_balance = balance_for_symbol.get("USDC")
+        s.usdt_balance = balance_for_symbol.get("USDT")
+        s.initial_a = initial_a.result
+        s.future_a = future_a.result
         s.initial_a_time = datetime.fromtimestamp(
-            ThreePool.initial_A_time(block_number),
+            initial_a_time.result,
             tz=timezone.utc
         )
         s.future_a_time = datetime.fromtimestamp(
-            ThreePool.future_A_time(block_number),
+            future_a_time.result,
             tz=timezone.utc
         )
         s.save()
@@ -0,0 +1,322 @@
+""" Deferred fetching of traces and internal transactions
+
+trace_transaction and Etherscan's internal transactions are the slowest calls
+made to store a transaction, and most consumers only need its receipt logs.
+With DEFER_TRACES=true, transactions are stored without them and a
+TraceRequest is queued instead.  The queue is worked through by
+process_queue() with its own concurrency and rate limits, and pages that need
+the data fetch it on demand with ensure_traced().  Etherscan requests are
+rate limited by core.etherscan.
+
+A missing trace or internal transaction list is stored as {}, the field
+default.
+
+Configuration (environment variables):
+
+ - TRACE_CONCURRENCY - Transactions fetched at once by the queue (default: 4)
+ - TRACE_RATE_LIMIT - trace_transaction requests per second (default: 0, no
+   limit)
+ - INTERNAL_TX_BACKFILL_BATCH_SIZE - Transactions written at once by
+   backfill_internal_transactions() (default: 100)
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection
+from django.db.transaction import atomic
+
+from core import metrics
+from core.blockchain import store
+from core.blockchain.harvest.executor import Progress
+from core.blockchain.rpc import debug_trace_transaction
+from core.blockchain.scheduler import TokenBucket
+from core.etherscan import fetch_concurrently, get_internal_txs_bt_txhash
+from core.logging import get_logger
+from core.models import TraceRequest, Transaction
+
+logger = get_logger(__name__)
+
+CONCURRENCY = int(os.environ.get("TRACE_CONCURRENCY", 4))
+TRACE_RATE_LIMIT = float(os.environ.get("TRACE_RATE_LIMIT", 0))
+BACKFILL_BATCH_SIZE = int(
+    os.environ.get("INTERNAL_TX_BACKFILL_BATCH_SIZE", 100)
+)
+
+# How long to give Etherscan to index a transaction before trusting an empty
+# list of internal transactions
+ETHERSCAN_INDEX_DELAY = timedelta(minutes=10)
+
+# How long a claimed request is hidden from other queue workers
+LEASE = timedelta(minutes=5)
+MAX_BACKOFF = timedelta(hours=6)
+
+trace_bucket = TokenBucket(TRACE_RATE_LIMIT, TRACE_RATE_LIMIT)
+
+
+def get_internal_transactions(tx_hash, block_time=None):
+    """ Get internal transactions for a transaction from Etherscan.  If the
+    block time of the transaction is given and Etherscan has had time to index
+    it, the result is kept in the chain object store.  Raises EtherscanError
+    if Etherscan returns an error.
+    """
+    stored = store.get(store.INTERNAL_TRANSACTIONS, tx_hash)
+    if stored is not None:
+        return stored
+
+    data = get_internal_txs_bt_txhash(tx_hash)
+
+    if data or (
+        block_time is not None
+        and block_time < datetime.now(timezone.utc) - ETHERSCAN_INDEX_DELAY
+    ):
+        store.put(store.INTERNAL_TRANSACTIONS, tx_hash, data)
+
+    return data
+
+
+def get_trace(tx_hash):
+    if store.get(store.TRACE, tx_hash) is None:
+        trace_bucket.acquire()
+    return debug_trace_transaction(tx_hash)
+
+
+def needs_trace(transaction):
+    return transaction.debug_data == {}
+
+
+def needs_internal_transactions(transaction):
+    return transaction.internal_transactions == {}
+
+
+def enqueue(tx_hashes):
+    """ Queue transactions to have their trace and internal transactions
+    fetched
+    """
+    now = datetime.now(timezone.utc)
+    TraceRequest.objects.bulk_create(
+        [TraceRequest(tx_hash=x, available_at=now) for x in tx_hashes],
+        ignore_conflicts=True
+    )
+
+
+def fetch_missing(transaction, trace=True):
+    """ Fetch and store whatever a Transaction is missing.  Returns None when
+    it is complete, or the time to try again if the data isn't available yet.
+    """
+    retry_at = None
+
+    if trace and needs_trace(transaction):
+        debug = get_trace(transaction.tx_hash)
+        # Only traces of mined transactions have any entries
+        if debug:
+            transaction.conditional_update(debug_data=debug)
+        else:
+            retry_at = datetime.now(timezone.utc) + LEASE
+
+    if needs_internal_transactions(transaction):
+        indexed_at = transaction.block_time + ETHERSCAN_INDEX_DELAY
+        internal_transactions = get_internal_transactions(
+            transaction.tx_hash,
+            transaction.block_time
+        )
+        if internal_transactions or indexed_at < datetime.now(timezone.utc):
+            transaction.conditional_update(
+                internal_transactions=internal_transactions
+            )
+        else:
+            retry_at = max(retry_at or indexed_at, indexed_at)
+
+    return retry_at
+
+
+def ensure_traced(transaction, trace=True):
+    """ Fetch a transaction's missing trace and internal transactions now.
+    Failures are logged and leave the transaction as it was.
+    """
+    if not (
+        (trace and needs_trace(transaction))
+        or needs_internal_transactions(transaction)
+    ):
+        return transaction
+
+    try:
+        retry_at = fetch_missing(transaction, trace)
+    except Exception:
+        logger.exception("Failed to fetch trace data for {}".format(
+            transaction.tx_hash
+        ))
+        return transaction
+
+    if retry_at is None and trace:
+        TraceRequest.objects.filter(tx_hash=transaction.tx_hash).delete()
+
+    return transaction
+
+
+def claim(count):
+    """ Lease the next requests that are due """
+    now = datetime.now(timezone.utc)
+
+    with atomic():
+        requests = list(
+            TraceRequest.objects.select_for_update(skip_locked=True)
+            .filter(available_at__lte=now)
+            .order_by("available_at")[:count]
+        )
+        TraceRequest.objects.filter(
+            tx_hash__in=[x.tx_hash for x in requests]
+        ).update(available_at=now + LEASE)
+
+    return requests
+
+
+def process_request(request, subsystem):
+    """ Fetch the data of one queued transaction.  Returns True if done. """
+    try:
+        with metrics.subsystem(subsystem):
+            transaction = Transaction.objects.filter(
+                tx_hash=request.tx_hash
+            ).first()
+
+            try:
+                retry_at = None
+                if transaction is not None:
+                    retry_at = fetch_missing(transaction)
+
+            except Exception as err:
+                logger.exception("Failed to fetch trace data for {}".format(
+                    request.tx_hash
+                ))
+                request.attempts += 1
+                request.last_error = "{}: {}".format(
+                    err.__class__.__name__,
+                    err
+                )
+                request.available_at = datetime.now(timezone.utc) + min(
+                    timedelta(seconds=30 * 2 ** min(request.attempts, 10)),
+                    MAX_BACKOFF
+                )
+                request.save()
+                return False
+
+            if retry_at is None:
+                request.delete()
+                return True
+
+            request.available_at = retry_at
+            request.save()
+            return False
+
+    finally:
+        # Worker threads each get their own connection
+        connection.close()
+
+
+def process_queue(limit=None, concurrency=None):
+    """ Work through due TraceRequests.  Returns the number of transactions
+    completed.
+    """
+    concurrency = concurrency or CONCURRENCY
+    subsystem = metrics.current_subsystem()
+    claimed = 0
+    done = 0
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        while limit is None or claimed < limit:
+            count = concurrency * 10
+            if limit is not None:
+                count = min(count, limit - claimed)
+
+            requests = claim(count)
+            if not requests:
+                break
+
+            claimed += len(requests)
+            done += sum(pool.map(
+                lambda x: process_request(x, subsystem),
+                requests
+            ))
+
+            logger.info("Trace queue: {} of {} transactions done".format(
+                done,
+                claimed
+            ))
+
+    return done
+
+
+def fetch_internal_transactions(tx_hash, block_time):
+    """ Get internal transactions for the backfill, or None if they can't be
+    stored yet
+    """
+    try:
+        data = get_internal_transactions(tx_hash, block_time)
+    except Exception:
+        logger.exception("Failed to fetch internal transactions for {}".format(
+            tx_hash
+        ))
+        return None
+
+    if not data and block_time >= (
+        datetime.now(timezone.utc) - ETHERSCAN_INDEX_DELAY
+    ):
+        return None
+
+    return data
+
+
+def backfill_internal_transactions(limit=None, batch_size=None):
+    """ Fetch the internal transactions of every stored transaction that is
+    missing them, as many at once as the Etherscan rate limit allows.  Rows
+    are streamed from the database and written in batches, so an interrupted
+    run loses at most a batch and the next one carries on from there.
+    Returns the number of transactions updated.
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    query = Transaction.objects.filter(internal_transactions={})
+
+    total = query.count()
+    if limit is not None:
+        total = min(total, limit)
+
+    progress = Progress("backfill_internal_transactions", total)
+    updated = 0
+
+    rows = (
+        query.order_by("block_number")
+        .only("tx_hash", "block_time", "internal_transactions")[:limit]
+        .iterator(chunk_size=batch_size)
+    )
+
+    batch = []
+    for transaction in rows:
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            updated += backfill_batch(batch, progress)
+            batch = []
+
+    if batch:
+        updated += backfill_batch(batch, progress)
+
+    return updated
+
+
+def backfill_batch(transactions, progress):
+    results = fetch_concurrently(
+        fetch_internal_transactions,
+        [(x.tx_hash, x.block_time) for x in transactions]
+    )
+
+    done = []
+    for transaction, data in zip(transactions, results):
+        if data is None:
+            progress.update("unavailable")
+            continue
+
+        transaction.internal_transactions = data
+        done.append(transaction)
+        progress.update()
+
+    Transaction.objects.bulk_update(done, ["internal_transactions"])
+    return len(done)
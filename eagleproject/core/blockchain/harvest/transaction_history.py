@@ -14,14 +14,15 @@ from core.models import (
     AnalyticsReport
 )
 
+from core.blockchain.events import args_of
 from core.blockchain.sigs import (
+    SIG_EVENT_TOTAL_SUPPLY_UPDATED,
+    SIG_EVENT_TOTAL_SUPPLY_UPDATED_HIRES,
     TRANSFER,
 )
 
 from django.db.models import Q
-from core.blockchain.harvest.transactions import (
-    explode_log_data
-)
+from core.blockchain.harvest.traces import ensure_traced
 from core.blockchain.rpc import (
     creditsBalanceOf,
 )
@@ -660,7 +661,8 @@ def ensure_analyzed_transactions(from_block, to_block, start_time, end_time, acc
         tran_query &= Q(block_time__gte=start_time)
         tran_query &= Q(block_time__lt=end_time)
     
-    transactions = Transaction.objects.filter(tx_query)
+    # Records stored straight from logs have no transaction data until enriched
+    transactions = Transaction.objects.filter(tx_query, enriched=True)
     transfer_transactions = map(lambda transfer: transfer.tx_hash, OusdTransfer.objects.filter(tran_query))
 
     analyzed_transactions = []
@@ -671,10 +673,17 @@ def ensure_analyzed_transactions(from_block, to_block, start_time, end_time, acc
             # transaction already analyzed skipping
             return
 
+        if not transaction.enriched:
+            # no transaction data yet, see enrich_transactions
+            return
+
         logs = Log.objects.filter(transaction_hash=transaction.tx_hash)
         account_starting_tx = transaction.receipt_data["from"]
         contract_address = transaction.receipt_data["to"]
-        internal_transactions = transaction.internal_transactions
+        internal_transactions = ensure_traced(
+            transaction,
+            trace=False
+        ).internal_transactions
         received_eth = len(list(filter(lambda tx: tx["to"] == account and float(tx["value"]) > 0, internal_transactions))) > 0
         sent_eth = transaction.data['value'] != '0x0'
         transfer_ousd_out = False
@@ -804,14 +813,14 @@ def do_transaction_analytics(from_block, to_block, start_time, end_time, account
 def get_rebase_logs(from_block, to_block):
     # we use distinct to mitigate the problem of possibly having double logs in database
     if from_block is None and to_block is None:
-        old_logs = Log.objects.filter(topic_0="0x99e56f783b536ffacf422d59183ea321dd80dcd6d23daa13023e8afea38c3df1").order_by('transaction_hash').distinct('transaction_hash')
-        new_logs = Log.objects.filter(topic_0="0x41645eb819d3011b13f97696a8109d14bfcddfaca7d063ec0564d62a3e257235").order_by('transaction_hash').distinct('transaction_hash')
+        old_logs = Log.objects.filter(topic_0=SIG_EVENT_TOTAL_SUPPLY_UPDATED).order_by('transaction_hash').distinct('transaction_hash')
+        new_logs = Log.objects.filter(topic_0=SIG_EVENT_TOTAL_SUPPLY_UPDATED_HIRES).order_by('transaction_hash').distinct('transaction_hash')
     else:
-        old_logs = Log.objects.filter(topic_0="0x99e56f783b536ffacf422d59183ea321dd80dcd6d23daa13023e8afea38c3df1", block_number__gte=from_block, block_number__lte=to_block).order_by('transaction_hash').distinct('transaction_hash')
-        new_logs = Log.objects.filter(topic_0="0x41645eb819d3011b13f97696a8109d14bfcddfaca7d063ec0564d62a3e257235", block_number__gte=from_block, block_number__lte=to_block).order_by('transaction_hash').distinct('transaction_hash')
+        old_logs = Log.objects.filter(topic_0=SIG_EVENT_TOTAL_SUPPLY_UPDATED, block_number__gte=from_block, block_number__lte=to_block).order_by('transaction_hash').distinct('transaction_hash')
+        new_logs = Log.objects.filter(topic_0=SIG_EVENT_TOTAL_SUPPLY_UPDATED_HIRES, block_number__gte=from_block, block_number__lte=to_block).order_by('transaction_hash').distinct('transaction_hash')
 
-    rebase_logs_old = list(map(lambda log: rebase_log(log.block_number, explode_log_data(log.data)[2], log.transaction_hash), old_logs))
-    rebase_logs_new = list(map(lambda log: rebase_log(log.block_number, explode_log_data(log.data)[2] / 10 ** 9, log.transaction_hash), new_logs))
+    rebase_logs_old = list(map(lambda log: rebase_log(log.block_number, args_of(log)["rebasing_credits_per_token"] / 1e18, log.transaction_hash), old_logs))
+    rebase_logs_new = list(map(lambda log: rebase_log(log.block_number, args_of(log)["rebasing_credits_per_token"] / 1e18 / 10 ** 9, log.transaction_hash), new_logs))
     rebase_logs = rebase_logs_old + rebase_logs_new
 
     block_numbers = list(map(lambda rebase_log: rebase_log.block_number, rebase_logs))
@@ -1,6 +1,5 @@
+import os
 from datetime import timedelta
-from django import db
-from multiprocessing import Process
 from django.conf import settings
 from eth_utils import (
     decode_hex,
@@ -10,9 +9,11 @@ from eth_utils import (
 )
 
 from core.etherscan import (
+    EtherscanError,
+    fetch_concurrently,
     get_contract_transactions,
-    get_internal_txs_bt_txhash
 )
+from core.blockchain import store
 from core.blockchain.addresses import OGN_STAKING
 from core.blockchain.const import (
     E_18,
@@ -22,12 +23,18 @@ from core.blockchain.const import (
 )
 from core.blockchain.conversion import human_duration_yield
 from core.blockchain.decode import decode_args, slot
-from core.blockchain.harvest.blocks import ensure_block
+from core.blockchain.events import decode_log
+from core.blockchain.harvest import executor, leases, reorgs, traces
+from core.blockchain.harvest.blocks import ensure_block, ensure_blocks
+from core.blockchain.harvest.traces import get_internal_transactions
+from core.blockchain.harvest.writer import BulkWriter
 from core.blockchain.rpc import (
+    Batch,
+    TooManyResults,
     debug_trace_transaction,
+    get_logs,
     get_transaction,
     get_transaction_receipt,
-    request,
     staking_durationRewardRate,
 )
 
@@ -59,6 +66,12 @@ from core.models import (
 
 logger = get_logger(__name__)
 
+# eth_getLogs block window sizes
+LOG_WINDOW_INITIAL = 1000
+LOG_WINDOW_MAX = int(os.environ.get("LOG_WINDOW_MAX", 100000))
+# Windows with fewer logs than this are grown
+LOG_SPARSE_RESULTS = 1000
+
 def build_debug_tx(tx_hash):
     data = debug_trace_transaction(tx_hash)
     return DebugTx(tx_hash=tx_hash, block_number=0, data=data["result"])
@@ -69,33 +82,41 @@ def ensure_all_transactions(block_number):
     transaction data.  This has the benefit of including failed transactions
     and transactions that do not generate logs.
     """
-    pointers = {x.contract: x for x in EtherscanPointer.objects.all()}
-    if settings.ETHERSCAN_API_KEY:
-        for address in ETHERSCAN_CONTRACTS:
-            if address not in pointers:
-                pointers[address] = EtherscanPointer.objects.create(
-                    contract=address,
-                    last_block=0,
-                )
+    if not settings.ETHERSCAN_API_KEY:
+        return
+
+    with leases.lease_pointers(
+        EtherscanPointer,
+        ETHERSCAN_CONTRACTS,
+        0
+    ) as lease:
+        addresses = list(lease.pointers.keys())
+        tx_lists = fetch_concurrently(get_contract_transactions, [
+            (
+                address,
+                lease.pointers[address].last_block,
+                block_number,
+                block_number - reorgs.CONFIRMATIONS,
+            )
+            for address in addresses
+        ])
 
+        for address, txs in zip(addresses, tx_lists):
             tx_hashes = []
-            for tx in get_contract_transactions(
-                address,
-                pointers[address].last_block,
-                block_number
-            ):
+            for tx in txs:
                 if tx.get('hash') is None:
                     logger.error('No transaction hash found from Etherscan')
                     continue
                 tx_hashes.append(tx['hash'])
 
-            ensure_transaction_and_downsteam_hashes(tx_hashes)
+            for chunk in chunks(tx_hashes, 100):
+                ensure_transaction_and_downsteam_hashes(chunk)
 
-            pointers[address].last_block = block_number
-            pointers[address].save()
+            lease.advance(address, block_number)
 
 
-def maybe_store_transfer_record(log, block):
+def build_transfer_record(log, block):
+    """ Build an OusdTransfer for a log if it's an OUSD transfer """
     # Must be a transfer event
     if log["topics"][0] != TRANSFER:
         return None
@@ -107,24 +128,15 @@ def maybe_store_transfer_record(log, block):
     tx_hash = log["transactionHash"]
     log_index = int(log["logIndex"], 16)
 
-    params = {
-        "block_time": block.block_time,
-        "from_address": "0x" + log["topics"][1][-40:],
-        "to_address": "0x" + log["topics"][2][-40:],
-        "amount": int(slot(log["data"], 0), 16) / E_18,
-    }
-
-    transfer, created = OusdTransfer.objects.get_or_create(
+    return OusdTransfer(
         tx_hash_id=tx_hash,
         log_index=log_index,
-        defaults=params
+        block_time=block.block_time,
+        from_address="0x" + log["topics"][1][-40:],
+        to_address="0x" + log["topics"][2][-40:],
+        amount=int(slot(log["data"], 0), 16) / E_18,
     )
 
-    if not created:
-        transfer.conditional_update(**params)
-
-    return transfer
-
 def explode_log_data(value):
     count = len(value) // 64
     out = []
@@ -132,11 +144,7 @@ def explode_log_data(value):
         out.append(int(value[2 + i * 64 : 2 + i * 64 + 64], 16)/1e18)
     return out
 
-def get_internal_transactions(tx_hash):
-    data = get_internal_txs_bt_txhash(tx_hash)
-    return data
-
-def ensure_transaction_and_downstream(tx_hash):
+def ensure_transaction_and_downstream(tx_hash, writer=None):
     """ Ensure that there's a transaction record """
     db_tx = None
     block = None
@@ -144,23 +152,76 @@ def ensure_transaction_and_downstream(tx_hash):
 
     raw_transaction = get_transaction(tx_hash)
     receipt = get_transaction_receipt(tx_hash)
-    debug = debug_trace_transaction(tx_hash)
-    internal_transactions = get_internal_transactions(tx_hash)
 
     block_number = int(raw_transaction["blockNumber"], 16)
     block = ensure_block(block_number)
 
+    if settings.DEFER_TRACES:
+        # Use what's already stored and leave the rest to the trace queue
+        debug = store.get(store.TRACE, tx_hash)
+        internal_transactions = store.get(
+            store.INTERNAL_TRANSACTIONS,
+            tx_hash
+        )
+    else:
+        debug = debug_trace_transaction(tx_hash)
+        try:
+            internal_transactions = get_internal_transactions(
+                tx_hash,
+                block.block_time
+            )
+        except EtherscanError:
+            # Left to the trace queue
+            logger.exception("Failed to fetch internal transactions for "
+                             "{}".format(tx_hash))
+            internal_transactions = None
+
+    db_tx = save_transaction_and_downstream(
+        tx_hash,
+        block,
+        raw_transaction,
+        receipt,
+        debug,
+        internal_transactions,
+        writer,
+    )
+
+    if debug is None or internal_transactions is None:
+        traces.enqueue([tx_hash])
+
+    return db_tx
+
+
+def save_transaction_and_downstream(
+        tx_hash,
+        block,
+        raw_transaction,
+        receipt,
+        debug,
+        internal_transactions,
+        writer=None):
+    """ Store a transaction record and its logs, transfers and stakes from
+    already fetched data.  If a writer is given, the logs, transfers and
+    stakes are left in it to be flushed by the caller.  A trace or internal
+    transactions of None are left as they are.
+    """
+    block_number = block.block_number
+
     params = {
         "block_number": block_number,
         "block_time": block.block_time,
         "data": raw_transaction,
         "receipt_data": receipt,
-        "debug_data": debug,
-        "internal_transactions": internal_transactions,
         "from_address": receipt["from"],
         "to_address": receipt["to"],
+        "enriched": True,
     }
 
+    if debug is not None:
+        params["debug_data"] = debug
+    if internal_transactions is not None:
+        params["internal_transactions"] = internal_transactions
+
     db_tx, created = Transaction.objects.get_or_create(
         tx_hash=tx_hash,
         defaults=params
@@ -169,20 +230,27 @@ def ensure_transaction_and_downstream(tx_hash):
     if not created:
         db_tx.conditional_update(**params)
 
+    flush = writer is None
+    if flush:
+        writer = BulkWriter()
+
     for log in receipt["logs"]:
-        ensure_log_record(log)
-        maybe_store_transfer_record(log, block)
-        maybe_store_stake_withdrawn_record(log, block)
+        writer.add(build_log_record(log))
+        writer.add(build_transfer_record(log, block))
+        writer.add(build_stake_withdrawn_record(log, block))
+
+    if flush:
+        writer.flush()
 
     return db_tx
 
 
-def ensure_log_record(raw_log):
+def build_log_record(raw_log):
+    """ Build a Log from a raw RPC log, decoding known events """
     block_number = int(raw_log["blockNumber"], 16)
     log_index = int(raw_log["logIndex"], 16)
     transaction_index = int(raw_log["transactionIndex"], 16)
 
-    log = None
     topic_0 = ""
     topic_1 = ""
     topic_2 = ""
@@ -197,97 +265,229 @@ def ensure_log_record(raw_log):
     if len(raw_log["topics"]) == 4:
         topic_3 = raw_log["topics"][3]
 
-    params = {
-        "address": raw_log["address"],
-        "transaction_hash": raw_log["transactionHash"],
-        "transaction_index": transaction_index,
-        "data": raw_log["data"],
-        "event_name": "",
-        "topic_0": topic_0,
-        "topic_1": topic_1,
-        "topic_2": topic_2,
-        "topic_3": topic_3,
-    }
+    event_name, args = decode_log(raw_log["topics"], raw_log["data"])
 
-    log, created = Log.objects.get_or_create(
+    return Log(
         block_number=block_number,
         transaction_index=transaction_index,
         log_index=log_index,
-        defaults=params
+        address=raw_log["address"],
+        transaction_hash=raw_log["transactionHash"],
+        data=raw_log["data"],
+        event_name=event_name,
+        args=args,
+        topic_0=topic_0,
+        topic_1=topic_1,
+        topic_2=topic_2,
+        topic_3=topic_3,
     )
 
-    if not created:
-        log.conditional_update(**params)
+def prefetch_blocks(tx_hashes):
+    """ Fetch the transactions not yet in the chain object store in one
+    batch, then create the Block records of all of them at once
+    """
+    raw_transactions = store.get_many(store.TRANSACTION, tx_hashes)
+    missing = [x for x in tx_hashes if x not in raw_transactions]
+
+    if missing:
+        batch = Batch()
+        requests = {x: batch.get_transaction(x) for x in missing}
+        batch.execute()
+
+        # Pending transactions have no block yet and may still change
+        fetched = {
+            tx_hash: req.result
+            for tx_hash, req in requests.items()
+            if req.result is not None and req.result.get("blockNumber")
+        }
+        store.put_many(store.TRANSACTION, fetched)
+        raw_transactions.update(fetched)
+
+    ensure_blocks(
+        int(x["blockNumber"], 16) for x in raw_transactions.values()
+    )
 
-    return log
 
 def ensure_transaction_and_downsteam_hashes(tx_hashes):
+    prefetch_blocks(tx_hashes)
+    store.prefetch(store.RECEIPT, tx_hashes)
+    store.prefetch(store.TRACE, tx_hashes)
+    store.prefetch(store.INTERNAL_TRANSACTIONS, tx_hashes)
+
+    writer = BulkWriter()
+
     for tx_hash in tx_hashes:
-        ensure_transaction_and_downstream(tx_hash)
-
-def ensure_transaction_and_downsteam_in_paralel(tx_hashes, totalProcessed):
-    print("Processing {} transactions of total processed {}".format(len(tx_hashes), totalProcessed))
-    processes = []
-
-    # Multiprocessing copies connection objects between processes because it forks processes
-    # and therefore copies all the file descriptors of the parent process. That being said, 
-    # a connection to the SQL server is just a file, you can see it in linux under /proc//fd/....
-    # any open file will be shared between forked processes.
-    # closing all connections just forces the processes to open new connections within the new 
-    # process.
-    # Not doing this causes PSQL connection errors because multiple processes are using a single connection in 
-    # a non locking manner.
-    db.connections.close_all()
-    for tx_hash in tx_hashes:
-        p = Process(target=ensure_transaction_and_downstream, args=(tx_hash, ))
-        p.start()
-        processes.append(p)
-    for p in processes:
-        p.join()
-
-def download_logs_from_contract(contract, start_block, end_block):
-    logger.info("D {} {} {}".format(contract, start_block, end_block))
-    data = request(
-        "eth_getLogs",
-        [
-            {
-                "fromBlock": hex(start_block),
-                "toBlock": hex(end_block),
-                "address": contract,
-            }
-        ],
+        ensure_transaction_and_downstream(tx_hash, writer)
+
+    writer.flush()
+
+def ensure_transaction_and_downsteam_in_paralel(tx_hashes, totalProcessed=0):
+    """ Store transactions on the harvest worker pool.  Returns the list of
+    executor Failures.
+    """
+    logger.info("Processing {} transactions of total processed {}".format(
+        len(tx_hashes),
+        totalProcessed
+    ))
+    return executor.run(
+        ensure_transaction_and_downstream,
+        tx_hashes,
+        label="transactions"
+    )
+
+def download_logs(addresses, start_block, end_block):
+    """ Store the transactions of all logs from the given contracts in a
+    block range.  Returns the number of logs found.
+    """
+    logger.info("D {} contracts {} {}".format(
+        len(addresses),
+        start_block,
+        end_block
+    ))
+    logs = get_logs(addresses, start_block, end_block)
+
+    if settings.LOG_FIRST_HARVEST:
+        store_logs(logs)
+    else:
+        tx_hashes = set([x["transactionHash"] for x in logs])
+        ensure_transaction_and_downsteam_hashes(list(tx_hashes))
+
+    return len(logs)
+
+
+def store_logs(logs):
+    """ Store Log, OusdTransfer and OgnStaked records straight from
+    eth_getLogs results.  Their transactions are stored as unenriched records
+    to be filled in later by enrich_transactions().
+    """
+    logs = [x for x in logs if not x.get("removed")]
+
+    if not logs:
+        return
+
+    blocks = ensure_blocks(set(int(x["blockNumber"], 16) for x in logs))
+
+    stubs = {}
+    for log in logs:
+        block = blocks[int(log["blockNumber"], 16)]
+        stubs[log["transactionHash"]] = Transaction(
+            tx_hash=log["transactionHash"],
+            block_number=block.block_number,
+            block_time=block.block_time,
+            notes="",
+            enriched=False,
+        )
+
+    Transaction.objects.bulk_create(
+        stubs.values(),
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+    writer = BulkWriter()
+
+    for log in logs:
+        block = blocks[int(log["blockNumber"], 16)]
+        writer.add(build_log_record(log))
+        writer.add(build_transfer_record(log, block))
+        writer.add(build_stake_withdrawn_record(log, block))
+
+    writer.flush()
+
+
+def enrich_transactions(limit=None, workers=None):
+    """ Fetch the transaction, receipt, trace and internal transactions of
+    records created from logs, in batches spread over the harvest worker
+    pool.  Returns the number of transactions enriched.
+    """
+    tx_hashes = list(
+        Transaction.objects.filter(enriched=False)
+        .order_by("block_number")
+        .values_list("tx_hash", flat=True)[:limit]
     )
 
-    tx_hashes = set([x["transactionHash"] for x in data["result"]])
+    # Failed batches stay unenriched and are picked up by the next run
+    failures = executor.run(
+        ensure_transaction_and_downsteam_hashes,
+        chunks(tx_hashes, 100),
+        workers=workers,
+        chunk_size=1,
+        label="enrich_transactions"
+    )
 
-    ensure_transaction_and_downsteam_hashes(list(tx_hashes))
+    return len(tx_hashes) - sum(len(x.item) for x in failures)
 
 
 def ensure_latest_logs(upto):
-    pointers = {x.contract: x for x in LogPointer.objects.all()}
-    # Keep in mind that GAE isn't best suited for parallelism. And if we were to go for it
-    # we need to improve the error handling.
-    for contract in LOG_CONTRACTS:
-        ensure_latest_logs_for_contract(contract, pointers, upto)
-
-
-def ensure_latest_logs_for_contract(contract, pointers, upto):
-    pointer = None
-    if contract not in pointers:
-        pointer = LogPointer(contract=contract, last_block=START_OF_EVERYTHING)
-        pointer.save()
-    else:
-        pointer = pointers[contract]
-    start_block = pointer.last_block + 1
+    """ Fetch logs for all LOG_CONTRACTS with a single eth_getLogs per block
+    window.  The window grows while results are sparse and is halved when the
+    provider refuses a range for returning too many results.  Each contract's
+    LogPointer only moves past blocks that have been fully stored.
+
+    Only contracts whose pointer this instance could lease are fetched, so
+    several instances can share the work.
+    """
+    with leases.lease_pointers(
+        LogPointer,
+        LOG_CONTRACTS,
+        START_OF_EVERYTHING
+    ) as lease:
+        if lease.pointers:
+            download_leased_logs(lease, upto)
+
+
+def download_leased_logs(lease, upto):
+    pointers = lease.pointers
+    contracts = list(pointers.keys())
+
+    start_block = min(
+        pointers[contract].last_block for contract in contracts
+    ) + 1
+    window = LOG_WINDOW_INITIAL
+    # Largest window not known to return too many results
+    ceiling = LOG_WINDOW_MAX
+
     while start_block <= upto:
-        end_block = min(start_block + 1000, upto)
-        download_logs_from_contract(contract, start_block, end_block)
-        pointer.last_block = end_block
-        pointer.save()
-        start_block = pointer.last_block + 1    
+        end_block = min(start_block + window - 1, upto)
+
+        # Only ask for contracts that are behind in this range
+        addresses = [
+            contract for contract in contracts
+            if pointers[contract].last_block < end_block
+        ]
+
+        try:
+            count = download_logs(addresses, start_block, end_block)
+
+        except TooManyResults:
+            if window == 1:
+                raise
+            window = max(1, window // 2)
+            ceiling = window
+            logger.info("Too many logs, shrinking window to {}".format(
+                window
+            ))
+            continue
+
+        # Keep the hash of the pointer block, so reorgs below it are noticed
+        if end_block > upto - reorgs.CONFIRMATIONS:
+            ensure_block(end_block)
+
+        for contract in addresses:
+            lease.advance(contract, end_block)
+
+        start_block = end_block + 1
+
+        # Let the ceiling recover after dense ranges have passed
+        if window == ceiling and count < LOG_SPARSE_RESULTS // 10:
+            ceiling = min(ceiling * 2, LOG_WINDOW_MAX)
+
+        if count < LOG_SPARSE_RESULTS:
+            window = min(window * 2, ceiling)
 
 
-def maybe_store_stake_withdrawn_record(log, block):
+def build_stake_withdrawn_record(log, block):
+    """ Build an OgnStaked for a log if it's a Staked or Withdrawn event """
     # Must be a Staked or Withdrawn event
     if (
         log["address"] != OGN_STAKING or
@@ -420,27 +620,17 @@ def maybe_store_stake_withdrawn_record(log, block):
         _rate = slot(log["data"], 2)
         duration, rate = human_duration_yield(_duration, _rate)
 
-    params = {
-        "block_time": block.block_time,
-        "user_address": staker,
-        "is_staked": is_staked_event,
-        "amount": amount,
-        # This is apparently withdrawn amount and the name makes no sense
-        "staked_amount": int(slot(log["data"], 1), 16) / E_18 if is_withdrawn_event else 0,
-        "duration": duration,
-        "staked_duration": timedelta(days=duration),
-        "rate": rate,
-        "stake_type": stake_type,
-    }
-
-    staked, created = OgnStaked.objects.get_or_create(
+    return OgnStaked(
         tx_hash=tx_hash,
         log_index=log_index,
-        defaults=params,
+        block_time=block.block_time,
+        user_address=staker,
+        is_staked=is_staked_event,
+        amount=amount,
+        # This is apparently withdrawn amount and the name makes no sense
+        staked_amount=int(slot(log["data"], 1), 16) / E_18 if is_withdrawn_event else 0,
+        duration=duration,
+        staked_duration=timedelta(days=duration),
+        rate=rate,
+        stake_type=stake_type,
     )
-
-    if not created:
-        staked.conditional_update(**params)
-        staked.save()
-
-    return staked
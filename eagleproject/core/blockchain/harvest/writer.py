@@ -0,0 +1,133 @@
+""" Batched writes of harvested records
+
+Rows are collected in a BulkWriter and written with one
+INSERT ... ON CONFLICT DO UPDATE per table and chunk, instead of a
+get_or_create() and conditional_update() per row.  Existing rows with the
+same natural key are updated in place, so re-harvesting is idempotent.
+"""
+from django.db import connection, transaction
+
+from core.blockchain.utils import chunks
+from core.logging import get_logger
+from core.models import Log, OgnStaked, OusdTransfer
+
+logger = get_logger(__name__)
+
+# Natural key of each model, matching its unique constraint
+CONFLICT_FIELDS = {
+    Log: ["block_number", "transaction_index", "log_index"],
+    OusdTransfer: ["tx_hash", "log_index"],
+    OgnStaked: ["tx_hash", "log_index"],
+}
+
+# Write order, so foreign keys resolve
+MODELS = [Log, OusdTransfer, OgnStaked]
+
+CHUNK_SIZE = 500
+
+
+def bulk_upsert(model, rows, conflict_fields):
+    """ Insert model instances, updating all other fields of rows that
+    conflict on conflict_fields
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+
+    fields = [
+        x for x in meta.concrete_fields
+        if not x.primary_key or x.name in conflict_fields
+    ]
+    conflict_columns = [meta.get_field(x).column for x in conflict_fields]
+    update_columns = [
+        x.column for x in fields if x.column not in conflict_columns
+    ]
+
+    # Postgres refuses to update the same row twice in one statement
+    unique = {}
+    for row in rows:
+        key = tuple(
+            meta.get_field(x).get_db_prep_save(
+                getattr(row, meta.get_field(x).attname),
+                connection
+            )
+            for x in conflict_fields
+        )
+        unique[key] = row
+
+    if connection.vendor == "postgresql":
+        # Skip writes that wouldn't change anything
+        where = " WHERE ({}) IS DISTINCT FROM ({})".format(
+            ", ".join("{}.{}".format(quote(meta.db_table), quote(x))
+                      for x in update_columns),
+            ", ".join("EXCLUDED.{}".format(quote(x)) for x in update_columns),
+        )
+    else:
+        where = ""
+
+    count = 0
+
+    with connection.cursor() as cursor:
+        for chunk in chunks(list(unique.values()), CHUNK_SIZE):
+            placeholders = "({})".format(", ".join(["%s"] * len(fields)))
+            params = []
+
+            for row in chunk:
+                for field in fields:
+                    params.append(field.get_db_prep_save(
+                        getattr(row, field.attname),
+                        connection
+                    ))
+
+            cursor.execute(
+                "INSERT INTO {} ({}) VALUES {} "
+                "ON CONFLICT ({}) DO UPDATE SET {}{}".format(
+                    quote(meta.db_table),
+                    ", ".join(quote(x.column) for x in fields),
+                    ", ".join([placeholders] * len(chunk)),
+                    ", ".join(quote(x) for x in conflict_columns),
+                    ", ".join(
+                        "{0} = EXCLUDED.{0}".format(quote(x))
+                        for x in update_columns
+                    ),
+                    where,
+                ),
+                params
+            )
+            count += len(chunk)
+
+    return count
+
+
+class BulkWriter:
+    """ Collects Log, OusdTransfer and OgnStaked rows to write at once """
+
+    def __init__(self):
+        self.rows = {model: [] for model in MODELS}
+
+    def __len__(self):
+        return sum(len(x) for x in self.rows.values())
+
+    def add(self, row):
+        """ Queue a model instance for writing.  None is ignored. """
+        if row is not None:
+            self.rows[row.__class__].append(row)
+
+    def flush(self):
+        """ Write all queued rows """
+        if not len(self):
+            return
+
+        with transaction.atomic():
+            for model in MODELS:
+                if self.rows[model]:
+                    count = bulk_upsert(
+                        model,
+                        self.rows[model],
+                        CONFLICT_FIELDS[model]
+                    )
+                    logger.debug("Upserted {} {} rows".format(
+                        count,
+                        model.__name__
+                    ))
+
+        self.rows = {model: [] for model in MODELS}
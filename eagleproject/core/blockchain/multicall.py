@@ -0,0 +1,164 @@
+""" Aggregate eth_calls into Multicall contract calls
+
+A Multicall is a drop-in replacement for rpc.Batch.  Any getter in
+core.blockchain.rpc that accepts a `batch` kwarg can be queued on it.  When
+executed, all queued eth_calls for the same block are packed into a single
+Multicall eth_call, and any other requests (e.g. eth_getStorageAt) are sent
+alongside it in the same JSON-RPC batch.
+"""
+from eth_abi import decode_single, encode_single
+from eth_utils import decode_hex, encode_hex
+
+from core.blockchain.addresses import MULTICALL, MULTICALL2
+from core.blockchain.const import START_OF_MULTICALL, START_OF_MULTICALL2
+from core.blockchain.rpc import Batch
+from core.blockchain.sigs import SIG_FUNC_AGGREGATE, SIG_FUNC_TRY_AGGREGATE
+from core.blockchain.utils import chunks
+from core.logging import get_logger
+
+log = get_logger(__name__)
+
+# Max number of calls to pack into one aggregate call
+MAX_MULTICALL_SIZE = 100
+
+SUB_CALL_FAILED = {"code": -32000, "message": "Multicall sub-call failed"}
+
+
+def block_number_from_tag(tag):
+    """ Get the block number from an eth_call block tag ("latest" is None) """
+    if tag == "latest":
+        return None
+    return int(tag, 16)
+
+
+def encode_aggregate(calls):
+    """ Encode aggregate((address,bytes)[]) calldata """
+    return SIG_FUNC_AGGREGATE[:10] + encode_single(
+        "((address,bytes)[])",
+        [[(to, decode_hex(data)) for to, data in calls]]
+    ).hex()
+
+
+def encode_try_aggregate(calls):
+    """ Encode tryAggregate(bool,(address,bytes)[]) calldata, allowing
+    individual calls to fail
+    """
+    return SIG_FUNC_TRY_AGGREGATE[:10] + encode_single(
+        "(bool,(address,bytes)[])",
+        [False, [(to, decode_hex(data)) for to, data in calls]]
+    ).hex()
+
+
+def decode_aggregate(result):
+    """ Decode aggregate() return data to a list of (success, data) """
+    _, return_data = decode_single("(uint256,bytes[])", decode_hex(result))
+    return [(True, x) for x in return_data]
+
+
+def decode_try_aggregate(result):
+    """ Decode tryAggregate() return data to a list of (success, data) """
+    (return_data,) = decode_single("((bool,bytes)[])", decode_hex(result))
+    return return_data
+
+
+def multicall_for_block(block_number):
+    """ Get the Multicall address and codecs to use for a block.  Returns None
+    if no Multicall contract was deployed at the block.
+    """
+    if block_number is None or block_number >= START_OF_MULTICALL2:
+        return MULTICALL2, encode_try_aggregate, decode_try_aggregate
+    elif block_number >= START_OF_MULTICALL:
+        return MULTICALL, encode_aggregate, decode_aggregate
+    return None
+
+
+class Multicall(Batch):
+    """ A Batch that packs its eth_calls into Multicall aggregate calls.
+
+    Sub-calls that revert are given an error response just as a plain
+    eth_call would be, so getters that tolerate failures (e.g.
+    strategyCheckBalance) behave the same.  Multicall v1 (used before
+    Multicall2 was deployed) reverts if any sub-call fails, in which case the
+    sub-calls are retried individually.
+
+    Usage:
+
+        mc = Multicall()
+        supply = totalSupply(OUSD, 18, block, batch=mc)
+        credits = ousd_rebasing_credits(block, batch=mc)
+        mc.execute()
+        supply.result, credits.result
+    """
+
+    def execute(self):
+        """ Send all requests that have not yet been sent """
+        pending = self.pending()
+
+        if not pending:
+            return self.requests
+
+        batch = Batch(use_cache=False)
+        groups = {}
+        # (request sent in the batch, request it was queued for)
+        forwards = []
+
+        for req in pending:
+            if req.method != "eth_call":
+                forwards.append((batch.add(req.method, req.params), req))
+                continue
+
+            groups.setdefault(req.params[1], []).append(req)
+
+        aggregates = []
+
+        for block_tag, reqs in groups.items():
+            multicall = multicall_for_block(block_number_from_tag(block_tag))
+
+            if multicall is None or len(reqs) == 1:
+                for req in reqs:
+                    forwards.append((batch.add(req.method, req.params), req))
+                continue
+
+            address, encode, decode = multicall
+
+            for chunk in chunks(reqs, MAX_MULTICALL_SIZE):
+                calldata = encode(
+                    [(x.params[0]["to"], x.params[0]["data"]) for x in chunk]
+                )
+                aggregate = batch.add(
+                    "eth_call",
+                    [{"to": address, "data": calldata}, block_tag]
+                )
+                aggregates.append((aggregate, decode, chunk))
+
+        batch.execute()
+
+        retry = Batch(use_cache=False)
+
+        for aggregate, decode, chunk in aggregates:
+            if aggregate.error or "result" not in aggregate.response:
+                log.warning(
+                    "Multicall aggregate failed ({}), retrying {} calls "
+                    "individually".format(aggregate.error, len(chunk))
+                )
+                for req in chunk:
+                    forwards.append((retry.add(req.method, req.params), req))
+                continue
+
+            for req, (success, return_data) in zip(
+                chunk,
+                decode(aggregate.response["result"])
+            ):
+                if success:
+                    req.response = {"result": encode_hex(return_data)}
+                else:
+                    req.response = {"error": SUB_CALL_FAILED}
+
+        retry.execute()
+
+        for sent, req in forwards:
+            req.response = sent.response
+
+        self.store(pending)
+
+        return self.requests
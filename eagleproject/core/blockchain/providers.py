@@ -0,0 +1,376 @@
+""" JSON-RPC provider pool
+
+Requests are spread across all configured providers.  Each request picks the
+better of two random healthy providers, scored by an exponentially weighted
+moving average of their latency and the number of requests they have in
+flight, so throughput scales with the number of providers while slow ones get
+less traffic.  Providers that fail are put in a cooldown that grows with
+consecutive failures and the request fails over to another provider.
+Requests are rate limited per provider by core.blockchain.scheduler.
+
+Requests that need historical state (calls pinned to blocks older than
+ARCHIVE_DEPTH, and traces) only go to archive providers.
+
+Configuration (environment variables):
+
+ - PROVIDER_URLS - Comma separated full node provider URLs
+ - ARCHIVE_PROVIDER_URLS - Comma separated archive node provider URLs
+ - PROVIDER_URL - A single archive provider URL (legacy)
+ - PROVIDER_HEALTH_INTERVAL - Seconds between head block checks, which run
+   in a background thread (default: 60)
+ - PROVIDER_MAX_LAG - Blocks a provider can be behind before it is considered
+   unhealthy (default: 5)
+"""
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from json.decoder import JSONDecodeError
+
+from core import transport
+from core.blockchain.scheduler import TokenBucket
+from core.logging import get_logger
+
+log = get_logger(__name__)
+
+HEALTH_INTERVAL = float(os.environ.get("PROVIDER_HEALTH_INTERVAL", 60))
+MAX_LAG = int(os.environ.get("PROVIDER_MAX_LAG", 5))
+
+# Weight of the newest sample in the latency average
+EWMA_ALPHA = 0.2
+# Latency assumed for a provider with no samples yet
+INITIAL_LATENCY = 0.5
+
+COOLDOWN_BASE = 1
+COOLDOWN_MAX = 300
+
+# Full nodes keep state for about this many recent blocks
+ARCHIVE_DEPTH = 128
+
+ARCHIVE_METHODS = ("trace_transaction", "debug_traceTransaction")
+STATE_METHODS = (
+    "eth_call",
+    "eth_getStorageAt",
+    "eth_getBalance",
+    "eth_getCode",
+)
+
+# Errors full nodes give when asked for state they have pruned
+ARCHIVE_ERROR_MESSAGES = ("missing trie node", "header not found")
+
+
+class NoProviderError(Exception):
+    """ No configured provider can serve a request """
+    pass
+
+
+class Provider:
+    def __init__(self, url, archive=False):
+        self.url = url
+        self.archive = archive
+        self.latency = INITIAL_LATENCY
+        self.in_flight = 0
+        self.failures = 0
+        self.down_until = 0
+        self.head = None
+        self.bucket = TokenBucket()
+        # Requests and health checks update the provider from many threads
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Provider {}{}>".format(
+            transport.host(self.url),
+            " (archive)" if self.archive else ""
+        )
+
+    def is_healthy(self, now):
+        return self.down_until <= now
+
+    def score(self):
+        return self.latency * (self.in_flight + 1)
+
+    def start_request(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end_request(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latency = (
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+            )
+            self.failures = 0
+            self.down_until = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            cooldown = min(
+                COOLDOWN_MAX,
+                COOLDOWN_BASE * 2 ** (self.failures - 1)
+            )
+            self.down_until = time.time() + cooldown
+        log.warning("{} failed {} times, cooling down for {}s".format(
+            self,
+            self.failures,
+            cooldown,
+        ))
+
+
+def split_urls(value):
+    return [x.strip() for x in (value or "").split(",") if x.strip()]
+
+
+def load_providers():
+    """ Build the provider list from the environment """
+    archive_urls = split_urls(os.environ.get("ARCHIVE_PROVIDER_URLS"))
+    urls = split_urls(os.environ.get("PROVIDER_URLS"))
+
+    # The single provider has always been used for everything
+    legacy_url = os.environ.get("PROVIDER_URL")
+    if legacy_url and legacy_url not in archive_urls + urls:
+        archive_urls.append(legacy_url)
+
+    return (
+        [Provider(url, archive=True) for url in archive_urls]
+        + [Provider(url) for url in urls if url not in archive_urls]
+    )
+
+
+_lock = threading.Lock()
+_providers = None
+_last_health_check = 0
+_health_thread = None
+
+
+def get_providers():
+    global _providers
+
+    with _lock:
+        if _providers is None:
+            _providers = load_providers()
+
+    if not _providers:
+        raise Exception("No PROVIDER_URL ENV variable defined")
+
+    return _providers
+
+
+def head_block():
+    """ Highest block seen from any provider, or None if not yet known """
+    heads = [x.head for x in get_providers() if x.head is not None]
+    return max(heads) if heads else None
+
+
+def needs_archive(method, params):
+    """ Check if a request needs an archive node """
+    if method in ARCHIVE_METHODS:
+        return True
+
+    if method not in STATE_METHODS or not params:
+        return False
+
+    tag = params[-1]
+
+    if not isinstance(tag, str) or not tag.startswith("0x"):
+        return False
+
+    head = head_block()
+
+    return head is None or int(tag, 16) < head - ARCHIVE_DEPTH
+
+
+def check_head(provider):
+    """ Refresh the head block of a provider """
+    start = time.time()
+    try:
+        r = transport.send("POST", provider.url, max_retries=0, json={
+            "jsonrpc": "2.0",
+            "id": 0,
+            "method": "eth_blockNumber",
+            "params": [],
+        })
+        provider.head = int(r.json()["result"], 16)
+        provider.record_success(time.time() - start)
+
+    except (
+        transport.TransportError,
+        JSONDecodeError,
+        KeyError,
+        TypeError,
+        ValueError,
+    ):
+        provider.head = None
+        provider.record_failure()
+
+
+def refresh_heads():
+    """ Refresh the head block of every provider at once.  Providers lagging
+    behind the others are put in a cooldown.
+    """
+    providers = get_providers()
+
+    with ThreadPoolExecutor(len(providers)) as pool:
+        list(pool.map(check_head, providers))
+
+    head = head_block()
+
+    for provider in providers:
+        if provider.head is not None and provider.head < head - MAX_LAG:
+            log.warning("{} is {} blocks behind".format(
+                provider,
+                head - provider.head,
+            ))
+            provider.record_failure()
+
+
+def check_health(force=False):
+    """ Refresh the head blocks of the providers, at most once per
+    HEALTH_INTERVAL.  The check runs in a background thread so requests
+    don't wait for it, unless forced.
+    """
+    global _last_health_check, _health_thread
+
+    now = time.time()
+
+    with _lock:
+        if not force and (
+            now - _last_health_check < HEALTH_INTERVAL
+            or (_health_thread is not None and _health_thread.is_alive())
+        ):
+            return
+        _last_health_check = now
+
+        if not force:
+            _health_thread = threading.Thread(
+                target=refresh_heads,
+                name="provider-health",
+                daemon=True,
+            )
+            _health_thread.start()
+            return
+
+    refresh_heads()
+
+
+def candidates(archive=False, exclude=()):
+    return [
+        x for x in get_providers()
+        if (x.archive or not archive) and x not in exclude
+    ]
+
+
+def select(archive=False, exclude=()):
+    """ Pick a provider for a request.  Picks the best scoring of two random
+    healthy candidates, or the one with the earliest cooldown end if none are
+    healthy.
+    """
+    now = time.time()
+    available = candidates(archive, exclude)
+
+    if not available:
+        raise NoProviderError("No {}provider available".format(
+            "archive " if archive else ""
+        ))
+
+    healthy = [x for x in available if x.is_healthy(now)]
+
+    if not healthy:
+        return min(available, key=lambda x: x.down_until)
+
+    if len(healthy) == 1:
+        return healthy[0]
+
+    return min(random.sample(healthy, 2), key=lambda x: x.score())
+
+
+def is_archive_error(data):
+    """ Check if a response says the provider has pruned the needed state """
+    responses = data if isinstance(data, list) else [data]
+
+    for response in responses:
+        error = response.get("error") if isinstance(response, dict) else None
+        if isinstance(error, dict):
+            message = str(error.get("message", "")).lower()
+            if any(x in message for x in ARCHIVE_ERROR_MESSAGES):
+                return True
+
+    return False
+
+
+def is_provider_failure(response):
+    """ Check if a response means the provider failed (rate limits and
+    server errors), rather than the request being refused
+    """
+    return response.status_code >= 500 or transport.should_retry(response)
+
+
+def post(payload, archive=False):
+    """ Send a JSON-RPC payload, failing over between providers.  Returns the
+    final requests.Response.
+    """
+    check_health()
+
+    tried = []
+
+    while True:
+        provider = select(archive=archive, exclude=tried)
+        tried.append(provider)
+        last = not candidates(archive, tried)
+
+        # Providers count each request in a batch against their limits
+        provider.bucket.acquire(
+            len(payload) if isinstance(payload, list) else 1
+        )
+
+        provider.start_request()
+        start = time.time()
+
+        try:
+            # Only keep retrying a provider when there's nowhere else to go
+            r = transport.send(
+                "POST",
+                provider.url,
+                max_retries=None if last else 0,
+                json=payload
+            )
+
+        except transport.TransportError:
+            provider.record_failure()
+            if last:
+                raise
+            continue
+
+        finally:
+            provider.end_request()
+
+        if is_provider_failure(r):
+            provider.record_failure()
+            if last:
+                return r
+            continue
+
+        if r.status_code != 200:
+            # The request itself was refused, any other provider would
+            # refuse it too
+            return r
+
+        provider.record_success(time.time() - start)
+
+        if not archive and not provider.archive:
+            try:
+                missing_state = is_archive_error(r.json())
+            except (JSONDecodeError, ValueError):
+                missing_state = False
+
+            if missing_state and candidates(True, tried):
+                log.info("{} is missing state, retrying on an archive "
+                         "provider".format(provider))
+                archive = True
+                continue
+
+        return r
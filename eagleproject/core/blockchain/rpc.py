@@ -1,13 +1,10 @@
 import os
-import math
 import json
-import requests
+import time
 from decimal import Decimal
 from json.decoder import JSONDecodeError
-from eth_abi import encode_single, decode_single
-from eth_hash.auto import keccak
-from eth_utils import encode_hex, decode_hex
 
+from core.blockchain import cache, coalesce, providers, store
 from core.blockchain.addresses import (
     AAVE_LENDING_POOL_CORE_V1,
     CHAINLINK_ORACLE,
@@ -18,14 +15,16 @@ from core.blockchain.addresses import (
 )
 from core.blockchain.const import (
     DECIMALS_FOR_SYMBOL,
-    E_6,
-    E_8,
-    E_18,
-    E_27,
     SYMBOL_FOR_CONTRACT,
-    TRUE_256BIT,
 )
-from core.blockchain.decode import encode_args
+from core.blockchain.callplan import (
+    call_plan,
+    decode_address,
+    decode_bool,
+    decode_uint,
+    scaled_decoder,
+)
+from core.blockchain.utils import chunks
 from core.blockchain.sigs import (
     OPEN_ORACLE_PRICE,
     CHAINLINK_ETH_USD_PRICE,
@@ -42,30 +41,40 @@ from core.blockchain.sigs import (
     SIG_FUNC_TOTAL_RESERVES,
     SIG_FUNC_TOTAL_SUPPLY,
 )
+from core import metrics, transport
 from core.logging import get_logger
 
 log = get_logger(__name__)
 
+# Max number of requests to send in a single JSON-RPC batch
+MAX_BATCH_SIZE = int(os.environ.get("RPC_MAX_BATCH_SIZE", 100))
 
-def request(method, params):
-    url = os.environ.get("PROVIDER_URL")
 
-    if url is None:
-        raise Exception("No PROVIDER_URL ENV variable defined")
+def request(method, params):
+    archive = providers.needs_archive(method, params)
 
-    params = {
+    payload = {
         "jsonrpc": "2.0",
         "id": 0,
         "method": method,
         "params": params,
     }
 
-    r = requests.post(url, json=params)
+    start = time.time()
+    r = providers.post(payload, archive=archive)
+    elapsed = time.time() - start
 
     try:
-        return r.json()
+        data = r.json()
+        metrics.record_rpc(
+            [(method, params)],
+            elapsed,
+            errors=1 if "error" in data else 0
+        )
+        return data
 
     except JSONDecodeError as err:
+        metrics.record_rpc([(method, params)], elapsed, errors=1)
         try:
             log.error(r.text)
         except Exception:
@@ -77,13 +86,120 @@ def request(method, params):
         raise err
 
 
-def call(to, signature, payload, block="latest"):
-    params = [
+def request_batch(calls):
+    """ Send a list of (method, params) as JSON-RPC batch requests and return
+    the responses in the same order as the given calls.  Each chunk is sent
+    to a separately chosen provider.
+    """
+    responses = []
+
+    for chunk in chunks(calls, MAX_BATCH_SIZE):
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": method,
+                "params": params,
+            }
+            for i, (method, params) in enumerate(chunk)
+        ]
+
+        log.debug("RPC batch of {} requests".format(len(payload)))
+
+        start = time.time()
+        r = providers.post(payload, archive=any(
+            providers.needs_archive(method, params)
+            for method, params in chunk
+        ))
+        elapsed = time.time() - start
+
+        try:
+            data = r.json()
+
+        except JSONDecodeError as err:
+            metrics.record_rpc(chunk, elapsed, errors=len(chunk))
+            try:
+                log.error(r.text)
+            except Exception:
+                pass
+            raise err
+
+        if not isinstance(data, list):
+            # Providers return a single error object when the batch itself
+            # is rejected (e.g. too large or batching not supported)
+            metrics.record_rpc(chunk, elapsed, errors=len(chunk))
+            raise Exception("Batch request failed: {}".format(
+                data.get("error", data)
+            ))
+
+        by_id = {x.get("id"): x for x in data}
+
+        metrics.record_rpc(chunk, elapsed, errors=len([
+            x for x in range(len(chunk))
+            if "error" in by_id.get(x, {"error": None})
+        ]))
+
+        for i in range(len(chunk)):
+            responses.append(by_id.get(i, {
+                "id": i,
+                "error": {"code": -32603, "message": "Missing batch response"},
+            }))
+
+    return responses
+
+
+class TooManyResults(Exception):
+    """ The provider refused an eth_getLogs range for matching too many logs
+    """
+    pass
+
+
+def get_logs(addresses, start_block, end_block):
+    """ Get all logs from a list of contracts in a block range """
+    data = request("eth_getLogs", [{
+        "fromBlock": hex(start_block),
+        "toBlock": hex(end_block),
+        "address": addresses,
+    }])
+
+    if "error" in data:
+        if transport.is_result_limit(data):
+            raise TooManyResults(data["error"].get("message"))
+        raise Exception("eth_getLogs failed: {}".format(data["error"]))
+
+    return data["result"]
+
+
+def call_params(to, signature, payload, block="latest"):
+    return [
         {"to": to, "data": signature + payload},
         block if block == "latest" else hex(block),
     ]
-    log.debug("RPC call params: {}".format(json.dumps(params)))
-    return request("eth_call", params)
+
+
+def call(to, signature, payload, block="latest"):
+    params = call_params(to, signature, payload, block)
+
+    cached = cache.lookup("eth_call", params)
+    if cached is not None:
+        return cached
+
+    def fetch():
+        log.debug("RPC call params: {}".format(json.dumps(params)))
+        data = request("eth_call", params)
+        cache.store("eth_call", params, data)
+        return data
+
+    return coalesce.do("eth_call", params, fetch)
+
+
+def call_or_queue(to, signature, payload, block, decode, batch=None):
+    """ Do an eth_call and decode the response, or if a batch is given, queue
+    it and return the BatchRequest to be resolved when the batch executes.
+    """
+    if batch is not None:
+        return batch.call(to, signature, payload, block, decode=decode)
+    return decode(call(to, signature, payload, block))
 
 
 def call_by_sig(
@@ -92,40 +208,101 @@ def call_by_sig(
         args,
         block="latest") -> dict:
     """ Do an eth_call given a string function signature and an arg array """
-    payload = encode_args(signature, args)
-    sig_hash = encode_hex(keccak(signature.encode('utf-8')))[:10]
-    return call(address, sig_hash, payload, block)
+    plan = call_plan(signature)
+    return call(address, plan.selector, plan.encode(args), block)
+
+
+def call_by_sig_or_queue(address, signature, args, block, decode, batch=None):
+    """ call_by_sig() counterpart of call_or_queue() """
+    plan = call_plan(signature)
+    return call_or_queue(
+        address,
+        plan.selector,
+        plan.encode(args),
+        block,
+        decode,
+        batch
+    )
+
+
+# Decode a "wad" value (18 decimals) from an RPC response
+decode_wad = scaled_decoder(18)
+
+# Decode a "ray" value (27 decimals) from an RPC response
+decode_ray = scaled_decoder(27)
+
+
+def decode_first_slot(decimals):
+    """ Get a decoder for the first 256bit slot of a response scaled down by
+    the given decimals
+    """
+    return scaled_decoder(decimals)
 
 
 def call_and_return_wad(
         address,
         signature,
         args,
-        block="latest") -> Decimal:
+        block="latest",
+        batch=None) -> Decimal:
     """ Make an RPC call and return a "wad" value (18 decimals) """
-    data = call_by_sig(address, signature, args, block)
-    return Decimal(int(data["result"], 16)) / E_18
+    return call_by_sig_or_queue(
+        address,
+        signature,
+        args,
+        block,
+        decode_wad,
+        batch
+    )
 
 
 def call_and_return_ray(
         address,
         signature,
         args,
-        block="latest") -> Decimal:
+        block="latest",
+        batch=None) -> Decimal:
     """ Make an RPC call and return a "ray" value (27 decimals) """
-    data = call_by_sig(address, signature, args, block)
-    return Decimal(int(data["result"], 16)) / E_27
+    return call_by_sig_or_queue(
+        address,
+        signature,
+        args,
+        block,
+        decode_ray,
+        batch
+    )
+
+
+def storage_at_params(address, slot, block="latest"):
+    return [address, hex(slot), block if block == "latest" else hex(block)]
 
 
 def storage_at(address, slot, block="latest"):
-    params = [address, hex(slot), block if block == "latest" else hex(block)]
-    return request("eth_getStorageAt", params)
+    params = storage_at_params(address, slot, block)
+
+    cached = cache.lookup("eth_getStorageAt", params)
+    if cached is not None:
+        return cached
+
+    data = request("eth_getStorageAt", params)
+    cache.store("eth_getStorageAt", params, data)
+    return data
 
 
 def debug_trace_transaction(tx_hash):
+    stored = store.get(store.TRACE, tx_hash)
+    if stored is not None:
+        return stored
+
     params = [tx_hash]
     data = request("trace_transaction", params)
-    return data.get("result", {})
+    result = data.get("result", {})
+
+    # Only traces of mined transactions have any entries
+    if result:
+        store.put(store.TRACE, tx_hash, result)
+
+    return result
 
 
 def latest_block():
@@ -134,154 +311,398 @@ def latest_block():
 
 
 def get_block(block_number):
+    stored = store.get(store.BLOCK, block_number)
+    if stored is not None:
+        return stored
+
     hex_block = hex(block_number)
     params = [hex_block, False]
     data = request("eth_getBlockByNumber", params)
+
+    if data["result"] is not None:
+        store.put(store.BLOCK, block_number, data["result"])
+
     return data["result"]
 
 
 def get_transaction(tx_hash):
+    stored = store.get(store.TRANSACTION, tx_hash)
+    if stored is not None:
+        return stored
+
     data = request("eth_getTransactionByHash", [tx_hash])
+
+    # Pending transactions have no block yet and may still change
+    if data["result"] is not None and data["result"].get("blockNumber"):
+        store.put(store.TRANSACTION, tx_hash, data["result"])
+
     return data["result"]
 
 
 def get_transaction_receipt(tx_hash):
+    stored = store.get(store.RECEIPT, tx_hash)
+    if stored is not None:
+        return stored
+
     data = request("eth_getTransactionReceipt", [tx_hash])
+
+    if data["result"] is not None:
+        store.put(store.RECEIPT, tx_hash, data["result"])
+
     return data["result"]
 
 
+class BatchRequest:
+    """ A single request queued in a Batch.  The decoded value is available
+    from `result` once the batch has been executed.
+    """
+
+    def __init__(self, method, params, decode=None):
+        self.method = method
+        self.params = params
+        self.decode = decode
+        self.response = None
+        self._decoded = False
+        self._value = None
+
+    @property
+    def error(self):
+        if self.response is None:
+            return None
+        return self.response.get("error")
+
+    @property
+    def result(self):
+        if self.response is None:
+            raise Exception("Batch request has not been executed")
+
+        if not self._decoded:
+            if self.decode is not None:
+                self._value = self.decode(self.response)
+            else:
+                self._value = self.response["result"]
+            self._decoded = True
+
+        return self._value
+
+
+class Batch:
+    """ Queue up JSON-RPC requests to be sent together as one batch request.
+
+    Usage:
+
+        batch = Batch()
+        supply = totalSupply(OUSD, 18, block, batch=batch)
+        credits = ousd_rebasing_credits(block, batch=batch)
+        batch.execute()
+        supply.result, credits.result
+    """
+
+    def __init__(self, use_cache=True):
+        self.requests = []
+        self.use_cache = use_cache
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, method, params, decode=None) -> BatchRequest:
+        req = BatchRequest(method, params, decode)
+        self.requests.append(req)
+        return req
+
+    def call(self, to, signature, payload, block="latest", decode=None):
+        return self.add(
+            "eth_call",
+            call_params(to, signature, payload, block),
+            decode
+        )
+
+    def storage_at(self, address, slot, block="latest", decode=None):
+        return self.add(
+            "eth_getStorageAt",
+            storage_at_params(address, slot, block),
+            decode
+        )
+
+    def get_block(self, block_number):
+        return self.add(
+            "eth_getBlockByNumber",
+            [hex(block_number), False],
+            lambda data: data["result"]
+        )
+
+    def get_transaction(self, tx_hash):
+        return self.add(
+            "eth_getTransactionByHash",
+            [tx_hash],
+            lambda data: data["result"]
+        )
+
+    def pending(self):
+        """ Get the requests without a response, after filling in any that
+        have a cached or recent response
+        """
+        pending = [x for x in self.requests if x.response is None]
+
+        if self.use_cache and pending:
+            for req, result in zip(
+                pending,
+                cache.lookup_many([(x.method, x.params) for x in pending])
+            ):
+                if result is not None:
+                    req.response = {"result": result}
+
+            for req in pending:
+                if req.response is None:
+                    req.response = coalesce.recent(req.method, req.params)
+
+        return [x for x in pending if x.response is None]
+
+    def store(self, requests):
+        """ Cache the responses of the given executed requests """
+        if self.use_cache:
+            cache.store_many(
+                [(x.method, x.params) for x in requests],
+                [x.response for x in requests]
+            )
+            for req in requests:
+                coalesce.remember(req.method, req.params, req.response)
+
+    def execute(self):
+        """ Send all requests that have not yet been sent """
+        pending = self.pending()
+
+        if not pending:
+            return self.requests
+
+        responses = request_batch([(x.method, x.params) for x in pending])
+
+        for req, response in zip(pending, responses):
+            req.response = response
+
+        self.store(pending)
+
+        return self.requests
+
+
 def creditsBalanceOf(holder, block="latest"):
-    signature = encode_hex(keccak(b"creditsBalanceOf(address)"))[:10]
-    payload = encode_single("(address)", [holder]).hex()
-    data = call(OUSD, signature, payload, block)
-
-    return (Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-        math.pow(10, 18)
-    ),
-        Decimal(int(data["result"][64 + 2 : 2 * 64 + 2], 16)) / Decimal(
-        math.pow(10, 18)
-    ))
-
-def balanceOf(coin_contract, holder, decimals, block="latest"):
-    signature = "0x70a08231"
-    payload = encode_single("(address)", [holder]).hex()
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-        math.pow(10, decimals)
+    data = call_by_sig(OUSD, "creditsBalanceOf(address)", [holder], block)
+    return scaled_decoder(18, 0)(data), scaled_decoder(18, 1)(data)
+
+
+def balanceOf(coin_contract, holder, decimals, block="latest", batch=None):
+    return call_by_sig_or_queue(
+        coin_contract,
+        "balanceOf(address)",
+        [holder],
+        block,
+        decode_first_slot(decimals),
+        batch
     )
 
 
-def totalSupply(coin_contract, decimals, block="latest"):
+def totalSupply(coin_contract, decimals, block="latest", batch=None):
     signature = SIG_FUNC_TOTAL_SUPPLY[:10]
     payload = ""
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-        math.pow(10, decimals)
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_first_slot(decimals),
+        batch
     )
 
 
-def totalBorrows(coin_contract, decimals, block="latest"):
+def totalBorrows(coin_contract, decimals, block="latest", batch=None):
     signature = SIG_FUNC_TOTAL_BORROWS[:10]
     payload = ""
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-        math.pow(10, decimals)
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_first_slot(decimals),
+        batch
     )
 
 
-def totalReserves(coin_contract, decimals, block="latest"):
+def totalReserves(coin_contract, decimals, block="latest", batch=None):
     signature = SIG_FUNC_TOTAL_RESERVES[:10]
     payload = ""
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-        math.pow(10, decimals)
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_first_slot(decimals),
+        batch
     )
 
 
-def getCash(coin_contract, decimals, block="latest"):
+def getCash(coin_contract, decimals, block="latest", batch=None):
     signature = SIG_FUNC_GET_CASH[:10]
     payload = ""
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-        math.pow(10, decimals)
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_first_slot(decimals),
+        batch
     )
 
 
-def exchangeRateStored(coin_contract, block="latest"):
+def exchangeRateStored(coin_contract, block="latest", batch=None):
     signature = SIG_FUNC_EXCHANGE_RATE_STORED[:10]
     payload = ""
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0:64+2], 16)) / E_18
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_wad,
+        batch
+    )
 
 
-def borrowRatePerBlock(coin_contract, block="latest"):
+def borrowRatePerBlock(coin_contract, block="latest", batch=None):
     signature = SIG_FUNC_BORROW_RATE[:10]
     payload = ""
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0:64+2], 16)) / E_18
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_wad,
+        batch
+    )
 
 
-def supplyRatePerBlock(coin_contract, block="latest"):
+def supplyRatePerBlock(coin_contract, block="latest", batch=None):
     signature = SIG_FUNC_SUPPLY_RATE[:10]
     payload = ""
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"][0:64+2], 16)) / E_18
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_wad,
+        batch
+    )
 
 
-def open_oracle_price(ticker, block="latest"):
+def open_oracle_price(ticker, block="latest", batch=None):
     signature = OPEN_ORACLE_PRICE[:10]
-    payload = encode_single("(string)", [ticker]).hex()
-    data = call(OPEN_ORACLE, signature, payload, block)
+    payload = call_plan("price(string)").encode([ticker])
     # price() returns 6 decimals
-    return Decimal(int(data["result"][0:64 + 2], 16)) / E_6
+    return call_or_queue(
+        OPEN_ORACLE,
+        signature,
+        payload,
+        block,
+        decode_first_slot(6),
+        batch
+    )
 
 
-def chainlink_ethUsdPrice(block="latest"):
+def chainlink_ethUsdPrice(block="latest", batch=None):
     signature = CHAINLINK_ETH_USD_PRICE[:10]
     payload = ""
-    data = call(CHAINLINK_ORACLE, signature, payload, block)
     # tokEthPrice() returns an ETH-USD price with 6 decimals
-    return Decimal(int(data["result"][0:64 + 2], 16)) / E_6
+    return call_or_queue(
+        CHAINLINK_ORACLE,
+        signature,
+        payload,
+        block,
+        decode_first_slot(6),
+        batch
+    )
 
 
-def chainlink_tokEthPrice(ticker, block="latest"):
+def chainlink_tokEthPrice(ticker, block="latest", batch=None):
     signature = CHAINLINK_TOK_ETH_PRICE[:10]
-    payload = encode_single("(string)", [ticker]).hex()
-    data = call(CHAINLINK_ORACLE, signature, payload, block)
+    payload = call_plan("tokEthPrice(string)").encode([ticker])
     # tokEthPrice() returns an ETH price with 8 decimals for some reason...
-    return Decimal(int(data["result"][0:64 + 2], 16)) / E_8
+    return call_or_queue(
+        CHAINLINK_ORACLE,
+        signature,
+        payload,
+        block,
+        decode_first_slot(8),
+        batch
+    )
 
 
-def chainlink_tokUsdPrice(ticker, block="latest"):
+def chainlink_tokUsdPrice(ticker, block="latest", batch=None):
     signature = CHAINLINK_TOK_USD_PRICE[:10]
-    payload = encode_single("(string)", [ticker]).hex()
-    data = call(CHAINLINK_ORACLE, signature, payload, block)
+    payload = call_plan("tokUsdPrice(string)").encode([ticker])
     # tokEthPrice() returns an ETH price with 8 decimals for some reason...
-    return Decimal(int(data["result"][0:64 + 2], 16)) / E_8
+    return call_or_queue(
+        CHAINLINK_ORACLE,
+        signature,
+        payload,
+        block,
+        decode_first_slot(8),
+        batch
+    )
 
 
-def balanceOfUnderlying(coin_contract, holder, decimals, block="latest"):
-    signature = "0x3af9e669"
+def balanceOfUnderlying(
+        coin_contract,
+        holder,
+        decimals,
+        block="latest",
+        batch=None):
+    scaled = decode_first_slot(decimals)
+
+    def decode(data):
+        try:
+            return scaled(data)
+        except Exception:
+            log.error("balanceOfUnderlying failed")
+            return Decimal(0)
+
     try:
-        payload = encode_single("(address)", [holder]).hex()
-        data = call(coin_contract, signature, payload, block)
-        return Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-            math.pow(10, decimals)
+        return call_by_sig_or_queue(
+            coin_contract,
+            "balanceOfUnderlying(address)",
+            [holder],
+            block,
+            decode,
+            batch
         )
     except Exception:
         log.error("balanceOfUnderlying failed")
         return Decimal(0)
 
 
-def strategyCheckBalance(strategy, coin_contract, decimals, block="latest"):
-    signature = "0x5f515226"
+def strategyCheckBalance(
+        strategy,
+        coin_contract,
+        decimals,
+        block="latest",
+        batch=None):
+    scaled = decode_first_slot(decimals)
+
+    def decode(data):
+        try:
+            if "error" in data:
+                log.error(data['error']['message'])
+            return scaled(data)
+        except Exception as e:
+            log.error("strategyCheckBalance failed")
+            log.error(e)
+            return Decimal(0)
+
     try:
-        payload = encode_single("(address)", [coin_contract]).hex()
-        data = call(strategy, signature, payload, block)
-        if "error" in data:
-            log.error(data['error']['message'])
-        return Decimal(int(data["result"][0 : 64 + 2], 16)) / Decimal(
-            math.pow(10, decimals)
+        return call_by_sig_or_queue(
+            strategy,
+            "checkBalance(address)",
+            [coin_contract],
+            block,
+            decode,
+            batch
         )
     except Exception as e:
         log.error("strategyCheckBalance failed")
@@ -289,47 +710,79 @@ def strategyCheckBalance(strategy, coin_contract, decimals, block="latest"):
         return Decimal(0)
 
 
-def rebasing_credits_per_token(block="latest"):
+def rebasing_credits_per_token(block="latest", batch=None):
     signature = "0x6691cb3d"  # rebasingCreditsPerToken()
-    data = call(OUSD, signature, "", block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / E_18
+    return call_or_queue(
+        OUSD,
+        signature,
+        "",
+        block,
+        decode_first_slot(18),
+        batch
+    )
 
 
-def ousd_rebasing_credits(block="latest"):
+def ousd_rebasing_credits(block="latest", batch=None):
     signature = "0x077f22b7"  # rebasingCredits()
-    data = call(OUSD, signature, "", block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / E_18
+    return call_or_queue(
+        OUSD,
+        signature,
+        "",
+        block,
+        decode_first_slot(18),
+        batch
+    )
 
 
-def ousd_non_rebasing_supply(block="latest"):
+def ousd_non_rebasing_supply(block="latest", batch=None):
     signature = "0xe696393a"  # nonRebasingSupply()
-    data = call(OUSD, signature, "", block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / E_18
+    return call_or_queue(
+        OUSD,
+        signature,
+        "",
+        block,
+        decode_first_slot(18),
+        batch
+    )
+
 
+def ogn_staking_total_outstanding(block, batch=None):
+    if batch is not None:
+        return batch.storage_at(OGN_STAKING, 54, block, decode=decode_wad)
 
-def ogn_staking_total_outstanding(block):
-    data = storage_at(OGN_STAKING, 54, block)
-    return Decimal(int(data["result"][0 : 64 + 2], 16)) / E_18
+    return decode_wad(storage_at(OGN_STAKING, 54, block))
 
 
-def priceUSDMint(coin_contract, assetAddress, block="latest"):
+def priceUSDMint(coin_contract, assetAddress, block="latest", batch=None):
     signature = SIG_FUNC_PRICE_USD_MINT[:10]  # priceUSDMint(address)
-    payload = encode_single("(address)", [assetAddress]).hex()
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"], 16)) / E_18
+    payload = call_plan("priceUSDMint(address)").encode([assetAddress])
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_wad,
+        batch
+    )
 
 
-def priceUSDRedeem(coin_contract, assetAddress, block="latest"):
+def priceUSDRedeem(coin_contract, assetAddress, block="latest", batch=None):
     signature = SIG_FUNC_PRICE_USD_REDEEM[:10]  # priceUSDRedeem(address)
-    payload = encode_single("(address)", [assetAddress]).hex()
-    data = call(coin_contract, signature, payload, block)
-    return Decimal(int(data["result"], 16)) / E_18
+    payload = call_plan("priceUSDRedeem(address)").encode([assetAddress])
+    return call_or_queue(
+        coin_contract,
+        signature,
+        payload,
+        block,
+        decode_wad,
+        batch
+    )
 
 
 def staking_durationRewardRate(address, duration, block="latest"):
     """ SingleAssetStaking.durationRewardRate(uint256 _duration) """
     signature = SIG_FUNC_DURATION_REWARD_RATE[:10]
-    payload = encode_single("(uint256)", [duration]).hex()
+    payload = call_plan("durationRewardRate(uint256)").encode([duration])
     data = call(address, signature, payload, block)
     return Decimal(int(data["result"], 16))
 
@@ -338,79 +791,87 @@ class AaveLendingPoolCore:
     """ LendingPoolCore calls """
 
     @staticmethod
-    def isReserveBorrowingEnabled(address, block="latest") -> bool:
-        data = call_by_sig(
+    def isReserveBorrowingEnabled(address, block="latest", batch=None) -> bool:
+        return call_by_sig_or_queue(
             AAVE_LENDING_POOL_CORE_V1,
             "isReserveBorrowingEnabled(address)",
             [address],
-            block
+            block,
+            decode_bool,
+            batch
         )
-        return data["result"] == TRUE_256BIT
 
     @staticmethod
-    def getReserveAvailableLiquidity(address, decimals=18, block="latest") -> Decimal:
+    def getReserveAvailableLiquidity(address, decimals=18, block="latest", batch=None) -> Decimal:
         return call_and_return_wad(
             AAVE_LENDING_POOL_CORE_V1,
             "getReserveAvailableLiquidity(address)",
             [address],
-            block=block
+            block=block,
+            batch=batch
         )
 
     @staticmethod
-    def getReserveTotalBorrowsStable(address, decimals=18, block="latest") -> Decimal:
+    def getReserveTotalBorrowsStable(address, decimals=18, block="latest", batch=None) -> Decimal:
         return call_and_return_wad(
             AAVE_LENDING_POOL_CORE_V1,
             "getReserveTotalBorrowsStable(address)",
             [address],
-            block=block
+            block=block,
+            batch=batch
         )
 
     @staticmethod
-    def getReserveTotalBorrowsVariable(address, block="latest") -> Decimal:
+    def getReserveTotalBorrowsVariable(address, block="latest", batch=None) -> Decimal:
         return call_and_return_wad(
             AAVE_LENDING_POOL_CORE_V1,
             "getReserveTotalBorrowsVariable(address)",
             [address],
-            block=block
+            block=block,
+            batch=batch
         )
 
     @staticmethod
-    def getReserveTotalLiquidity(address, block="latest") -> Decimal:
+    def getReserveTotalLiquidity(address, block="latest", batch=None) -> Decimal:
         return call_and_return_wad(
             AAVE_LENDING_POOL_CORE_V1,
             "getReserveTotalLiquidity(address)",
             [address],
-            block=block
+            block=block,
+            batch=batch
         )
 
     @staticmethod
-    def getReserveCurrentLiquidityRate(address, block="latest") -> Decimal:
+    def getReserveCurrentLiquidityRate(address, block="latest", batch=None) -> Decimal:
         # Return value is a "Ray" false decimal.  See: ds-math
         return call_and_return_ray(
             AAVE_LENDING_POOL_CORE_V1,
             "getReserveCurrentLiquidityRate(address)",
             [address],
-            block=block
+            block=block,
+            batch=batch
         )
 
     @staticmethod
-    def getReserveCurrentVariableBorrowRate(address, block="latest") -> Decimal:
+    def getReserveCurrentVariableBorrowRate(address, block="latest", batch=None) -> Decimal:
         # Return value is a "Ray" false decimal.  See: ds-math
         return call_and_return_ray(
             AAVE_LENDING_POOL_CORE_V1,
             "getReserveCurrentVariableBorrowRate(address)",
             [address],
-            block=block
+            block=block,
+            batch=batch
         )
 
     @staticmethod
-    def getReserveCurrentStableBorrowRate(address, block="latest") -> Decimal:
+    def getReserveCurrentStableBorrowRate(address, block="latest", batch=None) -> Decimal:
         # Return value is a "Ray" false decimal.  See: ds-math
         return call_and_return_ray(
             AAVE_LENDING_POOL_CORE_V1,
             "getReserveCurrentStableBorrowRate(address)",
             [address],
-            block=block
+            block=block,
+            batch=batch
         )
 
 
@@ -418,10 +879,15 @@ class ThreePool:
     """ RPC Calls for Curve's 3pool """
 
     @staticmethod
-    def coins(index, block="latest"):
-        data = call_by_sig(CURVE_3POOL, "coins(uint256)", [index], block=block)
-        result = data["result"]
-        return decode_single("address", decode_hex(result))
+    def coins(index, block="latest", batch=None):
+        return call_by_sig_or_queue(
+            CURVE_3POOL,
+            "coins(uint256)",
+            [index],
+            block,
+            decode_address,
+            batch
+        )
 
     @staticmethod
     def get_all_coins(block="latest"):
@@ -432,10 +898,15 @@ class ThreePool:
         ]
 
     @staticmethod
-    def balances(index, block="latest"):
-        data = call_by_sig(CURVE_3POOL, "balances(uint256)", [index], block)
-        result = data["result"]
-        return decode_single("uint256", decode_hex(result))
+    def balances(index, block="latest", batch=None):
+        return call_by_sig_or_queue(
+            CURVE_3POOL,
+            "balances(uint256)",
+            [index],
+            block,
+            decode_uint,
+            batch
+        )
 
     @staticmethod
     def get_all_balances(block="latest"):
@@ -446,34 +917,52 @@ class ThreePool:
         for i, coin in enumerate(coins):
             symbol = SYMBOL_FOR_CONTRACT[coin.lower()]
             decimals = DECIMALS_FOR_SYMBOL[symbol]
-            retval[symbol] = Decimal(
-                ThreePool.balances(i)
-            ) / Decimal(
-                math.pow(10, decimals)
+            retval[symbol] = (
+                Decimal(ThreePool.balances(i)) / Decimal(10 ** decimals)
             )
 
         return retval
 
     @staticmethod
-    def initial_A(block="latest"):
-        data = call_by_sig(CURVE_3POOL, "initial_A()", [], block)
-        result = data["result"]
-        return decode_single("uint256", decode_hex(result))
+    def initial_A(block="latest", batch=None):
+        return call_by_sig_or_queue(
+            CURVE_3POOL,
+            "initial_A()",
+            [],
+            block,
+            decode_uint,
+            batch
+        )
 
     @staticmethod
-    def future_A(block="latest"):
-        data = call_by_sig(CURVE_3POOL, "future_A()", [], block)
-        result = data["result"]
-        return decode_single("uint256", decode_hex(result))
+    def future_A(block="latest", batch=None):
+        return call_by_sig_or_queue(
+            CURVE_3POOL,
+            "future_A()",
+            [],
+            block,
+            decode_uint,
+            batch
+        )
 
     @staticmethod
-    def initial_A_time(block="latest"):
-        data = call_by_sig(CURVE_3POOL, "initial_A_time()", [], block)
-        result = data["result"]
-        return decode_single("uint256", decode_hex(result))
+    def initial_A_time(block="latest", batch=None):
+        return call_by_sig_or_queue(
+            CURVE_3POOL,
+            "initial_A_time()",
+            [],
+            block,
+            decode_uint,
+            batch
+        )
 
     @staticmethod
-    def future_A_time(block="latest"):
-        data = call_by_sig(CURVE_3POOL, "future_A_time()", [], block)
-        result = data["result"]
-        return decode_single("uint256", decode_hex(result))
+    def future_A_time(block="latest", batch=None):
+        return call_by_sig_or_queue(
+            CURVE_3POOL,
+            "future_A_time()",
+            [],
+            block,
+            decode_uint,
+            batch
+        )
@@ -0,0 +1,214 @@
+""" Client-side rate limiting of provider requests
+
+Each provider has a token bucket refilled at PROVIDER_RATE_LIMIT requests per
+second.  When requests have to wait for tokens, they are served strictly in
+priority order, so page loads go ahead of snapshots, notify runs and
+backfills.  Lower priorities also leave a reserve of tokens untouched for
+interactive bursts.  Requests that wait longer than the max wait of their
+priority are shed with ScheduleTimeout.
+
+Priority comes from the subsystem the request is made from (see
+core.metrics).  Requests from the asyncio client (see
+core.blockchain.async_rpc) wait in the same queues as the others.
+
+Configuration (environment variables):
+
+ - PROVIDER_RATE_LIMIT - Requests per second per provider (default: 0, no
+   limit)
+ - PROVIDER_BURST - Max tokens a provider's bucket can hold (default: the
+   rate limit)
+"""
+import os
+import time
+import asyncio
+import heapq
+import itertools
+import threading
+
+from core import metrics
+from core.logging import get_logger
+
+log = get_logger(__name__)
+
+RATE_LIMIT = float(os.environ.get("PROVIDER_RATE_LIMIT", 0))
+BURST = float(os.environ.get("PROVIDER_BURST", 0)) or RATE_LIMIT
+
+INTERACTIVE = 0
+SNAPSHOT = 1
+NOTIFY = 2
+BACKFILL = 3
+
+PRIORITY_FOR_SUBSYSTEM = {
+    metrics.VIEWS: INTERACTIVE,
+    metrics.SNAPSHOT: SNAPSHOT,
+    metrics.NOTIFY: NOTIFY,
+    metrics.OTHER: NOTIFY,
+    metrics.TRANSACTIONS: BACKFILL,
+    metrics.BACKFILL: BACKFILL,
+}
+
+# Seconds a request can wait for tokens before it is shed (None waits
+# forever)
+MAX_WAIT = {
+    INTERACTIVE: 10,
+    SNAPSHOT: 60,
+    NOTIFY: 60,
+    BACKFILL: None,
+}
+
+# Fraction of the bucket each priority leaves for higher priorities
+RESERVE = {
+    INTERACTIVE: 0,
+    SNAPSHOT: 0,
+    NOTIFY: 0.1,
+    BACKFILL: 0.25,
+}
+
+
+class ScheduleTimeout(Exception):
+    """ A request waited too long for the provider's rate limit """
+    pass
+
+
+def current_priority():
+    return PRIORITY_FOR_SUBSYSTEM.get(metrics.current_subsystem(), NOTIFY)
+
+
+class Waiter:
+    """ A request queued for tokens in a TokenBucket """
+
+    def __init__(self, bucket, cost, priority):
+        self.priority = priority
+        self.cost = min(cost, bucket.burst)
+        self.required = self.cost + min(
+            bucket.burst * RESERVE[priority],
+            bucket.burst - self.cost
+        )
+        self.start = time.monotonic()
+        max_wait = MAX_WAIT[priority]
+        self.deadline = None if max_wait is None else self.start + max_wait
+        self.key = (priority, next(bucket.counter))
+
+
+class TokenBucket:
+    """ Token bucket that hands out tokens to waiters in priority order.
+    Threads wait with acquire() and asyncio code with acquire_async(), both
+    in the same queue.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=BURST):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.waiters = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def refill(self, now):
+        self.tokens = min(
+            self.burst,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def join(self, cost, priority):
+        if priority is None:
+            priority = current_priority()
+
+        waiter = Waiter(self, cost, priority)
+
+        with self.condition:
+            heapq.heappush(self.waiters, waiter.key)
+
+        return waiter
+
+    def leave(self, waiter):
+        with self.condition:
+            self.waiters.remove(waiter.key)
+            heapq.heapify(self.waiters)
+            self.condition.notify_all()
+
+        waited = time.monotonic() - waiter.start
+        if waited > 1:
+            log.debug("Waited {:.2f}s for rate limit (priority {})".format(
+                waited,
+                waiter.priority,
+            ))
+
+    def poll(self, waiter):
+        """ Take a waiter's tokens if it is first in line and they are
+        available.  Returns 0 once taken, otherwise the seconds to wait
+        before polling again, or None to wait for the waiters ahead to
+        leave.  Raises ScheduleTimeout past the waiter's deadline.  Must be
+        called holding the condition.
+        """
+        now = time.monotonic()
+        self.refill(now)
+
+        if self.waiters[0] == waiter.key:
+            if self.tokens >= waiter.required:
+                self.tokens -= waiter.cost
+                return 0
+            wait = (waiter.required - self.tokens) / self.rate
+        else:
+            # leave() notifies the others
+            wait = None
+
+        if waiter.deadline is not None:
+            if now >= waiter.deadline:
+                metrics.inc("rpc_shed_total", {
+                    "subsystem": metrics.current_subsystem(),
+                })
+                raise ScheduleTimeout(
+                    "Shed request with priority {} after {:.1f}s".format(
+                        waiter.priority,
+                        now - waiter.start,
+                    )
+                )
+            remaining = waiter.deadline - now
+            wait = remaining if wait is None else min(wait, remaining)
+
+        return wait
+
+    def acquire(self, cost=1, priority=None):
+        """ Take tokens for a request, waiting for them if needed """
+        if not self.rate:
+            return
+
+        waiter = self.join(cost, priority)
+
+        try:
+            with self.condition:
+                while True:
+                    wait = self.poll(waiter)
+                    if wait == 0:
+                        break
+                    self.condition.wait(wait)
+
+        finally:
+            self.leave(waiter)
+
+    async def acquire_async(self, cost=1, priority=None):
+        """ acquire() for asyncio code, sleeping instead of blocking the
+        event loop
+        """
+        if not self.rate:
+            return
+
+        waiter = self.join(cost, priority)
+
+        try:
+            while True:
+                with self.condition:
+                    wait = self.poll(waiter)
+                if wait == 0:
+                    break
+                # Coroutines can't be notified, so behind other waiters check
+                # again once the tokens for one request could have come in
+                await asyncio.sleep(
+                    wait if wait is not None else waiter.required / self.rate
+                )
+
+        finally:
+            self.leave(waiter)
@@ -32,6 +32,12 @@ SIG_FUNC_APPROVE_AND_CALL_SENDER = encode_hex(
     keccak(b"approveAndCallWithSender(address,uint256,bytes4,bytes)")
 )
 
+# Multicall
+SIG_FUNC_AGGREGATE = encode_hex(keccak(b"aggregate((address,bytes)[])"))
+SIG_FUNC_TRY_AGGREGATE = encode_hex(
+    keccak(b"tryAggregate(bool,(address,bytes)[])")
+)
+
 # Compound
 SIG_FUNC_TOTAL_BORROWS = encode_hex(keccak(b"totalBorrows()"))
 SIG_FUNC_TOTAL_RESERVES = encode_hex(keccak(b"totalReserves()"))
@@ -67,6 +73,10 @@ DEPRECATED_SIG_EVENT_WITHDRAWN = encode_hex(
     keccak(b"Withdrawn(address,uint256)")
 )
 SIG_EVENT_STAKING_PAUSED = encode_hex(keccak(b"Paused(address,bool)"))
+SIG_EVENT_NEW_DURATIONS = encode_hex(
+    keccak(b"NewDurations(address,uint256[])")
+)
+SIG_EVENT_NEW_RATES = encode_hex(keccak(b"NewRates(address,uint256[])"))
 
 # OUSD
 SIG_EVENT_TOTAL_SUPPLY_UPDATED = encode_hex(
@@ -199,6 +209,17 @@ SIG_EVENT_NEW_PENDING_ADMIN_BRAVO = encode_hex(
 # NewAdmin(address oldAdmin, address newAdmin)
 SIG_EVENT_NEW_ADMIN_BRAVO = encode_hex(keccak(b"NewAdmin(address,address)"))
 
+# Origin Governor
+# ProposalQueued and ProposalExecuted are the same as Compound's
+SIG_EVENT_GOVERNOR_PROPOSAL_CREATED = encode_hex(
+    keccak(
+        b"ProposalCreated(uint256,address,address[],string[],bytes[],string)"
+    )
+)
+SIG_EVENT_GOVERNOR_PROPOSAL_CANCELLED = encode_hex(
+    keccak(b"ProposalCancelled(uint256)")
+)
+
 # Aave LendingPool
 SIG_EVENT_PAUSED = encode_hex(keccak(b"Paused()"))
 SIG_EVENT_UNPAUSED = encode_hex(keccak(b"Unpaused()"))
@@ -0,0 +1,164 @@
+""" Local store for immutable chain objects
+
+Mined transactions, receipts, traces, blocks and internal transactions never
+change, so once fetched they are kept compressed in the ChainObject table and
+served from there instead of the network.  Callers are responsible for only
+storing objects that are final (e.g. a transaction with a block number).
+"""
+import json
+import zlib
+from django.db import DatabaseError
+
+from core.blockchain.cache import LRU, check_generation
+from core.logging import get_logger
+from core.models import ChainObject
+
+log = get_logger(__name__)
+
+TRANSACTION = "tx"
+RECEIPT = "receipt"
+TRACE = "trace"
+BLOCK = "block"
+INTERNAL_TRANSACTIONS = "internal"
+
+# Objects recently read or prefetched
+memory = LRU(10000)
+
+
+def object_key(kind, key):
+    if isinstance(key, int):
+        key = hex(key)
+    return "{}:{}".format(kind, key.lower())
+
+
+def compress(obj):
+    return zlib.compress(
+        json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    )
+
+
+def decompress(data):
+    return json.loads(zlib.decompress(bytes(data)).decode("utf-8"))
+
+
+def get_many(kind, keys):
+    """ Get stored objects of a kind.  Returns a dict of key to object for the
+    keys that were found.
+    """
+    found = {}
+    missing = {}
+
+    check_generation()
+
+    for key in keys:
+        obj = memory.get(object_key(kind, key))
+        if obj is None:
+            missing[object_key(kind, key)] = key
+        else:
+            found[key] = obj
+
+    if not missing:
+        return found
+
+    try:
+        for okey, data in ChainObject.objects.filter(
+            key__in=list(missing.keys())
+        ).values_list("key", "data"):
+            obj = decompress(data)
+            memory.set(okey, obj)
+            found[missing[okey]] = obj
+
+    except DatabaseError:
+        log.exception("Failed to read from the chain object store")
+
+    return found
+
+
+def get(kind, key):
+    """ Get a stored object, or None """
+    return get_many(kind, [key]).get(key)
+
+
+def prefetch(kind, keys):
+    """ Load objects into memory ahead of individual get() calls """
+    get_many(kind, keys)
+
+
+def put_many(kind, items):
+    """ Store objects from a dict of key to object """
+    rows = []
+
+    for key, obj in items.items():
+        rows.append(ChainObject(key=object_key(kind, key), data=compress(obj)))
+        memory.set(object_key(kind, key), obj)
+
+    if not rows:
+        return
+
+    try:
+        ChainObject.objects.bulk_create(
+            rows,
+            batch_size=500,
+            ignore_conflicts=True
+        )
+
+    except DatabaseError:
+        log.exception("Failed to write to the chain object store")
+
+
+def delete_many(kind, keys):
+    """ Remove objects, e.g. ones from blocks that were reorged away """
+    okeys = [object_key(kind, key) for key in keys]
+
+    for okey in okeys:
+        memory.delete(okey)
+
+    ChainObject.objects.filter(key__in=okeys).delete()
+
+
+def put(kind, key, obj):
+    """ Store an object """
+    put_many(kind, {key: obj})
+
+
+def warm_from_transactions(transactions, chunk_size=500):
+    """ Fill the store from already harvested Transaction models """
+    count = 0
+    chunk = []
+
+    def flush():
+        tx_data = {}
+        receipts = {}
+        traces = {}
+        internal_transactions = {}
+
+        for tx in chunk:
+            if tx.data and tx.data.get("blockNumber"):
+                tx_data[tx.tx_hash] = tx.data
+            if tx.receipt_data:
+                receipts[tx.tx_hash] = tx.receipt_data
+            if tx.debug_data:
+                traces[tx.tx_hash] = tx.debug_data
+            # {} is the default for "not yet fetched"
+            if tx.internal_transactions != {}:
+                internal_transactions[tx.tx_hash] = tx.internal_transactions
+
+        put_many(TRANSACTION, tx_data)
+        put_many(RECEIPT, receipts)
+        put_many(TRACE, traces)
+        put_many(INTERNAL_TRANSACTIONS, internal_transactions)
+
+    for tx in transactions.iterator(chunk_size=chunk_size):
+        chunk.append(tx)
+        count += 1
+
+        if len(chunk) >= chunk_size:
+            flush()
+            chunk = []
+            log.info("Warmed chain object store with {} transactions".format(
+                count
+            ))
+
+    flush()
+
+    return count
@@ -0,0 +1,161 @@
+""" Record and replay outgoing HTTP requests
+
+In record mode, every response that goes through core.transport (RPC
+providers, Etherscan, CoinGecko, IPFS) or the async RPC client is recorded to
+a gzipped JSON lines cassette.  Responses are buffered in memory and appended
+as one gzip stream per flush(), which happens every FLUSH_SIZE responses,
+before forking, at exit and after each harvest executor item.  In replay mode, responses are served from the
+cassette instead of the network, optionally after a simulated latency, so
+pipelines can be run and benchmarked offline.
+
+Requests are matched by method, URL and body.  JSON-RPC ids, API keys and the
+provider URL are left out of the match so recordings replay regardless of
+which provider served them.  Repeated identical requests replay their
+recorded responses in order, the last one repeating.
+
+Configuration (environment variables):
+
+ - HTTP_CASSETTE_MODE - "record" or "replay" (default: off)
+ - HTTP_CASSETTE_PATH - Cassette file (default: cassette.jsonl.gz)
+ - HTTP_CASSETTE_LATENCY - Seconds to wait before each replayed response
+   (default: 0)
+"""
+import os
+import gzip
+import json
+import fcntl
+import atexit
+import threading
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from core.logging import get_logger
+
+log = get_logger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+
+MODE = os.environ.get("HTTP_CASSETTE_MODE")
+PATH = os.environ.get("HTTP_CASSETTE_PATH", "cassette.jsonl.gz")
+LATENCY = float(os.environ.get("HTTP_CASSETTE_LATENCY", 0))
+
+SECRET_PARAMS = ("apikey", "api_key", "key")
+
+# Recorded responses buffered before they are written out
+FLUSH_SIZE = 1000
+
+_lock = threading.Lock()
+_recordings = None
+_replayed = {}
+_pending = []
+
+
+class CassetteMiss(Exception):
+    """ A request was not found in the cassette """
+    pass
+
+
+def strip_ids(payload):
+    if isinstance(payload, list):
+        return [strip_ids(x) for x in payload]
+    if isinstance(payload, dict) and "jsonrpc" in payload:
+        return {k: v for k, v in payload.items() if k != "id"}
+    return payload
+
+
+def request_key(method, url, params=None, json_body=None):
+    """ Match key of a request """
+    if json_body is not None:
+        # JSON-RPC, any provider will do
+        return "{} {}".format(
+            method,
+            json.dumps(strip_ids(json_body), sort_keys=True)
+        )
+
+    parsed = urlparse(url)
+    query = parse_qsl(parsed.query) + list((params or {}).items())
+    query = sorted(
+        (k, str(v)) for k, v in query if k.lower() not in SECRET_PARAMS
+    )
+
+    return "{} {}{}?{}".format(
+        method,
+        parsed.netloc,
+        parsed.path,
+        urlencode(query)
+    )
+
+
+def load():
+    """ Load the cassette into memory """
+    global _recordings
+
+    with _lock:
+        if _recordings is not None:
+            return _recordings
+
+        _recordings = {}
+
+        if os.path.exists(PATH):
+            with gzip.open(PATH, "rt") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    _recordings.setdefault(entry["key"], []).append(entry)
+
+        log.info("Loaded {} requests from cassette {}".format(
+            sum(len(x) for x in _recordings.values()),
+            PATH,
+        ))
+
+        return _recordings
+
+
+def record(key, status, body):
+    """ Add a response to the cassette """
+    line = json.dumps({"key": key, "status": status, "body": body})
+
+    with _lock:
+        _pending.append(line)
+        full = len(_pending) >= FLUSH_SIZE
+
+    if full:
+        flush()
+
+
+def flush():
+    """ Write the buffered responses to the cassette """
+    with _lock:
+        if not _pending:
+            return
+
+        # Each flush appends a gzip member, which readers handle
+        # transparently
+        data = gzip.compress("".join(x + "\n" for x in _pending).encode())
+        _pending.clear()
+
+        with open(PATH, "ab") as f:
+            # Other processes may be recording to the same cassette
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(data)
+
+
+if MODE == RECORD:
+    atexit.register(flush)
+    # Children would otherwise write the parent's buffer a second time
+    os.register_at_fork(before=flush)
+
+
+def replay(key):
+    """ Get the next recorded (status, body) for a request """
+    entries = load().get(key)
+
+    if not entries:
+        raise CassetteMiss("Request not in cassette: {}".format(key[:200]))
+
+    with _lock:
+        i = _replayed.get(key, 0)
+        _replayed[key] = i + 1
+
+    entry = entries[min(i, len(entries) - 1)]
+
+    return entry["status"], entry["body"]
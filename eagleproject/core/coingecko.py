@@ -1,5 +1,4 @@
-import requests
-
+from core import transport
 from core.logging import get_logger
 
 log = get_logger(__name__)
@@ -30,7 +29,7 @@ def get_price(ticker, currencies=["usd"]):
 
     log.debug("Fetching price data from {}".format(uri))
 
-    r = requests.get(uri)
+    r = transport.get(uri)
 
     if r.status_code != 200:
         raise Exception(
@@ -1,62 +1,294 @@
-import requests
+""" Etherscan API client
+
+Etherscan's rate limit is per API key, so requests are spaced out across
+every process on the host (harvest workers, backfill workers, the web
+server) through a lock file holding the time of the next free slot.  Within
+a process, requests also go through a token bucket that serves them in
+priority order.  Callers can fetch concurrently (see fetch_concurrently())
+without tripping the limit.
+
+Account transaction lists are paged through by block, since Etherscan returns
+at most 10,000 results per request.  Responses for ranges of final blocks
+never change and are cached on disk.
+
+Configuration (environment variables):
+
+ - ETHERSCAN_RATE_LIMIT - Requests per second for the whole host
+   (default: 5).  Hosts sharing an API key need a share of the limit each
+ - ETHERSCAN_RATE_FILE - Lock file shared by the processes on the host
+   (default: a file in the system temp dir, blank to limit each process
+   separately)
+ - ETHERSCAN_CACHE_DIR - Directory for cached responses (default: a directory
+   in the system temp dir, blank to disable)
+"""
+import os
+import json
+import gzip
+import time
+import fcntl
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
 from django.conf import settings
+from django.db import connection
+
+from core import transport
+from core.blockchain.scheduler import TokenBucket
+from core.logging import get_logger
+
+log = get_logger(__name__)
 
 ETHERSCAN_ENDPOINT = "https://api.etherscan.io/api"
 DAILY_BLOCKS = 5760 // (24 * 60 * 60) / 15
 
+RATE_LIMIT = float(os.environ.get("ETHERSCAN_RATE_LIMIT", 5))
+CACHE_DIR = os.environ.get(
+    "ETHERSCAN_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "etherscan")
+)
+RATE_FILE = os.environ.get(
+    "ETHERSCAN_RATE_FILE",
+    os.path.join(tempfile.gettempdir(), "etherscan.rate")
+)
 
-def get_contract_transactions(address, from_block, end_block):
-    """ Get all transactions for an account """
-    action = "txlist"
+# Max results Etherscan returns for one request
+PAGE_SIZE = 10000
 
-    uri = (
-        "{}?module=account&action={}&address={}&startblock={}&endblock={}"
-        "&sort=desc&apikey={}".format(
-            ETHERSCAN_ENDPOINT,
-            action,
-            address,
-            from_block,
-            end_block,
-            settings.ETHERSCAN_API_KEY,
-        )
+bucket = TokenBucket(RATE_LIMIT, RATE_LIMIT)
+
+
+class EtherscanError(Exception):
+    pass
+
+
+def reserve_slot(path, rate):
+    """ Claim the next free request slot of a rate limit shared through a lock
+    file.  Returns the time.time() the slot starts at, or None if the file
+    can't be used.
+    """
+    interval = 1 / rate
+
+    try:
+        with open(path, "a+") as f:
+            # Released when the file is closed
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                next_slot = float(f.read() or 0)
+            except ValueError:
+                next_slot = 0
+
+            slot = max(next_slot, time.time())
+
+            f.seek(0)
+            f.truncate()
+            f.write(repr(slot + interval))
+            f.flush()
+
+    except OSError:
+        log.exception("Failed to use the rate limit file {}".format(path))
+        return None
+
+    return slot
+
+
+def throttle():
+    """ Wait for the rate limit before a request """
+    bucket.acquire()
+
+    if not RATE_FILE or not RATE_LIMIT:
+        return
+
+    slot = reserve_slot(RATE_FILE, RATE_LIMIT)
+    if slot is not None:
+        delay = slot - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def cache_path(params):
+    key = hashlib.sha256(
+        json.dumps(params, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(CACHE_DIR, key[:2], key + ".json.gz")
+
+
+def read_cache(path):
+    try:
+        with gzip.open(path, "rt") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        log.exception("Failed to read Etherscan cache file {}".format(path))
+        return None
+
+
+def write_cache(path, data):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with gzip.open(tmp_path, "wt") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        log.exception("Failed to write Etherscan cache file {}".format(path))
+
+
+def is_empty(data):
+    return data.get("status") == "0" and data.get("message") == (
+        "No transactions found"
     )
 
-    r = requests.get(uri)
+
+def request(params, cache=False):
+    """ Make an API call, waiting for the rate limit.  Returns the decoded
+    response.  With cache, a successful response is kept on disk.
+    """
+    path = cache_path(params) if cache and CACHE_DIR else None
+
+    if path is not None:
+        data = read_cache(path)
+        if data is not None:
+            return data
+
+    throttle()
+
+    r = transport.get(
+        ETHERSCAN_ENDPOINT,
+        params=dict(params, apikey=settings.ETHERSCAN_API_KEY)
+    )
 
     if r.status_code != 200:
-        raise Exception(
-            "Failed to fetch ({}) transaction list from Etherscan".format(
-                r.status_code
+        raise EtherscanError(
+            "Failed to fetch ({}) {} from Etherscan".format(
+                r.status_code,
+                params.get("action")
             )
         )
 
-    return r.json().get("result")
+    data = r.json()
 
-def get_internal_txs_bt_txhash(txhash):
-    uri = (
-        "{}?module=account&action=txlistinternal&txhash={}&apikey={}".format(
-            ETHERSCAN_ENDPOINT,
-            txhash,
-            settings.ETHERSCAN_API_KEY,
-        )
+    if path is not None and (data.get("status") == "1" or is_empty(data)):
+        write_cache(path, data)
+
+    return data
+
+
+def fetch_concurrently(fn, args_list):
+    """ Call fn(*args) for every args in args_list with as many requests in
+    flight as the rate limit allows.  Returns the results in order.
+    """
+    workers = max(1, min(int(RATE_LIMIT) or 1, len(args_list)))
+    # Keep the caller's metrics subsystem, and so its rate limit priority
+    contexts = [copy_context() for _ in args_list]
+
+    def call(context, args):
+        try:
+            return context.run(fn, *args)
+        finally:
+            # Worker threads each get their own connection
+            connection.close()
+
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(call, contexts, args_list))
+
+
+def get_contract_transactions(
+        address,
+        from_block,
+        end_block,
+        final_block=None):
+    """ Get all transactions for an account in a block range, oldest first.
+    Responses for blocks up to final_block are cached.
+    """
+    if final_block is not None and from_block <= final_block < end_block:
+        return get_transaction_pages(
+            address, from_block, final_block, cache=True
+        ) + get_transaction_pages(address, final_block + 1, end_block)
+
+    return get_transaction_pages(
+        address,
+        from_block,
+        end_block,
+        cache=final_block is not None and end_block <= final_block
     )
 
-    r = requests.get(uri)
 
-    if r.status_code != 200:
-        raise Exception(
-            "Failed to fetch ({}) internal transactions from Etherscan for transaction: {}".format(
-                r.status_code,
-                txhash
+def get_transaction_pages(address, from_block, end_block, cache=False):
+    """ Page through the transactions of an account by block """
+    transactions = []
+    seen = set()
+    start_block = from_block
+
+    while True:
+        data = request({
+            "module": "account",
+            "action": "txlist",
+            "address": address,
+            "startblock": start_block,
+            "endblock": end_block,
+            "sort": "asc",
+            "page": 1,
+            "offset": PAGE_SIZE,
+        }, cache)
+
+        if is_empty(data):
+            break
+
+        if data.get("status") != "1":
+            raise EtherscanError(
+                "Unexpected transaction list response: {}".format(
+                    data.get("result") or data.get("message")
+                )
             )
-        )
 
-    json = r.json()
-    # no transactions found
-    if json.get("status") == '0':
-        return []
-    elif json.get("status") == '1':
-        return json.get("result")
-    else: 
-        print("Unexpected status returned: {} for transaction: {}".format(json.get("status"), txhash))
+        page = data["result"]
+
+        for tx in page:
+            if tx.get("hash") is None or tx["hash"] not in seen:
+                seen.add(tx.get("hash"))
+                transactions.append(tx)
+
+        if len(page) < PAGE_SIZE:
+            break
+
+        # The last block may be cut short, so it's asked for again
+        last_block = int(page[-1]["blockNumber"])
+        if last_block == start_block:
+            log.error("More than {} transactions in block {} for {}".format(
+                PAGE_SIZE,
+                last_block,
+                address
+            ))
+            break
+        start_block = last_block
+
+    return transactions
+
+
+def get_internal_txs_bt_txhash(txhash):
+    """ Get the internal transactions of a transaction.  Raises EtherscanError
+    on anything but a list of results or Etherscan saying there are none, so
+    that errors aren't mistaken for an empty list.
+    """
+    data = request({
+        "module": "account",
+        "action": "txlistinternal",
+        "txhash": txhash,
+    })
+
+    if is_empty(data):
         return []
+
+    if data.get("status") != "1":
+        raise EtherscanError(
+            "Unexpected internal transactions response for {}: {}".format(
+                txhash,
+                data.get("result") or data.get("message")
+            )
+        )
+
+    return data.get("result")
@@ -0,0 +1,184 @@
+""" Chain follower
+
+Polls for new blocks and runs the harvest as a pipeline of stages, each one
+only working on blocks the stage before it has finished:
+
+    ingest (logs and transactions) -> snapshot -> notify -> traces
+
+Each stage's progress is kept in a FollowerCursor, so a restarted follower
+carries on from where it stopped.  When a stage is slower than the chain, the
+blocks that arrived in the meantime are handled in one go instead of queueing
+up.  Enriching transactions stored straight from logs and the trace queue
+only run when there is nothing else to do.  A stage that fails is retried
+with backoff without holding up the stages before it.
+
+Run with the follow_chain management command.  SIGINT and SIGTERM stop the
+follower after the stage in progress.
+
+Configuration (environment variables):
+
+ - FOLLOW_POLL_INTERVAL - Seconds between checks for a new block (default: 4)
+ - FOLLOW_CONFIRMATIONS - Blocks behind the head to stay (default: 0, reorgs
+   are rolled back by core.blockchain.harvest.reorgs)
+ - FOLLOW_SNAPSHOT_INTERVAL - Min blocks between snapshots (default: 1)
+ - FOLLOW_TRACE_BATCH - Queued traces fetched per idle poll (default: 100)
+ - FOLLOW_ENRICH_BATCH - Transactions enriched per idle poll with
+   LOG_FIRST_HARVEST (default: 1000)
+"""
+import os
+import signal
+import threading
+import time
+
+from django.conf import settings
+
+from core import metrics
+from core.blockchain.harvest import (
+    enrich,
+    fetch_traces,
+    refresh_transactions,
+    snap,
+)
+from core.blockchain.rpc import latest_block
+from core.logging import get_logger
+from core.models import FollowerCursor
+from notify.main import run_all
+
+log = get_logger(__name__)
+
+POLL_INTERVAL = float(os.environ.get("FOLLOW_POLL_INTERVAL", 4))
+CONFIRMATIONS = int(os.environ.get("FOLLOW_CONFIRMATIONS", 0))
+SNAPSHOT_INTERVAL = int(os.environ.get("FOLLOW_SNAPSHOT_INTERVAL", 1))
+TRACE_BATCH = int(os.environ.get("FOLLOW_TRACE_BATCH", 100))
+ENRICH_BATCH = int(os.environ.get("FOLLOW_ENRICH_BATCH", 1000))
+
+MAX_BACKOFF = 300
+
+INGEST = "ingest"
+SNAPSHOT = "snapshot"
+NOTIFY = "notify"
+
+
+class Stage:
+    """ A pipeline step with a persistent cursor and retry backoff """
+
+    def __init__(self, name, run, interval=1):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.failures = 0
+        self.retry_at = 0
+        self.cursor, _ = FollowerCursor.objects.get_or_create(
+            stage=name,
+            defaults={"block_number": 0},
+        )
+
+    def due(self, target):
+        # A reorg rollback may have moved the cursor back
+        self.cursor.refresh_from_db()
+        return (
+            target - self.cursor.block_number >= self.interval
+            and time.time() >= self.retry_at
+        )
+
+    def advance(self, target):
+        """ Run the stage up to a block.  Returns True if it succeeded. """
+        start = time.time()
+        self.cursor.refresh_from_db()
+        start_block = self.cursor.block_number
+
+        try:
+            self.run(target)
+
+        except Exception:
+            self.failures += 1
+            backoff = min(2 ** self.failures, MAX_BACKOFF)
+            self.retry_at = time.time() + backoff
+            log.exception("Follower stage {} failed at block {}, "
+                          "retrying in {}s".format(self.name, target, backoff))
+            return False
+
+        self.failures = 0
+        # Only move forward from the stored cursor, which a rollback during
+        # the run may have moved back past where it started
+        self.cursor.refresh_from_db()
+        if self.cursor.block_number < start_block:
+            log.warning("Follower {} was rolled back to block {} while "
+                        "running".format(self.name, self.cursor.block_number))
+            return True
+        self.cursor.block_number = target
+        self.cursor.save(update_fields=["block_number", "updated_at"])
+
+        log.info("Follower {} at block {} ({:.1f}s)".format(
+            self.name,
+            target,
+            time.time() - start
+        ))
+        return True
+
+
+def notify(block_number):
+    run_all()
+
+
+class Follower:
+    def __init__(self):
+        self.stopping = threading.Event()
+        self.stages = [
+            Stage(INGEST, refresh_transactions),
+            Stage(SNAPSHOT, snap, SNAPSHOT_INTERVAL),
+            Stage(NOTIFY, notify),
+        ]
+
+    def stop(self, *args):
+        log.info("Follower stopping after the current stage")
+        self.stopping.set()
+
+    def step(self):
+        """ Run every stage that has work to do once.  Returns True if any
+        did.
+        """
+        with metrics.subsystem(metrics.TRANSACTIONS):
+            target = latest_block() - CONFIRMATIONS
+
+        worked = False
+
+        for stage in self.stages:
+            if self.stopping.is_set():
+                break
+
+            if stage.due(target):
+                worked = True
+                if not stage.advance(target):
+                    break
+
+            # Later stages only see blocks this one has finished
+            target = stage.cursor.block_number
+
+        if not worked and settings.LOG_FIRST_HARVEST and ENRICH_BATCH:
+            worked = enrich(ENRICH_BATCH) > 0
+
+        if not worked and settings.DEFER_TRACES and TRACE_BATCH:
+            worked = fetch_traces(TRACE_BATCH) > 0
+
+        return worked
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        log.info("Following the chain {} blocks behind the head".format(
+            CONFIRMATIONS
+        ))
+
+        while not self.stopping.is_set():
+            try:
+                worked = self.step()
+            except Exception:
+                log.exception("Follower failed to check for new blocks")
+                worked = False
+
+            if not worked:
+                self.stopping.wait(POLL_INTERVAL)
+
+        log.info("Follower stopped")
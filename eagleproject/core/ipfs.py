@@ -1,5 +1,4 @@
-import requests
-
+from core import transport
 from core.logging import get_logger
 
 log = get_logger(__name__)
@@ -10,7 +9,7 @@ def fetch_ipfs_json(ipfs_hash):
     if not ipfs_hash:
         return {}
 
-    r = requests.get('https://ipfs.io/ipfs/{}'.format(ipfs_hash))
+    r = transport.get('https://ipfs.io/ipfs/{}'.format(ipfs_hash))
 
     if r.status_code != 200:
         log.error('Failed to fetch file from IPFS: {}'.format(ipfs_hash))
@@ -0,0 +1,85 @@
+from core import metrics
+from core.blockchain.const import LOG_CONTRACTS, START_OF_EVERYTHING
+from core.blockchain.harvest import backfill
+from core.blockchain.harvest.reorgs import CONFIRMATIONS
+from core.blockchain.rpc import latest_block
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Backfill logs over a block range with several worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'job',
+            help='Name of the job, run again with the same name to resume',
+        )
+        parser.add_argument(
+            '--from-block',
+            type=int,
+            default=START_OF_EVERYTHING + 1,
+            help='First block of the range',
+        )
+        parser.add_argument(
+            '--to-block',
+            type=int,
+            default=None,
+            help='Last block of the range (default: latest final block)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100000,
+            help='Blocks per leased chunk',
+        )
+        parser.add_argument(
+            '--contracts',
+            default=None,
+            help='Comma separated contract addresses (default: LOG_CONTRACTS)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Worker processes (default: HARVEST_WORKERS)',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only show the progress of the job',
+        )
+
+    def handle(self, *args, **options):
+        job = options['job']
+
+        if not options['status']:
+            with metrics.run(metrics.BACKFILL):
+                to_block = options['to_block']
+                if to_block is None:
+                    to_block = latest_block() - CONFIRMATIONS
+
+                contracts = LOG_CONTRACTS
+                if options['contracts']:
+                    contracts = [
+                        x.strip().lower()
+                        for x in options['contracts'].split(',')
+                    ]
+
+                count = backfill.plan(
+                    job,
+                    options['from_block'],
+                    to_block,
+                    options['chunk_size'],
+                    contracts,
+                )
+                self.stdout.write('Planned {} new chunks'.format(count))
+
+                failures = backfill.run(job, options['workers'])
+                for failure in failures:
+                    self.stderr.write('Worker failed: {}'.format(
+                        failure.error
+                    ))
+
+        done, total = backfill.progress(job)
+        self.stdout.write('{}: {}/{} blocks done'.format(job, done, total))
@@ -0,0 +1,31 @@
+from core import metrics
+from core.blockchain.harvest.traces import backfill_internal_transactions
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Fetch internal transactions for stored transactions missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Max number of transactions to backfill',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Transactions written at once '
+                 '(default: INTERNAL_TX_BACKFILL_BATCH_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        with metrics.run(metrics.BACKFILL):
+            count = backfill_internal_transactions(
+                options['limit'],
+                options['batch_size']
+            )
+        self.stdout.write('Backfilled {} transactions'.format(count))
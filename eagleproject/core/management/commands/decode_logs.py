@@ -0,0 +1,25 @@
+from core import metrics
+from core.blockchain.events import decode_logs
+from core.models import Log
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Decode the arguments of stored logs of known events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Logs updated per query',
+        )
+
+    def handle(self, *args, **options):
+        with metrics.run(metrics.BACKFILL):
+            count = decode_logs(
+                Log.objects.all(),
+                options['batch_size']
+            )
+        self.stdout.write('Decoded {} logs'.format(count))
@@ -0,0 +1,30 @@
+from core import metrics
+from core.blockchain.harvest.transactions import enrich_transactions
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Fetch full transaction data for records created from logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Max number of transactions to enrich',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Worker processes (default: HARVEST_WORKERS)',
+        )
+
+    def handle(self, *args, **options):
+        with metrics.run(metrics.BACKFILL):
+            count = enrich_transactions(
+                options['limit'],
+                options['workers']
+            )
+        self.stdout.write('Enriched {} transactions'.format(count))
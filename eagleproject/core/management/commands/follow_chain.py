@@ -0,0 +1,10 @@
+from core.follower import Follower
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Follow new blocks, harvesting, snapshotting and notifying as they come'
+
+    def handle(self, *args, **options):
+        Follower().run()
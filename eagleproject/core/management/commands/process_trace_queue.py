@@ -0,0 +1,27 @@
+from core import metrics
+from core.blockchain.harvest.traces import process_queue
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Fetch traces and internal transactions of queued transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Max number of transactions to process',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Transactions fetched at once (default: TRACE_CONCURRENCY)',
+        )
+
+    def handle(self, *args, **options):
+        with metrics.run(metrics.BACKFILL):
+            count = process_queue(options['limit'], options['concurrency'])
+        self.stdout.write('Completed {} transactions'.format(count))
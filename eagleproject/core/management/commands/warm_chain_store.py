@@ -0,0 +1,24 @@
+from core.blockchain.store import warm_from_transactions
+from core.models import Transaction
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Fill the chain object store from harvested transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-block',
+            type=int,
+            default=0,
+            help='Only use transactions from this block onwards',
+        )
+
+    def handle(self, *args, **options):
+        count = warm_from_transactions(
+            Transaction.objects.filter(
+                block_number__gte=options['from_block']
+            ).order_by('block_number')
+        )
+        self.stdout.write('Stored objects for {} transactions'.format(count))
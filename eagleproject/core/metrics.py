@@ -0,0 +1,260 @@
+""" In-process metrics
+
+Counters and latency histograms for outgoing RPC requests, labelled by
+JSON-RPC method, function selector (for eth_call) and the subsystem making
+the request.  Exported in the Prometheus text format at /metrics, and
+summarised in the logs at the end of each harvest or trigger run.
+
+Metrics are per process, so each worker reports its own.
+
+Usage:
+
+    with metrics.run("snapshot"):
+        ...  # RPC requests in here are labelled subsystem="snapshot"
+"""
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from core.logging import get_logger
+
+log = get_logger(__name__)
+
+SNAPSHOT = "snapshot"
+TRANSACTIONS = "transactions"
+VIEWS = "views"
+NOTIFY = "notify"
+BACKFILL = "backfill"
+OTHER = "other"
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_subsystem = ContextVar("subsystem", default=OTHER)
+_runs = ContextVar("runs", default=())
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+COUNTER_HELP = {
+    "rpc_requests_total": "JSON-RPC requests sent",
+    "rpc_errors_total": "JSON-RPC requests that returned an error",
+    "rpc_cache_hits_total": "JSON-RPC requests answered from the cache",
+    "rpc_shed_total": "JSON-RPC requests shed by the rate limiter",
+}
+HISTOGRAM_HELP = {
+    "rpc_request_seconds": "Latency of JSON-RPC HTTP requests",
+}
+
+
+class RunStats:
+    """ Tally of RPC requests made during a run """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.requests = {}
+        self.errors = 0
+        self.cache_hits = 0
+        self.rpc_seconds = 0
+
+    def summary(self):
+        top = sorted(self.requests.items(), key=lambda x: -x[1])[:10]
+        return (
+            "{} run: {} RPC requests ({} errors, {} cache hits), "
+            "{:.2f}s waiting on RPC, {:.2f}s total. Top: {}".format(
+                self.name,
+                sum(self.requests.values()),
+                self.errors,
+                self.cache_hits,
+                self.rpc_seconds,
+                time.time() - self.start,
+                ", ".join(
+                    "{}{}={}".format(
+                        method,
+                        " " + selector if selector else "",
+                        count
+                    )
+                    for (method, selector), count in top
+                ) or "none",
+            )
+        )
+
+
+def current_subsystem():
+    return _subsystem.get()
+
+
+@contextmanager
+def subsystem(name):
+    """ Label RPC requests made in this context with a subsystem """
+    token = _subsystem.set(name)
+    try:
+        yield
+    finally:
+        _subsystem.reset(token)
+
+
+@contextmanager
+def run(name):
+    """ Label RPC requests with a subsystem and log a summary of them when
+    done
+    """
+    stats = RunStats(name)
+    runs_token = _runs.set(_runs.get() + (stats,))
+    try:
+        with subsystem(name):
+            yield stats
+    finally:
+        _runs.reset(runs_token)
+        log.info(stats.summary())
+
+
+def selector_of(method, params):
+    """ Function selector of an eth_call, or "" """
+    if method != "eth_call" or not params or not isinstance(params[0], dict):
+        return ""
+    return (params[0].get("data") or "")[:10]
+
+
+def inc(name, labels, value=1):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, labels, value):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                "buckets": [0] * len(BUCKETS),
+                "count": 0,
+                "sum": 0,
+            }
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["count"] += 1
+        histogram["sum"] += value
+
+
+def record_rpc(calls, seconds, errors=0):
+    """ Record a JSON-RPC HTTP request for a list of (method, params).  A
+    batch is timed as a whole, under the method "batch" and no selector.
+    """
+    name = current_subsystem()
+
+    for method, params in calls:
+        inc("rpc_requests_total", {
+            "method": method,
+            "selector": selector_of(method, params),
+            "subsystem": name,
+        })
+
+    if errors:
+        inc("rpc_errors_total", {"subsystem": name}, errors)
+
+    if len(calls) == 1:
+        method, selector = calls[0][0], selector_of(*calls[0])
+    else:
+        method, selector = "batch", ""
+
+    observe("rpc_request_seconds", {
+        "method": method,
+        "selector": selector,
+        "subsystem": name,
+    }, seconds)
+
+    for stats in _runs.get():
+        for method, params in calls:
+            key = (method, selector_of(method, params))
+            stats.requests[key] = stats.requests.get(key, 0) + 1
+        stats.errors += errors
+        stats.rpc_seconds += seconds
+
+
+def record_cache_hits(method, count):
+    if not count:
+        return
+
+    inc("rpc_cache_hits_total", {
+        "method": method,
+        "subsystem": current_subsystem(),
+    }, count)
+
+    for stats in _runs.get():
+        stats.cache_hits += count
+
+
+def format_labels(labels, extra=()):
+    return "{" + ",".join(
+        '{}="{}"'.format(key, str(value).replace('"', '\\"'))
+        for key, value in tuple(labels) + tuple(extra)
+    ) + "}"
+
+
+def render():
+    """ All metrics in the Prometheus text exposition format """
+    lines = []
+
+    with _lock:
+        counters = dict(_counters)
+        histograms = {
+            key: {
+                "buckets": list(value["buckets"]),
+                "count": value["count"],
+                "sum": value["sum"],
+            }
+            for key, value in _histograms.items()
+        }
+
+    for name, help_text in COUNTER_HELP.items():
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} counter".format(name))
+        for (key_name, labels), value in sorted(counters.items()):
+            if key_name == name:
+                lines.append("{}{} {}".format(
+                    name,
+                    format_labels(labels),
+                    value
+                ))
+
+    for name, help_text in HISTOGRAM_HELP.items():
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} histogram".format(name))
+        for (key_name, labels), value in sorted(histograms.items()):
+            if key_name != name:
+                continue
+            for bound, count in zip(BUCKETS, value["buckets"]):
+                lines.append("{}_bucket{} {}".format(
+                    name,
+                    format_labels(labels, [("le", bound)]),
+                    count
+                ))
+            lines.append("{}_bucket{} {}".format(
+                name,
+                format_labels(labels, [("le", "+Inf")]),
+                value["count"]
+            ))
+            lines.append("{}_sum{} {}".format(
+                name,
+                format_labels(labels),
+                value["sum"]
+            ))
+            lines.append("{}_count{} {}".format(
+                name,
+                format_labels(labels),
+                value["count"]
+            ))
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
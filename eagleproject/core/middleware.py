@@ -0,0 +1,11 @@
+from core import metrics
+
+
+def metrics_middleware(get_response):
+    """ Label RPC requests made while serving a page """
+
+    def middleware(request):
+        with metrics.subsystem(metrics.VIEWS):
+            return get_response(request)
+
+    return middleware
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_auto_20211118_1805'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallCache',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('block_number', models.IntegerField(db_index=True)),
+                ('result', models.TextField()),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_callcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainObject',
+            fields=[
+                ('key', models.CharField(max_length=96, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+    ]
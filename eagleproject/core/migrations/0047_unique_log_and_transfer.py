@@ -0,0 +1,30 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:45
+
+from django.db import migrations
+
+
+def dedupe(apps, schema_editor):
+    """ Keep the first of any duplicate transfers """
+    schema_editor.execute(
+        "DELETE FROM core_ousdtransfer "
+        "WHERE id NOT IN ("
+        "    SELECT MIN(id)"
+        "    FROM core_ousdtransfer"
+        "    GROUP BY tx_hash_id, log_index"
+        ");"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0046_chainobject'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='ousdtransfer',
+            unique_together={('tx_hash', 'log_index')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_unique_log_and_transfer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='enriched',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+    ]
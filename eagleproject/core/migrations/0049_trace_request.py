@@ -0,0 +1,23 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_transaction_enriched'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TraceRequest',
+            fields=[
+                ('tx_hash', models.CharField(max_length=66, primary_key=True, serialize=False)),
+                ('available_at', models.DateTimeField(db_index=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(default='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
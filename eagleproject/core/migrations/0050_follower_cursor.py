@@ -0,0 +1,21 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_trace_request'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowerCursor',
+            fields=[
+                ('stage', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('block_number', models.IntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
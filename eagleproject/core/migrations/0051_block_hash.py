@@ -0,0 +1,23 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0050_follower_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='block',
+            name='block_hash',
+            field=models.CharField(blank=True, default='', max_length=66),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='parent_hash',
+            field=models.CharField(blank=True, default='', max_length=66),
+        ),
+    ]
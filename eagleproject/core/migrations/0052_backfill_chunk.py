@@ -0,0 +1,33 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_block_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(db_index=True, max_length=64)),
+                ('start_block', models.IntegerField()),
+                ('end_block', models.IntegerField()),
+                ('next_block', models.IntegerField()),
+                ('contracts', models.JSONField(default=list)),
+                ('done', models.BooleanField(db_index=True, default=False)),
+                ('leased_until', models.DateTimeField(db_index=True, null=True)),
+                ('worker', models.CharField(blank=True, default='', max_length=64)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('job', 'start_block')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+
+def dedupe(apps, schema_editor):
+    """ Keep the furthest behind of any duplicate log pointers """
+    schema_editor.execute(
+        "DELETE FROM core_logpointer "
+        "WHERE id NOT IN ("
+        "    SELECT MIN(id) FROM core_logpointer p"
+        "    WHERE p.last_block = ("
+        "        SELECT MIN(last_block) FROM core_logpointer"
+        "        WHERE contract = p.contract"
+        "    )"
+        "    GROUP BY contract"
+        ");"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0052_backfill_chunk'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='etherscanpointer',
+            name='leased_by',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='etherscanpointer',
+            name='leased_until',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='logpointer',
+            name='leased_by',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='logpointer',
+            name='leased_until',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='logpointer',
+            name='contract',
+            field=models.CharField(max_length=256, unique=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.8 on 2026-10-18 10:02
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0053_pointer_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='args',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['event_name', 'block_number'], name='core_log_event_n_fbb7da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['args'], name='core_log_args_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
@@ -3,6 +3,7 @@ from datetime import (
     datetime,
 )
 from decimal import Decimal
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
 from core.logging import get_logger
@@ -57,13 +58,18 @@ class DebugTx(models.Model):
 
 
 class LogPointer(models.Model):
-    contract = models.CharField(max_length=256, db_index=True)
+    contract = models.CharField(max_length=256, unique=True)
     last_block = models.IntegerField(db_index=True)
+    # See core.blockchain.harvest.leases
+    leased_until = models.DateTimeField(null=True, db_index=True)
+    leased_by = models.CharField(max_length=128, blank=True, default="")
 
 
 class EtherscanPointer(models.Model):
     contract = models.CharField(max_length=256, db_index=True, primary_key=True)
     last_block = models.IntegerField(db_index=True)
+    leased_until = models.DateTimeField(null=True, db_index=True)
+    leased_by = models.CharField(max_length=128, blank=True, default="")
 
 
 class Log(models.Model):
@@ -78,6 +84,8 @@ class Log(models.Model):
     log_index = models.IntegerField(db_index=True)
     transaction_hash = models.CharField(max_length=255, db_index=True)
     transaction_index = models.IntegerField(db_index=True)
+    # Decoded event arguments, see core.blockchain.events
+    args = models.JSONField(default=dict, blank=True)
     account_balance = Decimal(0)
 
     def is_ousd_in(self):
@@ -94,6 +102,13 @@ class Log(models.Model):
         ordering = ["-block_number", "-log_index"]
         indexes = [
             models.Index(fields=["block_number"]),
+            models.Index(fields=["event_name", "block_number"]),
+            # For args__contains lookups
+            GinIndex(
+                fields=["args"],
+                name="core_log_args_gin",
+                opclasses=["jsonb_path_ops"],
+            ),
         ]
         unique_together = ('block_number', 'transaction_index', 'log_index')
 
@@ -163,6 +178,9 @@ class OgnStakingSnapshot(models.Model):
 class Block(models.Model):
     block_number = models.IntegerField(primary_key=True)
     block_time = models.DateTimeField(db_index=True)
+    # Blank for blocks stored before hashes were tracked
+    block_hash = models.CharField(max_length=66, blank=True, default="")
+    parent_hash = models.CharField(max_length=66, blank=True, default="")
 
 
 class Transaction(models.Model):
@@ -176,6 +194,9 @@ class Transaction(models.Model):
     internal_transactions = models.JSONField(default=dict)
     from_address = models.CharField(max_length=42, db_index=True, default='0xinvalid_address')
     to_address = models.CharField(max_length=42, db_index=True, null=True)
+    # False for records created from logs, until the transaction, receipt
+    # and trace have been fetched
+    enriched = models.BooleanField(default=True, db_index=True)
 
 
 class OusdTransfer(models.Model):
@@ -191,6 +212,9 @@ class OusdTransfer(models.Model):
     to_address = models.CharField(max_length=42, db_index=True)
     amount = models.DecimalField(max_digits=64, decimal_places=18, default=0)
 
+    class Meta:
+        unique_together = ('tx_hash', 'log_index')
+
 
 class OgnStaked(models.Model):
     tx_hash = models.CharField(max_length=66, db_index=True)
@@ -395,6 +419,74 @@ class ThreePoolSnapshot(models.Model):
     future_a_time = models.DateTimeField()
 
 
+class CallCache(models.Model):
+    """ Cached eth_call/eth_getStorageAt results for requests at a fixed block.
+    See core.blockchain.cache
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    block_number = models.IntegerField(db_index=True)
+    result = models.TextField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class ChainObject(models.Model):
+    """ Compressed JSON of an immutable chain object (transaction, receipt,
+    trace, block, etc).  See core.blockchain.store
+    """
+    # "<kind>:<hash or hex block number>"
+    key = models.CharField(max_length=96, primary_key=True)
+    data = models.BinaryField()
+
+
+class TraceRequest(models.Model):
+    """ Transaction waiting for its trace and internal transactions.  See
+    core.blockchain.harvest.traces
+    """
+    tx_hash = models.CharField(max_length=66, primary_key=True)
+    available_at = models.DateTimeField(db_index=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(default="")
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class BackfillChunk(models.Model):
+    """ Block range of a backfill job, leased to one worker at a time.  See
+    core.blockchain.harvest.backfill
+    """
+    job = models.CharField(max_length=64, db_index=True)
+    start_block = models.IntegerField()
+    end_block = models.IntegerField()
+    # First block not yet ingested
+    next_block = models.IntegerField()
+    contracts = models.JSONField(default=list)
+    done = models.BooleanField(default=False, db_index=True)
+    leased_until = models.DateTimeField(null=True, db_index=True)
+    worker = models.CharField(max_length=64, blank=True, default="")
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('job', 'start_block')
+
+
+class FollowerCursor(models.Model):
+    """ Last block a stage of the chain follower has finished.  See
+    core.follower
+    """
+    stage = models.CharField(max_length=32, primary_key=True)
+    block_number = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class Rollback(models.Model):
+    """ Reorg that was rolled back.  Processes drop their in-memory caches
+    when a new one appears, see core.blockchain.cache.check_generation
+    """
+    fork_block = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+
 ###############################################################################
 # Monkeypatching dragons below
 ###############################################################################
@@ -1,3 +1,2759 @@
-from django.test import TestCase
+import os
+import json
+import asyncio
+import time
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from aiohttp import web
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from eth_abi import decode_single, encode_single
+from eth_utils import decode_hex, encode_hex
+
+from core import cassette, etherscan, follower, metrics, transport
+from core.blockchain import (
+    cache,
+    callplan,
+    coalesce,
+    events,
+    multicall,
+    providers,
+    rpc,
+    scheduler,
+    sigs,
+    store,
+)
+from core.blockchain.addresses import MULTICALL, MULTICALL2, OUSD
+from core.blockchain.async_rpc import AsyncRPCClient, AsyncRPCError
+from core.blockchain.harvest import (
+    async_transactions,
+    backfill,
+    blocks,
+    executor,
+    leases,
+    reorgs,
+    traces,
+    transactions,
+    writer,
+)
+from core.blockchain.rpc import TooManyResults
+from core.models import (
+    AssetBlock,
+    BackfillChunk,
+    Block,
+    CallCache,
+    ChainObject,
+    EtherscanPointer,
+    FollowerCursor,
+    Log,
+    LogPointer,
+    OusdTransfer,
+    Rollback,
+    SupplySnapshot,
+    TraceRequest,
+    Transaction,
+)
+
+
+class MockRPCServer:
+    """ Local JSON-RPC server answering with handler(method, params), which
+    returns a response dict without the jsonrpc and id keys
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+        self.status = 200
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request):
+        body = await request.json()
+        self.calls.append((body["method"], body["params"]))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Let concurrent requests pile up
+            await asyncio.sleep(0.01)
+            response = self.handler(body["method"], body["params"])
+        finally:
+            self.in_flight -= 1
+
+        if self.status != 200:
+            return web.Response(status=self.status)
+
+        return web.Response(
+            text=json.dumps(dict(response, jsonrpc="2.0", id=body["id"])),
+            content_type="application/json",
+        )
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = "http://127.0.0.1:{}/".format(port)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.runner.cleanup()
+
+
+def word(value):
+    """ 32 byte ABI word of an int or address """
+    if isinstance(value, str):
+        value = int(value, 16)
+    return "{:064x}".format(value)
+
+
+ADDRESS = "0x" + "ab" * 20
+
+
+def log_range(params):
+    return (
+        int(params[0]["fromBlock"], 16),
+        int(params[0]["toBlock"], 16),
+    )
+
+
+class FakeLease:
+    def __init__(self, contract, last_block):
+        self.pointers = {contract: mock.Mock(last_block=last_block)}
+        self.advanced = []
+
+    def advance(self, contract, last_block):
+        self.advanced.append(last_block)
+        self.pointers[contract].last_block = last_block
+
+
+class AsyncRPCClientTest(SimpleTestCase):
+    async def test_get_logs(self):
+        def handler(method, params):
+            return {"result": [{"transactionHash": "0x01"}]}
+
+        async with MockRPCServer(handler) as server:
+            async with AsyncRPCClient(url=server.url) as client:
+                logs = await client.get_logs("0xabc", 10, 20)
+
+        self.assertEqual(logs, [{"transactionHash": "0x01"}])
+        self.assertEqual(server.calls[0][0], "eth_getLogs")
+        self.assertEqual(log_range(server.calls[0][1]), (10, 20))
+
+    async def test_get_logs_too_many_results(self):
+        def handler(method, params):
+            return {"error": {
+                "code": -32005,
+                "message": "query returned more than 10000 results",
+            }}
+
+        async with MockRPCServer(handler) as server:
+            async with AsyncRPCClient(url=server.url) as client:
+                with self.assertRaises(TooManyResults):
+                    await client.get_logs("0xabc", 10, 20)
+
+    async def test_provider_error(self):
+        def handler(method, params):
+            return {"error": {"code": -32000, "message": "header not found"}}
+
+        async with MockRPCServer(handler) as server:
+            async with AsyncRPCClient(url=server.url) as client:
+                with self.assertRaises(AsyncRPCError):
+                    await client.get_logs("0xabc", 10, 20)
+                with self.assertRaises(AsyncRPCError):
+                    await client.get_transaction("0x01")
+
+    @mock.patch.object(providers, "check_health")
+    async def test_provider_failover(self, check_health):
+        def handler(method, params):
+            return {"result": {"hash": params[0]}}
+
+        async with MockRPCServer(handler) as down:
+            async with MockRPCServer(handler) as up:
+                down.status = 503
+                pool = [
+                    providers.Provider(down.url, archive=True),
+                    providers.Provider(up.url, archive=True),
+                ]
+
+                def select(archive=False, exclude=()):
+                    return [x for x in pool if x not in exclude][0]
+
+                with mock.patch.multiple(
+                    providers,
+                    _providers=pool,
+                    select=select,
+                ):
+                    async with AsyncRPCClient() as client:
+                        tx = await client.get_transaction("0x01")
+
+        self.assertEqual(tx, {"hash": "0x01"})
+        self.assertEqual((len(down.calls), len(up.calls)), (1, 1))
+        self.assertEqual((pool[0].failures, pool[1].failures), (1, 0))
+
+    @mock.patch.object(providers, "check_health")
+    async def test_refused_request_does_not_fail_over(self, check_health):
+        async with MockRPCServer(lambda method, params: {}) as server:
+            server.status = 400
+            provider = providers.Provider(server.url, archive=True)
+
+            with mock.patch.object(providers, "_providers", [provider]):
+                async with AsyncRPCClient() as client:
+                    with self.assertRaises(AsyncRPCError):
+                        await client.get_transaction("0x01")
+
+        self.assertEqual(len(server.calls), 1)
+        self.assertEqual(provider.failures, 0)
+
+    @mock.patch.object(async_transactions, "ensure_block")
+    @mock.patch.object(async_transactions, "LOG_CONCURRENCY", 3)
+    async def test_log_ranges_are_bounded_and_adaptive(self, ensure_block):
+        """ Ranges wider than the provider allows are split, and only a few
+        are in flight at once
+        """
+        def handler(method, params):
+            start, end = log_range(params)
+            if end - start + 1 > 300:
+                return {"error": {"message": "block range is too wide"}}
+            return {"result": []}
+
+        lease = FakeLease("0xabc", 999)
+        stored = mock.AsyncMock()
+
+        with mock.patch.object(
+            async_transactions,
+            "ensure_transaction_and_downsteam_hashes",
+            stored
+        ):
+            async with MockRPCServer(handler) as server:
+                async with AsyncRPCClient(url=server.url) as client:
+                    await async_transactions.ensure_latest_logs_for_contract(
+                        client,
+                        "0xabc",
+                        lease,
+                        5000
+                    )
+
+        self.assertLessEqual(server.max_in_flight, 3)
+        self.assertEqual(lease.advanced[-1], 5000)
+        self.assertEqual(lease.advanced, sorted(lease.advanced))
+
+        # Every block was asked for in an accepted range
+        accepted = sorted(
+            log_range(params) for _, params in server.calls
+            if log_range(params)[1] - log_range(params)[0] + 1 <= 300
+        )
+        next_block = 1000
+        for start, end in accepted:
+            if start == next_block:
+                next_block = end + 1
+        self.assertEqual(next_block, 5001)
+
+
+class CassetteTest(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "cassette.jsonl.gz")
+        patcher = mock.patch.multiple(
+            cassette,
+            PATH=self.path,
+            _recordings=None,
+            _replayed={},
+            _pending=[],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.dir.cleanup)
+
+    def test_record_buffers_until_flush(self):
+        cassette.record("GET a", 200, "1")
+        cassette.record("GET a", 200, "2")
+        cassette.record("GET b", 500, "")
+
+        self.assertFalse(os.path.exists(self.path))
+
+        cassette.flush()
+        cassette.flush()
+
+        self.assertEqual(cassette.replay("GET a"), (200, "1"))
+        self.assertEqual(cassette.replay("GET a"), (200, "2"))
+        # The last response repeats
+        self.assertEqual(cassette.replay("GET a"), (200, "2"))
+        self.assertEqual(cassette.replay("GET b"), (500, ""))
+
+        with self.assertRaises(cassette.CassetteMiss):
+            cassette.replay("GET c")
+
+    def test_flushes_append(self):
+        with mock.patch.object(cassette, "FLUSH_SIZE", 2):
+            cassette.record("GET a", 200, "1")
+            cassette.record("GET a", 200, "2")
+            self.assertTrue(os.path.exists(self.path))
+            cassette.record("GET a", 200, "3")
+            cassette.flush()
+
+        self.assertEqual(
+            [x["body"] for x in cassette.load()["GET a"]],
+            ["1", "2", "3"]
+        )
+
+
+class MetricsTest(SimpleTestCase):
+    def test_request_seconds_labels(self):
+        with metrics.subsystem("metrics-test"):
+            metrics.record_rpc([
+                ("eth_call", [{"to": "0x01", "data": "0x70a0823100"}, "0x1"]),
+            ], 0.1)
+            metrics.record_rpc([
+                ("eth_call", [{"to": "0x01", "data": "0x70a0823100"}, "0x1"]),
+                ("eth_getBlockByNumber", ["0x1", False]),
+            ], 0.2)
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn(
+            'rpc_request_seconds_count{method="eth_call",'
+            'selector="0x70a08231",subsystem="metrics-test"} 1',
+            lines
+        )
+        self.assertIn(
+            'rpc_request_seconds_count{method="batch",selector="",'
+            'subsystem="metrics-test"} 1',
+            lines
+        )
+
+
+class ProvidersTest(SimpleTestCase):
+    def setUp(self):
+        self.a = providers.Provider("http://a.test", archive=True)
+        self.b = providers.Provider("http://b.test")
+        patcher = mock.patch.multiple(
+            providers,
+            _providers=[self.a, self.b],
+            _last_health_check=0,
+            _health_thread=None,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def mock_heads(self, heads, delay=0):
+        def send(method, url, **kwargs):
+            time.sleep(delay)
+            response = mock.Mock()
+            response.json.return_value = {"result": hex(heads[url])}
+            return response
+
+        return mock.patch.object(providers.transport, "send", send)
+
+    def test_health_check_runs_in_background(self):
+        with self.mock_heads({self.a.url: 100, self.b.url: 100}, delay=0.5):
+            start = time.time()
+            providers.check_health()
+            self.assertLess(time.time() - start, 0.25)
+
+            # Not started again while running
+            thread = providers._health_thread
+            providers.check_health()
+            self.assertIs(providers._health_thread, thread)
+
+            thread.join()
+
+        self.assertEqual((self.a.head, self.b.head), (100, 100))
+
+    def test_lagging_provider_cools_down(self):
+        with self.mock_heads({self.a.url: 100, self.b.url: 90}):
+            providers.check_health(force=True)
+
+        now = time.time()
+        self.assertTrue(self.a.is_healthy(now))
+        self.assertFalse(self.b.is_healthy(now))
+        self.assertIs(providers.select(), self.a)
+
+    def mock_statuses(self, statuses):
+        """ Answer requests to each provider with a status code """
+        def send(method, url, **kwargs):
+            response = requests.Response()
+            response.status_code = statuses[url]
+            response._content = b'{"jsonrpc": "2.0", "result": "0x1"}'
+            return response
+
+        return mock.patch.object(providers.transport, "send", send)
+
+    @mock.patch.object(providers, "check_health")
+    def test_client_errors_do_not_fail_over(self, check_health):
+        with self.mock_statuses({self.a.url: 400, self.b.url: 400}):
+            with mock.patch.object(providers, "select", return_value=self.a):
+                r = providers.post({"method": "eth_blockNumber"})
+
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual((self.a.failures, self.b.failures), (0, 0))
+
+    @mock.patch.object(providers, "check_health")
+    def test_server_errors_fail_over(self, check_health):
+        selected = []
+
+        def select(archive=False, exclude=()):
+            provider = [x for x in (self.a, self.b) if x not in exclude][0]
+            selected.append(provider)
+            return provider
+
+        with self.mock_statuses({self.a.url: 503, self.b.url: 200}):
+            with mock.patch.object(providers, "select", select):
+                r = providers.post({"method": "eth_blockNumber"})
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(selected, [self.a, self.b])
+        self.assertEqual((self.a.failures, self.b.failures), (1, 0))
+        self.assertFalse(self.a.is_healthy(time.time()))
+
+    def test_in_flight_is_thread_safe(self):
+        def requests():
+            for _ in range(10000):
+                self.a.start_request()
+                self.a.end_request()
+
+        threads = [threading.Thread(target=requests) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.a.in_flight, 0)
+
+
+class DecodeLogTest(SimpleTestCase):
+    def test_unindexed_args(self):
+        self.assertEqual(
+            events.decode_log(
+                [sigs.SIG_EVENT_MINT],
+                "0x" + word(ADDRESS) + word(5 * 10 ** 18)
+            ),
+            ("Mint", {"addr": ADDRESS, "value": 5 * 10 ** 18})
+        )
+
+    def test_indexed_args(self):
+        self.assertEqual(
+            events.decode_log(
+                [sigs.SIG_EVENT_DEPOSIT, "0x" + word(ADDRESS)],
+                "0x" + word(ADDRESS) + word(7)
+            ),
+            ("Deposit", {"asset": ADDRESS, "p_token": ADDRESS, "amount": 7})
+        )
+
+    def test_unknown_event(self):
+        self.assertEqual(
+            events.decode_log(["0x" + word(1)], "0x"),
+            ("", {})
+        )
+
+    def test_mismatched_log_keeps_name(self):
+        # Deposit with its p_token indexed as well
+        self.assertEqual(
+            events.decode_log(
+                [sigs.SIG_EVENT_DEPOSIT, "0x" + word(ADDRESS), "0x" + word(1)],
+                "0x" + word(7)
+            ),
+            ("Deposit", {})
+        )
+        self.assertEqual(
+            events.decode_log([sigs.SIG_EVENT_MINT], "0x1234"),
+            ("Mint", {})
+        )
+
+
+class DecodeLogsTest(TestCase):
+    def create_log(self, log_index, topic_0, data):
+        return Log.objects.create(
+            block_number=1,
+            log_index=log_index,
+            transaction_index=0,
+            transaction_hash="0x" + word(1),
+            address=ADDRESS,
+            topic_0=topic_0,
+            data=data,
+            event_name="",
+        )
+
+    def test_decode_logs(self):
+        rebase = self.create_log(
+            0,
+            sigs.SIG_EVENT_TOTAL_SUPPLY_UPDATED,
+            "0x" + word(1) + word(2) + word(3)
+        )
+        broken = self.create_log(1, sigs.SIG_EVENT_MINT, "0x1234")
+        unknown = self.create_log(2, "0x" + word(1), "0x")
+
+        self.assertEqual(events.decode_logs(Log.objects.all()), 2)
+        # Logs that can't be decoded aren't tried again
+        self.assertEqual(events.decode_logs(Log.objects.all()), 0)
+
+        rebase.refresh_from_db()
+        self.assertEqual(rebase.event_name, "TotalSupplyUpdated")
+        self.assertEqual(rebase.args["rebasing_credits_per_token"], 3)
+        self.assertEqual(
+            Log.objects.filter(args__total_supply=1).count(),
+            1
+        )
+
+        broken.refresh_from_db()
+        self.assertEqual((broken.event_name, broken.args), ("Mint", {}))
+
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.event_name, unknown.args), ("", {}))
+
+    def test_args_of_undecoded_log(self):
+        log = self.create_log(
+            0,
+            sigs.SIG_EVENT_TOTAL_SUPPLY_UPDATED_HIRES,
+            "0x" + word(1) + word(2) + word(3)
+        )
+        self.assertEqual(log.args, {})
+        self.assertEqual(events.args_of(log)["rebasing_credits_per_token"], 3)
+
+
+class FakeProvider:
+    """ Stands in for providers.post, answering each JSON-RPC request with
+    handler(method, params).  Batch responses come back in reverse order and
+    requests the handler returns None for are left out.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.payloads = []
+
+    def respond(self, request):
+        response = self.handler(request["method"], request["params"])
+        if response is None:
+            return None
+        return dict(response, jsonrpc="2.0", id=request["id"])
+
+    def post(self, payload, archive=False):
+        self.payloads.append(payload)
+        if isinstance(payload, list):
+            data = [self.respond(x) for x in reversed(payload)]
+            data = [x for x in data if x is not None]
+        else:
+            data = self.respond(payload)
+
+        response = mock.Mock(status_code=200)
+        response.json.return_value = data
+        return response
+
+    def patch(self):
+        return mock.patch.object(providers, "post", self.post)
+
+
+class BatchTest(SimpleTestCase):
+    @mock.patch.object(rpc, "MAX_BATCH_SIZE", 2)
+    def test_responses_match_requests(self):
+        provider = FakeProvider(lambda method, params: {"result": params[0]})
+        batch = rpc.Batch(use_cache=False)
+        requests = [batch.get_transaction(hex(i)) for i in range(5)]
+
+        with provider.patch():
+            batch.execute()
+
+        self.assertEqual(
+            [x.result for x in requests],
+            [hex(i) for i in range(5)]
+        )
+        self.assertEqual([len(x) for x in provider.payloads], [2, 2, 1])
+
+        # Nothing is sent again
+        with provider.patch():
+            batch.execute()
+        self.assertEqual(len(provider.payloads), 3)
+
+    def test_missing_response(self):
+        def handler(method, params):
+            if params[0] == "0x1":
+                return None
+            return {"result": params[0]}
+
+        with FakeProvider(handler).patch():
+            responses = rpc.request_batch([
+                ("eth_getTransactionByHash", ["0x0"]),
+                ("eth_getTransactionByHash", ["0x1"]),
+            ])
+
+        self.assertEqual(responses[0]["result"], "0x0")
+        self.assertEqual(
+            responses[1]["error"]["message"],
+            "Missing batch response"
+        )
+
+    def test_rejected_batch(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {"code": -32600, "message": "batch too large"},
+        }
+
+        with mock.patch.object(providers, "post", return_value=response):
+            with self.assertRaisesRegex(Exception, "batch too large"):
+                rpc.request_batch([("eth_blockNumber", [])])
+
+
+FAILING = "0x" + "ee" * 20
+
+
+def multicall_handler(method, params):
+    """ Answer eth_calls as the Multicall contracts would, with every call
+    returning its own calldata except calls to FAILING, which revert
+    """
+    if method == "eth_getBlockByNumber":
+        return {"result": params[0]}
+
+    call, _ = params
+    data = decode_hex(call["data"])[4:]
+
+    if call["to"] == MULTICALL2:
+        _, calls = decode_single("(bool,(address,bytes)[])", data)
+        return {"result": encode_hex(encode_single(
+            "((bool,bytes)[])",
+            [[(to != FAILING, x) for to, x in calls]]
+        ))}
+
+    if call["to"] == MULTICALL:
+        (calls,) = decode_single("((address,bytes)[])", data)
+        if any(to == FAILING for to, _ in calls):
+            return {"error": {"code": -32000, "message": "execution reverted"}}
+        return {"result": encode_hex(encode_single(
+            "(uint256,bytes[])",
+            [1, [x for _, x in calls]]
+        ))}
+
+    if call["to"] == FAILING:
+        return {"error": {"code": -32000, "message": "execution reverted"}}
+    return {"result": call["data"]}
+
+
+def call_targets(payload):
+    """ Contracts called by the eth_calls in a batch payload """
+    return [
+        x["params"][0]["to"] for x in payload if x["method"] == "eth_call"
+    ]
+
+
+class MulticallTest(SimpleTestCase):
+    def queue(self, block):
+        mc = multicall.Multicall(use_cache=False)
+        return mc, [
+            mc.call(ADDRESS, "0x70a08231", word(1), block),
+            mc.call(FAILING, "0x70a08231", word(2), block),
+            mc.call(ADDRESS, "0x18160ddd", "", block),
+            mc.get_block(block),
+        ]
+
+    def test_try_aggregate(self):
+        provider = FakeProvider(multicall_handler)
+        mc, (balance, failed, supply, block) = self.queue(13000000)
+
+        with provider.patch():
+            mc.execute()
+
+        # One batch with one aggregate call alongside the block
+        self.assertEqual(len(provider.payloads), 1)
+        self.assertEqual(call_targets(provider.payloads[0]), [MULTICALL2])
+        self.assertEqual(len(provider.payloads[0]), 2)
+
+        self.assertEqual(balance.result, "0x70a08231" + word(1))
+        self.assertEqual(supply.result, "0x18160ddd")
+        self.assertEqual(failed.error, multicall.SUB_CALL_FAILED)
+        self.assertEqual(block.result, hex(13000000))
+
+    def test_aggregate_failure_retries_individually(self):
+        provider = FakeProvider(multicall_handler)
+        mc, (balance, failed, supply, _) = self.queue(10000000)
+
+        with provider.patch():
+            mc.execute()
+
+        self.assertEqual(call_targets(provider.payloads[0]), [MULTICALL])
+        # Retried without the Multicall contract
+        self.assertEqual(
+            call_targets(provider.payloads[1]),
+            [ADDRESS, FAILING, ADDRESS]
+        )
+
+        self.assertEqual(balance.result, "0x70a08231" + word(1))
+        self.assertEqual(supply.result, "0x18160ddd")
+        self.assertEqual(failed.error["message"], "execution reverted")
+
+    def test_before_multicall(self):
+        provider = FakeProvider(multicall_handler)
+        mc, (balance, failed, _, _) = self.queue(7000000)
+
+        with provider.patch():
+            mc.execute()
+
+        self.assertEqual(len(provider.payloads), 1)
+        self.assertEqual(
+            call_targets(provider.payloads[0]),
+            [ADDRESS, FAILING, ADDRESS]
+        )
+        self.assertEqual(balance.result, "0x70a08231" + word(1))
+        self.assertEqual(failed.error["message"], "execution reverted")
+
+
+def balance_call(block):
+    return ("eth_call", rpc.call_params(ADDRESS, "0x70a08231", word(1), block))
+
+
+class CallCacheTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            cache,
+            ENABLED=True,
+            memory=cache.LRU(100),
+            _generation=None,
+            _generation_checked=None,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_memory_and_database_tiers(self):
+        request = balance_call(100)
+        self.assertEqual(cache.lookup_many([request]), [None])
+
+        cache.store_many([request], [{"result": "0x01"}])
+        self.assertEqual(CallCache.objects.get().block_number, 100)
+
+        # From memory, without the table
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.lookup(*request), {"result": "0x01"})
+
+        # From the table once dropped from memory
+        cache.memory.clear()
+        self.assertEqual(cache.lookup_many([request]), ["0x01"])
+        self.assertEqual(cache.memory.get(cache.cache_key(*request)), "0x01")
+
+    def test_uncacheable(self):
+        latest = balance_call("latest")
+        failed = balance_call(101)
+        block = ("eth_getBlockByNumber", [hex(100), False])
+
+        cache.store_many([latest, failed, block], [
+            {"result": "0x01"},
+            {"error": {"code": -32000, "message": "execution reverted"}},
+            {"result": {"number": hex(100)}},
+        ])
+
+        self.assertEqual(CallCache.objects.count(), 0)
+        self.assertEqual(
+            cache.lookup_many([latest, failed, block]),
+            [None, None, None]
+        )
+
+    @mock.patch.object(cache, "MAX_ROWS", 2)
+    def test_evict_oldest(self):
+        requests = [balance_call(block) for block in range(100, 104)]
+        cache.store_many(requests, [{"result": "0x01"}] * 4)
+
+        # Created in block order
+        for i, request in enumerate(requests):
+            CallCache.objects.filter(key=cache.cache_key(*request)).update(
+                created=timezone.now() - timedelta(hours=10 - i)
+            )
+
+        cache.evict()
+
+        self.assertEqual(
+            sorted(CallCache.objects.values_list("block_number", flat=True)),
+            [102, 103]
+        )
+
+    def test_rollback_clears_memory(self):
+        request = balance_call(100)
+        cache.check_generation()
+        cache.store_many([request], [{"result": "0x01"}])
+
+        CallCache.objects.all().delete()
+        self.assertEqual(cache.lookup_many([request]), ["0x01"])
+
+        Rollback.objects.create(fork_block=100)
+        # Noticed once the interval has passed
+        self.assertEqual(cache.lookup_many([request]), ["0x01"])
+        with mock.patch.object(cache, "ROLLBACK_INTERVAL", 0):
+            self.assertEqual(cache.lookup_many([request]), [None])
+
+
+class ChainObjectStoreTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(store, "memory", cache.LRU(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_put_and_get(self):
+        tx_hash = "0x" + "AB" * 32
+        tx = {"hash": tx_hash, "blockNumber": "0x64"}
+
+        store.put_many(store.TRANSACTION, {tx_hash: tx})
+        store.put(store.BLOCK, 100, {"number": "0x64"})
+
+        self.assertEqual(
+            sorted(ChainObject.objects.values_list("key", flat=True)),
+            ["block:0x64", "tx:" + tx_hash.lower()]
+        )
+        self.assertEqual(store.get(store.TRANSACTION, tx_hash), tx)
+
+        # From the table once dropped from memory
+        store.memory.clear()
+        self.assertEqual(
+            store.get_many(store.TRANSACTION, [tx_hash, "0x01"]),
+            {tx_hash: tx}
+        )
+        self.assertEqual(store.get(store.BLOCK, 100), {"number": "0x64"})
+        # Kinds don't share keys
+        self.assertIsNone(store.get(store.RECEIPT, tx_hash))
+
+    def test_delete(self):
+        store.put_many(store.BLOCK, {100: {"n": 100}, 101: {"n": 101}})
+        store.delete_many(store.BLOCK, [101])
+
+        self.assertEqual(store.get_many(store.BLOCK, [100, 101]), {
+            100: {"n": 100},
+        })
+        self.assertEqual(ChainObject.objects.count(), 1)
+
+
+TX_HASH = "0x" + word(1)
+
+
+def log_row(log_index, **kwargs):
+    fields = dict(
+        block_number=1,
+        transaction_index=0,
+        transaction_hash=TX_HASH,
+        address=ADDRESS,
+        event_name="",
+    )
+    fields.update(kwargs)
+    return Log(log_index=log_index, **fields)
+
+
+class BulkUpsertTest(TestCase):
+    def test_insert_and_update(self):
+        count = writer.bulk_upsert(
+            Log,
+            [log_row(0), log_row(1)],
+            writer.CONFLICT_FIELDS[Log]
+        )
+        self.assertEqual(count, 2)
+        ids = dict(Log.objects.values_list("log_index", "id"))
+
+        count = writer.bulk_upsert(
+            Log,
+            [
+                log_row(1, event_name="Transfer"),
+                log_row(1, event_name="Mint", args={"value": 1}),
+                log_row(2),
+            ],
+            writer.CONFLICT_FIELDS[Log]
+        )
+        # The last of rows with the same key wins
+        self.assertEqual(count, 2)
+
+        self.assertEqual(
+            list(Log.objects.order_by("log_index").values_list(
+                "log_index",
+                "event_name",
+                "args",
+            )),
+            [(0, "", {}), (1, "Mint", {"value": 1}), (2, "", {})]
+        )
+        # Updated in place
+        self.assertEqual(Log.objects.get(log_index=0).id, ids[0])
+        self.assertEqual(Log.objects.get(log_index=1).id, ids[1])
+
+    @mock.patch.object(writer, "CHUNK_SIZE", 2)
+    def test_bulk_writer(self):
+        block_time = timezone.now()
+        Transaction.objects.create(
+            tx_hash=TX_HASH,
+            block_number=1,
+            block_time=block_time,
+            notes="",
+        )
+
+        bulk = writer.BulkWriter()
+        for i in range(5):
+            bulk.add(log_row(i))
+        bulk.add(OusdTransfer(
+            tx_hash_id=TX_HASH,
+            log_index=0,
+            block_time=block_time,
+            from_address=ADDRESS,
+            to_address=ADDRESS,
+            amount=1,
+        ))
+        bulk.add(None)
+
+        self.assertEqual(len(bulk), 6)
+        bulk.flush()
+
+        self.assertEqual(len(bulk), 0)
+        self.assertEqual(Log.objects.count(), 5)
+        self.assertEqual(OusdTransfer.objects.get().amount, 1)
+
+        # Writing the same rows again is idempotent
+        bulk.add(log_row(0))
+        bulk.flush()
+        self.assertEqual(Log.objects.count(), 5)
+
+
+OTHER = "0x" + "cd" * 20
+
+
+class LeaseTest(TestCase):
+    def test_claim(self):
+        LogPointer.objects.create(contract=ADDRESS, last_block=500)
+
+        lease = leases.claim(LogPointer, [ADDRESS, OTHER], 100)
+
+        self.assertEqual(
+            {x: y.last_block for x, y in lease.pointers.items()},
+            {ADDRESS: 500, OTHER: 100}
+        )
+        self.assertEqual(
+            set(LogPointer.objects.values_list("leased_by", flat=True)),
+            {lease.token}
+        )
+
+        # Leased pointers aren't claimed again
+        self.assertEqual(
+            leases.claim(LogPointer, [ADDRESS, OTHER], 100).pointers,
+            {}
+        )
+
+    @mock.patch.object(leases, "LEASE_COUNT", 1)
+    def test_claim_count(self):
+        LogPointer.objects.create(contract=ADDRESS, last_block=500)
+        LogPointer.objects.create(contract=OTHER, last_block=200)
+
+        first = leases.claim(LogPointer, [ADDRESS, OTHER], 100)
+        second = leases.claim(LogPointer, [ADDRESS, OTHER], 100)
+
+        # Furthest behind first
+        self.assertEqual(list(first.pointers), [OTHER])
+        self.assertEqual(list(second.pointers), [ADDRESS])
+
+    def test_advance(self):
+        lease = leases.claim(LogPointer, [ADDRESS], 100)
+        LogPointer.objects.update(leased_until=timezone.now())
+
+        lease.advance(ADDRESS, 200)
+
+        pointer = LogPointer.objects.get()
+        self.assertEqual(pointer.last_block, 200)
+        self.assertEqual(lease.pointers[ADDRESS].last_block, 200)
+        self.assertGreater(
+            pointer.leased_until,
+            timezone.now() + leases.LEASE - timedelta(minutes=1)
+        )
+
+    def test_advance_renews_all_leases(self):
+        lease = leases.claim(LogPointer, [ADDRESS, OTHER], 100)
+        LogPointer.objects.update(leased_until=timezone.now())
+
+        lease.advance(ADDRESS, 200)
+
+        # The pointer not reached yet isn't left to expire
+        other = LogPointer.objects.get(contract=OTHER)
+        self.assertEqual(other.last_block, 100)
+        self.assertGreater(
+            other.leased_until,
+            timezone.now() + leases.LEASE - timedelta(minutes=1)
+        )
+        self.assertEqual(
+            leases.claim(LogPointer, [ADDRESS, OTHER], 100).pointers,
+            {}
+        )
+
+    @mock.patch.object(leases, "LEASE", timedelta(seconds=0.03))
+    def test_heartbeat(self):
+        lease = leases.Lease(LogPointer, "token", {})
+
+        with mock.patch.object(lease, "renew") as renew:
+            lease.keep_alive()
+            time.sleep(0.1)
+            lease.stopped.set()
+            time.sleep(0.03)
+            count = renew.call_count
+            time.sleep(0.05)
+
+        self.assertGreaterEqual(count, 2)
+        # Stopped on release
+        self.assertEqual(renew.call_count, count)
+
+    def test_expired_lease_is_lost(self):
+        lease = leases.claim(LogPointer, [ADDRESS], 100)
+        LogPointer.objects.update(
+            leased_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        other = leases.claim(LogPointer, [ADDRESS], 100)
+        self.assertEqual(list(other.pointers), [ADDRESS])
+
+        with self.assertRaises(leases.LeaseLost):
+            lease.advance(ADDRESS, 200)
+
+        # Releasing a lost lease leaves the new holder alone
+        lease.release()
+        self.assertEqual(LogPointer.objects.get().leased_by, other.token)
+        self.assertEqual(LogPointer.objects.get().last_block, 100)
+
+    def test_release(self):
+        with leases.lease_pointers(LogPointer, [ADDRESS], 100) as lease:
+            lease.advance(ADDRESS, 200)
+
+        pointer = LogPointer.objects.get()
+        self.assertEqual(
+            (pointer.last_block, pointer.leased_by, pointer.leased_until),
+            (200, "", None)
+        )
+        self.assertEqual(
+            list(leases.claim(LogPointer, [ADDRESS], 100).pointers),
+            [ADDRESS]
+        )
+
+
+def block_hash(block_number, fork=""):
+    return "0x{}{:064x}".format(fork, block_number)[:66]
+
+
+class ReorgTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            cache,
+            ENABLED=True,
+            memory=cache.LRU(100),
+            _generation=None,
+            _generation_checked=None,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.now = timezone.now()
+        for block_number in range(100, 111):
+            Block.objects.create(
+                block_number=block_number,
+                block_time=self.now,
+                block_hash=block_hash(block_number),
+            )
+
+        for block_number in (104, 106):
+            tx_hash = "0x" + word(block_number)
+            Transaction.objects.create(
+                tx_hash=tx_hash,
+                block_number=block_number,
+                block_time=self.now,
+                notes="",
+            )
+            log_row(
+                0,
+                block_number=block_number,
+                transaction_hash=tx_hash
+            ).save()
+            OusdTransfer.objects.create(
+                tx_hash_id=tx_hash,
+                log_index=0,
+                block_time=self.now,
+                from_address=ADDRESS,
+                to_address=ADDRESS,
+            )
+            store.put(store.TRANSACTION, tx_hash, {"hash": tx_hash})
+
+        LogPointer.objects.create(contract=ADDRESS, last_block=110)
+        EtherscanPointer.objects.create(contract=ADDRESS, last_block=110)
+        EtherscanPointer.objects.create(contract=OTHER, last_block=103)
+        FollowerCursor.objects.create(stage="snapshots", block_number=108)
+
+        cache.check_generation()
+        cache.store_many(
+            [balance_call(104), balance_call(106)],
+            [{"result": "0x01"}, {"result": "0x02"}]
+        )
+
+    def patch_chain(self, fork, head=None):
+        """ Make the canonical chain differ from the stored one from the
+        fork block onwards, and end at head
+        """
+        def canonical_hashes(block_numbers):
+            return {
+                x: (
+                    None if head is not None and x > head
+                    else block_hash(x, "f" if x >= fork else "")
+                )
+                for x in block_numbers
+            }
+
+        return mock.patch.object(reorgs, "canonical_hashes", canonical_hashes)
+
+    def test_no_reorg(self):
+        with self.patch_chain(200):
+            self.assertIsNone(reorgs.handle_reorgs(110))
+
+        self.assertEqual(Block.objects.count(), 11)
+        self.assertEqual(Rollback.objects.count(), 0)
+
+    def test_rollback(self):
+        for block_number in (104, 106):
+            SupplySnapshot.objects.create(
+                block_number=block_number,
+                reported_supply=1,
+                computed_supply=1,
+                credits=1,
+                credits_ratio=1,
+            )
+        AssetBlock.objects.create(symbol="DAI", block_number=106)
+
+        with self.patch_chain(105):
+            self.assertEqual(reorgs.handle_reorgs(110), 105)
+
+        self.assertEqual(
+            list(Block.objects.values_list("block_number", flat=True)
+                 .order_by("block_number")),
+            list(range(100, 105))
+        )
+        self.assertEqual(
+            list(Transaction.objects.values_list("block_number", flat=True)),
+            [104]
+        )
+        self.assertEqual(
+            list(Log.objects.values_list("block_number", flat=True)),
+            [104]
+        )
+        self.assertEqual(
+            list(OusdTransfer.objects.values_list("tx_hash", flat=True)),
+            ["0x" + word(104)]
+        )
+        self.assertEqual(
+            list(CallCache.objects.values_list("block_number", flat=True)),
+            [104]
+        )
+        self.assertIsNone(store.get(store.TRANSACTION, "0x" + word(106)))
+        self.assertEqual(
+            [x.block_number for x in SupplySnapshot.objects.all()],
+            [104]
+        )
+        self.assertFalse(AssetBlock.objects.exists())
+
+        # Pointers and cursors are moved back to before the fork only
+        self.assertEqual(LogPointer.objects.get().last_block, 104)
+        self.assertEqual(
+            dict(EtherscanPointer.objects.values_list(
+                "contract",
+                "last_block",
+            )),
+            {ADDRESS: 104, OTHER: 103}
+        )
+        self.assertEqual(FollowerCursor.objects.get().block_number, 104)
+
+        self.assertEqual(Rollback.objects.get().fork_block, 105)
+        self.assertIsNone(
+            cache.memory.get(cache.cache_key(*balance_call(104)))
+        )
+
+    def test_lagging_provider(self):
+        # Blocks the provider doesn't have yet aren't a reorg
+        with self.patch_chain(200, head=107):
+            self.assertIsNone(reorgs.handle_reorgs(110))
+
+        self.assertEqual(Block.objects.count(), 11)
+
+        # But it still reports blocks it has that were replaced
+        with self.patch_chain(106, head=107):
+            self.assertEqual(reorgs.handle_reorgs(110), 106)
+
+        self.assertEqual(Block.objects.count(), 6)
+
+    def test_final_blocks_are_ignored(self):
+        # Every block changed, but those before head - CONFIRMATIONS are
+        # final
+        with self.patch_chain(0):
+            self.assertEqual(reorgs.handle_reorgs(110 + 5), 104)
+
+        self.assertEqual(Block.objects.count(), 4)
+
+
+class BackfillTest(TestCase):
+    def chunk_ranges(self):
+        return list(
+            BackfillChunk.objects.order_by("start_block")
+            .values_list("start_block", "end_block")
+        )
+
+    def finish_chunks(self):
+        BackfillChunk.objects.update(
+            next_block=F("end_block") + 1,
+            done=True
+        )
+
+    def test_gaps(self):
+        self.assertEqual(backfill.gaps([], 10, 20), [(10, 20)])
+        self.assertEqual(
+            backfill.gaps([(15, 16), (10, 12), (12, 13)], 10, 20),
+            [(14, 14), (17, 20)]
+        )
+        self.assertEqual(backfill.gaps([(0, 30)], 10, 20), [])
+        self.assertEqual(backfill.gaps([(25, 30)], 10, 20), [(10, 20)])
+
+    def test_plan_extends_job(self):
+        self.assertEqual(backfill.plan("job", 100, 349, 100, [ADDRESS]), 3)
+        self.assertEqual(
+            self.chunk_ranges(),
+            [(100, 199), (200, 299), (300, 349)]
+        )
+
+        # Planning again only adds what isn't covered yet
+        self.assertEqual(backfill.plan("job", 100, 349, 100, [ADDRESS]), 0)
+        self.assertEqual(backfill.plan("job", 100, 500, 100, [ADDRESS]), 2)
+        self.assertEqual(
+            self.chunk_ranges(),
+            [(100, 199), (200, 299), (300, 349), (350, 449), (450, 500)]
+        )
+
+    def test_lease_and_progress(self):
+        backfill.plan("job", 100, 299, 100, [ADDRESS])
+
+        first = backfill.lease("job", "a")
+        second = backfill.lease("job", "b")
+        self.assertEqual((first.start_block, second.start_block), (100, 200))
+        self.assertIsNone(backfill.lease("job", "c"))
+
+        backfill.checkpoint(first, 150)
+        self.assertFalse(first.done)
+        self.assertEqual(backfill.progress("job"), (50, 200))
+
+        backfill.checkpoint(first, 200)
+        self.assertTrue(first.done)
+        self.assertEqual(backfill.progress("job"), (100, 200))
+
+        # An expired lease can be taken over, resuming from the checkpoint
+        backfill.checkpoint(second, 250)
+        BackfillChunk.objects.filter(pk=second.pk).update(
+            leased_until=timezone.now() - timedelta(seconds=1)
+        )
+        resumed = backfill.lease("job", "c")
+        self.assertEqual((resumed.pk, resumed.next_block), (second.pk, 250))
+
+        # The previous holder can't checkpoint it any more
+        with self.assertRaises(backfill.ChunkLost):
+            backfill.checkpoint(second, 300)
+        backfill.checkpoint(resumed, 260)
+        self.assertEqual(
+            BackfillChunk.objects.get(pk=second.pk).next_block,
+            260
+        )
+
+    def test_expired_lease_is_lost(self):
+        backfill.plan("job", 100, 199, 100, [ADDRESS])
+        chunk = backfill.lease("job", "a")
+        BackfillChunk.objects.update(
+            leased_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        with self.assertRaises(backfill.ChunkLost):
+            backfill.checkpoint(chunk, 150)
+
+        self.assertEqual(BackfillChunk.objects.get().next_block, 100)
+
+    @mock.patch.object(backfill, "ingest_chunk")
+    def test_work_gives_up_lost_chunks(self, ingest_chunk):
+        backfill.plan("job", 100, 299, 100, [ADDRESS])
+        ingest_chunk.side_effect = [backfill.ChunkLost("lost"), None]
+
+        backfill.work(("job", "a"))
+
+        # Not counted as a failure of the chunk
+        self.assertEqual(
+            list(BackfillChunk.objects.values_list("attempts", "last_error")),
+            [(0, ""), (0, "")]
+        )
+
+    def test_finish(self):
+        LogPointer.objects.create(contract=ADDRESS, last_block=99)
+        # Already past the job
+        LogPointer.objects.create(contract=OTHER, last_block=1000)
+        backfill.plan("job", 100, 299, 100, [ADDRESS, OTHER])
+
+        self.assertFalse(backfill.finish("job"))
+
+        self.finish_chunks()
+        self.assertTrue(backfill.finish("job"))
+
+        self.assertEqual(
+            dict(LogPointer.objects.values_list("contract", "last_block")),
+            {ADDRESS: 299, OTHER: 1000}
+        )
+
+    def test_finish_skips_leased_pointers(self):
+        LogPointer.objects.create(contract=ADDRESS, last_block=99)
+        LogPointer.objects.create(contract=OTHER, last_block=99)
+        backfill.plan("job", 100, 299, 100, [ADDRESS, OTHER])
+        self.finish_chunks()
+
+        # A harvest run is working on ADDRESS
+        harvest = leases.claim(LogPointer, [ADDRESS], 0)
+        self.assertTrue(backfill.finish("job"))
+
+        self.assertEqual(
+            dict(LogPointer.objects.values_list("contract", "last_block")),
+            {ADDRESS: 99, OTHER: 299}
+        )
+        # The harvest run's lease is untouched
+        harvest.advance(ADDRESS, 150)
+
+    def test_finish_with_gap(self):
+        LogPointer.objects.create(contract=ADDRESS, last_block=99)
+        backfill.plan("job", 100, 299, 100, [ADDRESS])
+        backfill.plan("job", 400, 499, 100, [ADDRESS])
+        self.finish_chunks()
+
+        self.assertFalse(backfill.finish("job"))
+        self.assertEqual(LogPointer.objects.get().last_block, 99)
+
+
+class TokenBucketTest(SimpleTestCase):
+    def drained(self, rate, burst=1):
+        bucket = scheduler.TokenBucket(rate, burst)
+        bucket.tokens = 0
+        return bucket
+
+    def test_priority_order(self):
+        bucket = self.drained(20)
+        order = []
+
+        def request(priority):
+            bucket.acquire(priority=priority)
+            order.append(priority)
+
+        threads = []
+        for priority in (
+            scheduler.BACKFILL,
+            scheduler.NOTIFY,
+            scheduler.INTERACTIVE,
+        ):
+            threads.append(threading.Thread(target=request, args=[priority]))
+            threads[-1].start()
+            time.sleep(0.01)
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [
+            scheduler.INTERACTIVE,
+            scheduler.NOTIFY,
+            scheduler.BACKFILL,
+        ])
+
+    def test_reserve(self):
+        bucket = scheduler.TokenBucket(0.001, 4)
+
+        for _ in range(3):
+            bucket.acquire(priority=scheduler.BACKFILL)
+
+        # The last token is left for higher priorities
+        with mock.patch.dict(scheduler.MAX_WAIT, {scheduler.BACKFILL: 0.05}):
+            with self.assertRaises(scheduler.ScheduleTimeout):
+                bucket.acquire(priority=scheduler.BACKFILL)
+
+        bucket.acquire(priority=scheduler.INTERACTIVE)
+
+    @mock.patch.dict(scheduler.MAX_WAIT, {scheduler.SNAPSHOT: 0.1})
+    def test_shed_after_max_wait(self):
+        bucket = self.drained(0.001)
+
+        start = time.monotonic()
+        with self.assertRaises(scheduler.ScheduleTimeout):
+            bucket.acquire(priority=scheduler.SNAPSHOT)
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(bucket.waiters, [])
+
+    def test_waiters_behind_do_not_spin(self):
+        bucket = self.drained(4)
+        polls = mock.Mock(wraps=bucket.poll)
+
+        with mock.patch.object(bucket, "poll", polls):
+            first = threading.Thread(
+                target=bucket.acquire,
+                kwargs={"priority": scheduler.INTERACTIVE}
+            )
+            first.start()
+            time.sleep(0.01)
+            # Would have enough tokens, but has to wait its turn
+            bucket.acquire(cost=0.5, priority=scheduler.NOTIFY)
+            first.join()
+
+        self.assertLess(polls.call_count, 10)
+
+    async def test_async_priority_order(self):
+        bucket = self.drained(20)
+        order = []
+
+        async def request(priority):
+            await bucket.acquire_async(priority=priority)
+            order.append(priority)
+
+        tasks = []
+        for priority in (scheduler.BACKFILL, scheduler.INTERACTIVE):
+            tasks.append(asyncio.create_task(request(priority)))
+            await asyncio.sleep(0.01)
+
+        # Threads and coroutines share the queue
+        thread = threading.Thread(
+            target=bucket.acquire,
+            kwargs={"priority": scheduler.NOTIFY}
+        )
+        thread.start()
+        await asyncio.gather(*tasks)
+        thread.join()
+
+        self.assertEqual(order, [scheduler.INTERACTIVE, scheduler.BACKFILL])
+        self.assertEqual(bucket.waiters, [])
+
+    @mock.patch.dict(scheduler.MAX_WAIT, {scheduler.SNAPSHOT: 0.1})
+    async def test_async_shed(self):
+        bucket = self.drained(0.001)
+
+        with self.assertRaises(scheduler.ScheduleTimeout):
+            await bucket.acquire_async(priority=scheduler.SNAPSHOT)
+
+    @mock.patch.object(providers, "check_health")
+    async def test_async_client_waits_for_bucket(self, check_health):
+        def handler(method, params):
+            return {"result": None}
+
+        async with MockRPCServer(handler) as server:
+            provider = providers.Provider(server.url, archive=True)
+            provider.bucket = self.drained(0.001)
+
+            with mock.patch.object(providers, "_providers", [provider]):
+                with mock.patch.dict(
+                    scheduler.MAX_WAIT,
+                    {scheduler.BACKFILL: 0.1}
+                ):
+                    with metrics.subsystem(metrics.BACKFILL):
+                        async with AsyncRPCClient() as client:
+                            with self.assertRaises(
+                                scheduler.ScheduleTimeout
+                            ):
+                                await client.get_transaction("0x01")
+
+        self.assertEqual(server.calls, [])
+
+
+CHECKSUM_ADDRESS = "0x5A0b54D5dc17e0AadC383d2db43B0a0D3E029c4c"
+
+
+class CallPlanTest(SimpleTestCase):
+    def assert_matches_eth_abi(self, signature, args):
+        plan = callplan.CallPlan(signature)
+        try:
+            expected = encode_single(plan.arg_sig, args).hex()
+        except Exception as err:
+            with self.assertRaises(err.__class__):
+                plan.encode(args)
+        else:
+            self.assertEqual(plan.encode(args), expected)
+
+    def test_encode_matches_eth_abi(self):
+        for signature, args in [
+            ("balanceOf(address)", [ADDRESS]),
+            ("balanceOf(address)", [ADDRESS.upper().replace("0X", "0x")]),
+            ("balanceOf(address)", [ADDRESS[2:]]),
+            ("balanceOf(address)", [CHECKSUM_ADDRESS]),
+            ("balanceOf(address)", [CHECKSUM_ADDRESS.replace("A", "a", 1)]),
+            ("balanceOf(address)", ["0x" + "zz" * 20]),
+            ("balanceOf(address)", [ADDRESS[:-2]]),
+            ("balanceOf(address)", [bytes.fromhex("ab" * 20)]),
+            ("totalSupplyAt(uint256)", [0]),
+            ("totalSupplyAt(uint256)", [callplan.MAX_UINT256]),
+            ("totalSupplyAt(uint256)", [callplan.MAX_UINT256 + 1]),
+            ("totalSupplyAt(uint256)", [-1]),
+            ("totalSupplyAt(uint256)", [True]),
+            ("totalSupplyAt(uint256)", [False]),
+            ("setPaused(bool)", [True]),
+            ("setPaused(bool)", [1]),
+            (
+                "allowance(address,address,uint256)",
+                [ADDRESS, CHECKSUM_ADDRESS, 10 ** 18]
+            ),
+        ]:
+            with self.subTest(signature=signature, args=args):
+                self.assert_matches_eth_abi(signature, args)
+
+    def test_fast_path_rejects(self):
+        for encode, value in [
+            (callplan.encode_uint256, True),
+            (callplan.encode_uint256, 1.0),
+            (callplan.encode_address, CHECKSUM_ADDRESS.replace("A", "a", 1)),
+            (callplan.encode_address, b"\x01" * 20),
+            (callplan.encode_bool, 1),
+        ]:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    encode(value)
+
+    def test_selector(self):
+        self.assertEqual(
+            callplan.call_plan("balanceOf(address)").selector,
+            "0x70a08231"
+        )
+
+    def test_decoders_match_eth_abi(self):
+        value = 123456789 * 10 ** 18
+        data = {"result": "0x" + word(value) + word(ADDRESS) + word(1)}
+        raw = decode_hex(data["result"])
+
+        uint, address, flag = decode_single("(uint256,address,bool)", raw)
+
+        self.assertEqual(callplan.decode_uint(data), uint)
+        self.assertEqual(callplan.scaled_decoder(18)(data), 123456789)
+        self.assertEqual(callplan.scaled_decoder(0, 2)(data), 1)
+        self.assertEqual(
+            callplan.decode_address({"result": "0x" + word(ADDRESS)}),
+            address
+        )
+        self.assertEqual(
+            callplan.decode_bool({"result": "0x" + word(1)}),
+            flag
+        )
+
+
+def etherscan_txs(*blocks):
+    return [
+        {"hash": "0x{:02x}".format(i), "blockNumber": str(block)}
+        for i, block in enumerate(blocks)
+    ]
+
+
+class EtherscanTest(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def mock_txlist(self, txs):
+        """ Answer txlist requests from a list of transactions, like
+        Etherscan capped at PAGE_SIZE results
+        """
+        calls = []
+
+        def request(params, cache=False):
+            calls.append((params["startblock"], params["endblock"], cache))
+            page = [
+                x for x in txs
+                if params["startblock"] <= int(x["blockNumber"])
+                <= params["endblock"]
+            ][:etherscan.PAGE_SIZE]
+            if not page:
+                return {"status": "0", "message": "No transactions found"}
+            return {"status": "1", "message": "OK", "result": page}
+
+        patcher = mock.patch.object(etherscan, "request", request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return calls
+
+    @mock.patch.object(etherscan, "PAGE_SIZE", 3)
+    def test_pages_by_block(self):
+        txs = etherscan_txs(1, 2, 3, 3, 4, 5)
+        calls = self.mock_txlist(txs)
+
+        self.assertEqual(
+            etherscan.get_transaction_pages(ADDRESS, 1, 10),
+            txs
+        )
+        # Block 3 was cut short, so it is asked for again
+        self.assertEqual(
+            [x[0] for x in calls],
+            [1, 3, 4]
+        )
+
+    @mock.patch.object(etherscan, "PAGE_SIZE", 2)
+    def test_full_block_stops(self):
+        txs = etherscan_txs(1, 2, 2, 2)
+        calls = self.mock_txlist(txs)
+
+        self.assertEqual(
+            etherscan.get_transaction_pages(ADDRESS, 1, 10),
+            txs[:3]
+        )
+        self.assertEqual([x[0] for x in calls], [1, 2])
+
+    def test_cache_only_final_blocks(self):
+        calls = self.mock_txlist(etherscan_txs(1, 5, 9))
+
+        self.assertEqual(
+            len(etherscan.get_contract_transactions(ADDRESS, 1, 10, 6)),
+            3
+        )
+        self.assertEqual(calls, [(1, 6, True), (7, 10, False)])
+
+        del calls[:]
+        etherscan.get_contract_transactions(ADDRESS, 1, 4, 6)
+        etherscan.get_contract_transactions(ADDRESS, 1, 4)
+        self.assertEqual(calls, [(1, 4, True), (1, 4, False)])
+
+    def test_error_is_raised(self):
+        with mock.patch.object(etherscan, "request", return_value={
+            "status": "0",
+            "message": "NOTOK",
+            "result": "Max rate limit reached",
+        }):
+            with self.assertRaises(etherscan.EtherscanError):
+                etherscan.get_transaction_pages(ADDRESS, 1, 10)
+            with self.assertRaises(etherscan.EtherscanError):
+                etherscan.get_internal_txs_bt_txhash("0x01")
+
+    def test_rate_file_spaces_requests(self):
+        path = os.path.join(self.dir.name, "etherscan.rate")
+        slots = []
+
+        def reserve():
+            for _ in range(5):
+                slots.append(etherscan.reserve_slot(path, 10))
+
+        threads = [threading.Thread(target=reserve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        slots.sort()
+        self.assertEqual(len(slots), 20)
+        for previous, slot in zip(slots, slots[1:]):
+            self.assertGreaterEqual(slot - previous, 0.1 - 1e-6)
+
+        self.assertIsNone(etherscan.reserve_slot(
+            os.path.join(self.dir.name, "missing", "etherscan.rate"),
+            10
+        ))
+
+    def test_disk_cache(self):
+        responses = [
+            {"status": "0", "message": "NOTOK", "result": "Error"},
+            {"status": "1", "message": "OK", "result": ["tx"]},
+            {"status": "1", "message": "OK", "result": ["other"]},
+        ]
+
+        def get(url, params=None):
+            response = mock.Mock(status_code=200)
+            response.json.return_value = responses.pop(0)
+            return response
+
+        params = {"module": "account", "action": "txlist", "address": "a"}
+
+        with mock.patch.multiple(
+            etherscan,
+            CACHE_DIR=self.dir.name,
+            throttle=mock.DEFAULT,
+        ), mock.patch.object(etherscan.transport, "get", get):
+            # Errors aren't cached
+            self.assertEqual(
+                etherscan.request(params, cache=True)["result"],
+                "Error"
+            )
+            self.assertEqual(
+                etherscan.request(params, cache=True)["result"],
+                ["tx"]
+            )
+            self.assertEqual(
+                etherscan.request(params, cache=True)["result"],
+                ["tx"]
+            )
+            # Only used when asked for
+            self.assertEqual(
+                etherscan.request(params)["result"],
+                ["other"]
+            )
+
+        self.assertEqual(responses, [])
+
+
+def http_response(status, body="", headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode("utf-8")
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeSession:
+    """ Stands in for the pooled requests session, answering with the given
+    responses or raising the given exceptions in order
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class TransportTest(SimpleTestCase):
+    def send(self, responses, **kwargs):
+        """ Send a request through the fake session, returning the response
+        and the retry delays slept
+        """
+        session = FakeSession(responses)
+
+        with mock.patch.object(transport, "get_session", return_value=session):
+            with mock.patch.object(transport.time, "sleep") as sleep:
+                response = transport.send("POST", "http://rpc.test", **kwargs)
+
+        self.assertEqual(session.responses, [])
+        return response, [x.args[0] for x in sleep.call_args_list]
+
+    def test_retries_server_errors(self):
+        response, delays = self.send([
+            requests.ConnectionError("reset"),
+            http_response(503),
+            http_response(200, "{}"),
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(delays), 2)
+        self.assertLessEqual(delays[0], transport.BACKOFF_BASE)
+        self.assertLessEqual(delays[1], transport.BACKOFF_BASE * 2)
+
+    def test_retries_rate_limit_bodies(self):
+        response, delays = self.send([
+            http_response(200, json.dumps({
+                "jsonrpc": "2.0",
+                "id": 0,
+                "error": {"code": -32005, "message": "rate limit exceeded"},
+            })),
+            http_response(200, '{"jsonrpc": "2.0", "id": 0, "result": "0x1"}'),
+        ])
+
+        self.assertEqual(response.json()["result"], "0x1")
+        self.assertEqual(len(delays), 1)
+
+    def test_retry_after(self):
+        _, delays = self.send([
+            http_response(429, headers={"Retry-After": "3"}),
+            http_response(429, headers={"Retry-After": "3600"}),
+            http_response(200, "{}"),
+        ])
+
+        self.assertEqual(delays, [3, transport.BACKOFF_MAX])
+
+    def test_client_errors_are_not_retried(self):
+        response, delays = self.send([http_response(400)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(delays, [])
+
+    def test_gives_up(self):
+        response, delays = self.send(
+            [http_response(502), http_response(502)],
+            max_retries=1
+        )
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(len(delays), 1)
+
+        with self.assertRaises(transport.TransportError):
+            self.send([requests.Timeout("slow")], max_retries=0)
+
+    def test_backoff_delay(self):
+        for attempt in range(10):
+            delay = transport.backoff_delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(
+                transport.BACKOFF_MAX,
+                transport.BACKOFF_BASE * 2 ** attempt
+            ))
+
+        self.assertEqual(transport.backoff_delay(0, "1.5"), 1.5)
+        # A date instead of seconds falls back to backoff
+        self.assertLessEqual(
+            transport.backoff_delay(0, "Wed, 21 Oct 2015 07:28:00 GMT"),
+            transport.BACKOFF_BASE
+        )
+
+    @mock.patch.object(transport, "_in_flight", threading.BoundedSemaphore(2))
+    def test_in_flight_cap(self):
+        lock = threading.Lock()
+        counts = {"in_flight": 0, "max": 0}
+
+        class SlowSession:
+            def request(self, method, url, **kwargs):
+                with lock:
+                    counts["in_flight"] += 1
+                    counts["max"] = max(counts["max"], counts["in_flight"])
+                time.sleep(0.02)
+                with lock:
+                    counts["in_flight"] -= 1
+                return http_response(200, "{}")
+
+        with mock.patch.object(
+            transport,
+            "get_session",
+            return_value=SlowSession()
+        ):
+            threads = [
+                threading.Thread(
+                    target=transport.send,
+                    args=["GET", "http://rpc.test"]
+                )
+                for _ in range(6)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(counts["max"], 2)
+
+
+class CoalesceTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            coalesce,
+            LATEST_TTL=2,
+            _recent=cache.LRU(100),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_concurrently(self, fetch, count=5):
+        """ Make the same request from several threads at once, returning
+        their responses or errors
+        """
+        results = [None] * count
+
+        def request(i):
+            try:
+                results[i] = coalesce.do("eth_blockNumber", [], fetch)
+            except Exception as err:
+                results[i] = err
+
+        threads = [
+            threading.Thread(target=request, args=[i]) for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_concurrent_requests_share_a_response(self):
+        release = threading.Event()
+
+        def slow_fetch():
+            release.wait(1)
+            return {"result": "0x1"}
+
+        fetch = mock.Mock(side_effect=slow_fetch)
+
+        threading.Timer(0.05, release.set).start()
+        results = self.run_concurrently(fetch)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(results, [{"result": "0x1"}] * 5)
+        self.assertEqual(coalesce._in_flight, {})
+
+    def test_errors_are_shared(self):
+        release = threading.Event()
+
+        def fetch():
+            release.wait(1)
+            raise ValueError("failed")
+
+        threading.Timer(0.05, release.set).start()
+        results = self.run_concurrently(fetch)
+
+        self.assertTrue(all(isinstance(x, ValueError) for x in results))
+        self.assertEqual(coalesce._in_flight, {})
+
+    def test_latest_is_reused_briefly(self):
+        params = [{"to": ADDRESS, "data": "0x"}, "latest"]
+        fetch = mock.Mock(return_value={"result": "0x1"})
+
+        with mock.patch.object(coalesce.time, "time", return_value=100):
+            coalesce.do("eth_call", params, fetch)
+            coalesce.do("eth_call", params, fetch)
+        self.assertEqual(fetch.call_count, 1)
+
+        with mock.patch.object(coalesce.time, "time", return_value=103):
+            coalesce.do("eth_call", params, fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_only_successful_latest_responses_are_reused(self):
+        pinned = [{"to": ADDRESS, "data": "0x"}, "0x1"]
+        latest = [{"to": ADDRESS, "data": "0x"}, "latest"]
+        error = {"error": {"code": -32000, "message": "failed"}}
+
+        coalesce.remember("eth_call", pinned, {"result": "0x1"})
+        coalesce.remember("eth_call", latest, error)
+
+        self.assertIsNone(coalesce.recent("eth_call", pinned))
+        self.assertIsNone(coalesce.recent("eth_call", latest))
+
+
+class LogWindowTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            transactions,
+            ensure_block=mock.DEFAULT,
+            LOG_WINDOW_INITIAL=100,
+            LOG_WINDOW_MAX=400,
+            LOG_SPARSE_RESULTS=10,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def download(self, lease, upto, results):
+        """ Run download_leased_logs with results(start, end) giving the log
+        count of a range, returning the (addresses, start, end) requested
+        """
+        ranges = []
+
+        def download_logs(addresses, start_block, end_block):
+            ranges.append((addresses, start_block, end_block))
+            return results(start_block, end_block)
+
+        with mock.patch.object(
+            transactions,
+            "download_logs",
+            side_effect=download_logs
+        ):
+            transactions.download_leased_logs(lease, upto)
+
+        return ranges
+
+    def windows(self, ranges):
+        return [end - start + 1 for _, start, end in ranges]
+
+    def test_sparse_windows_grow(self):
+        lease = FakeLease(ADDRESS, 0)
+        ranges = self.download(lease, 1500, lambda start, end: 0)
+
+        self.assertEqual(
+            self.windows(ranges),
+            [100, 200, 400, 400, 400]
+        )
+        self.assertEqual(ranges[0][1:], (1, 100))
+        self.assertEqual(ranges[-1][2], 1500)
+        self.assertEqual(lease.advanced, [x[2] for x in ranges])
+
+    def test_dense_windows_stay(self):
+        lease = FakeLease(ADDRESS, 0)
+        ranges = self.download(lease, 300, lambda start, end: 10)
+
+        self.assertEqual(self.windows(ranges), [100, 100, 100])
+
+    def test_too_many_results_halves_window(self):
+        def results(start, end):
+            if end - start + 1 > 25:
+                raise TooManyResults("too many")
+            return 5
+
+        lease = FakeLease(ADDRESS, 0)
+        ranges = self.download(lease, 100, results)
+
+        # Refused ranges are retried from the same block and never stored
+        self.assertEqual(self.windows(ranges)[:3], [100, 50, 25])
+        self.assertEqual([x[1] for x in ranges[:3]], [1, 1, 1])
+        self.assertEqual(lease.advanced, [25, 50, 75, 100])
+        # The window does not grow back past the refused size
+        self.assertEqual(self.windows(ranges)[3:], [25, 25, 25])
+
+    def test_ceiling_recovers_after_dense_range(self):
+        def results(start, end):
+            if start <= 50 and end - start + 1 > 50:
+                raise TooManyResults("too many")
+            return 0
+
+        lease = FakeLease(ADDRESS, 0)
+        ranges = self.download(lease, 1000, results)
+
+        self.assertEqual(
+            self.windows(ranges),
+            [100, 50, 100, 200, 400, 250]
+        )
+
+    def test_single_block_with_too_many_results_raises(self):
+        def results(start, end):
+            raise TooManyResults("too many")
+
+        lease = FakeLease(ADDRESS, 0)
+
+        with self.assertRaises(TooManyResults):
+            self.download(lease, 100, results)
+
+        self.assertEqual(lease.advanced, [])
+
+    def test_only_contracts_behind_are_requested(self):
+        lease = FakeLease(ADDRESS, 0)
+        lease.pointers[OTHER] = mock.Mock(last_block=150)
+        ranges = self.download(lease, 300, lambda start, end: 10)
+
+        self.assertEqual(
+            [(x[0], x[1], x[2]) for x in ranges],
+            [
+                ([ADDRESS], 1, 100),
+                ([ADDRESS, OTHER], 101, 200),
+                ([ADDRESS, OTHER], 201, 300),
+            ]
+        )
+
+    @mock.patch.object(reorgs, "CONFIRMATIONS", 150)
+    def test_recent_blocks_are_stored(self):
+        lease = FakeLease(ADDRESS, 0)
+        self.download(lease, 300, lambda start, end: 10)
+
+        # Only pointer blocks within reach of a reorg keep their hash
+        stored = [x[0][0] for x in transactions.ensure_block.call_args_list]
+        self.assertEqual(stored, [200, 300])
+
+
+def raw_log(log_index, block_number=1, tx_hash=TX_HASH, **kwargs):
+    """ An eth_getLogs result of an OUSD transfer of 2 OUSD """
+    log = {
+        "address": OUSD,
+        "blockNumber": hex(block_number),
+        "transactionHash": tx_hash,
+        "transactionIndex": "0x0",
+        "logIndex": hex(log_index),
+        "topics": [
+            sigs.TRANSFER,
+            "0x" + word(ADDRESS),
+            "0x" + word(OTHER),
+        ],
+        "data": "0x" + word(2 * 10 ** 18),
+        "removed": False,
+    }
+    log.update(kwargs)
+    return log
+
+
+class StoreLogsTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(
+            transactions,
+            "ensure_blocks",
+            side_effect=self.ensure_blocks
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ensure_blocks(self, block_numbers):
+        return {
+            x: Block.objects.get_or_create(
+                block_number=x,
+                defaults={"block_time": timezone.now()}
+            )[0]
+            for x in block_numbers
+        }
+
+    def test_stores_records_from_logs(self):
+        other_tx = "0x" + word(2)
+        transactions.store_logs([
+            raw_log(0),
+            raw_log(1),
+            raw_log(0, block_number=2, tx_hash=other_tx),
+        ])
+
+        self.assertEqual(Log.objects.count(), 3)
+        log = Log.objects.get(block_number=1, log_index=1)
+        self.assertEqual(log.event_name, "Transfer")
+        self.assertEqual(log.transaction_hash, TX_HASH)
+
+        transfers = OusdTransfer.objects.order_by("tx_hash", "log_index")
+        self.assertEqual(
+            [(x.tx_hash_id, x.from_address, x.to_address, x.amount)
+             for x in transfers],
+            [
+                (TX_HASH, ADDRESS, OTHER, 2),
+                (TX_HASH, ADDRESS, OTHER, 2),
+                (other_tx, ADDRESS, OTHER, 2),
+            ]
+        )
+
+        # One unenriched transaction per hash, left for enrich_transactions
+        stubs = Transaction.objects.order_by("tx_hash")
+        self.assertEqual(
+            [(x.tx_hash, x.block_number, x.enriched) for x in stubs],
+            [(TX_HASH, 1, False), (other_tx, 2, False)]
+        )
+
+    def test_enriched_transactions_are_kept(self):
+        block = self.ensure_blocks([1])[1]
+        Transaction.objects.create(
+            tx_hash=TX_HASH,
+            block_number=1,
+            block_time=block.block_time,
+            notes="",
+            receipt_data={"logs": []},
+        )
+
+        transactions.store_logs([raw_log(0)])
+
+        tx = Transaction.objects.get()
+        self.assertTrue(tx.enriched)
+        self.assertEqual(tx.receipt_data, {"logs": []})
+        self.assertEqual(Log.objects.count(), 1)
+
+    def test_storing_again_is_idempotent(self):
+        transactions.store_logs([raw_log(0)])
+        transactions.store_logs([raw_log(0)])
+
+        self.assertEqual(Log.objects.count(), 1)
+        self.assertEqual(OusdTransfer.objects.count(), 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_removed_logs_are_skipped(self):
+        transactions.store_logs([raw_log(0, removed=True)])
+
+        transactions.ensure_blocks.assert_not_called()
+        self.assertFalse(Log.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+
+    @mock.patch.object(transactions, "ensure_transaction_and_downsteam_hashes")
+    @mock.patch.object(transactions, "get_logs")
+    def test_download_logs_stores_logs_first(self, get_logs, ensure):
+        get_logs.return_value = [raw_log(0), raw_log(1)]
+
+        with self.settings(LOG_FIRST_HARVEST=True):
+            count = transactions.download_logs([OUSD], 1, 10)
+
+        self.assertEqual(count, 2)
+        ensure.assert_not_called()
+        self.assertEqual(Log.objects.count(), 2)
+
+        with self.settings(LOG_FIRST_HARVEST=False):
+            transactions.download_logs([OUSD], 1, 10)
+
+        ensure.assert_called_once_with([TX_HASH])
+
+    @mock.patch.object(transactions, "executor")
+    def test_enrich_transactions(self, executor):
+        transactions.store_logs([
+            raw_log(0, block_number=2),
+            raw_log(0, tx_hash="0x" + word(2)),
+        ])
+        failure = mock.Mock(item=["0x" + word(2)])
+        executor.run.return_value = [failure]
+
+        self.assertEqual(transactions.enrich_transactions(), 1)
+
+        # Oldest first, in batches of transaction hashes
+        batches = list(executor.run.call_args[0][1])
+        self.assertEqual(batches, [["0x" + word(2), TX_HASH]])
+
+
+def reject_odd(item):
+    """ Executor task failing for odd items """
+    if item % 2:
+        raise ValueError("odd {}".format(item))
+
+
+class ExecutorTest(SimpleTestCase):
+    def test_failures_are_returned(self):
+        done = []
+
+        def task(item):
+            done.append(item)
+            reject_odd(item)
+
+        failures = executor.run(task, range(5), workers=1)
+
+        # A failing item doesn't stop the ones after it
+        self.assertEqual(done, [0, 1, 2, 3, 4])
+        self.assertEqual(failures, [
+            executor.Failure(1, "ValueError: odd 1"),
+            executor.Failure(3, "ValueError: odd 3"),
+        ])
+
+    def test_pool(self):
+        failures = executor.run(reject_odd, range(20), workers=3, chunk_size=4)
+
+        self.assertEqual(
+            sorted(failures),
+            [executor.Failure(x, "ValueError: odd {}".format(x))
+             for x in range(1, 20, 2)]
+        )
+
+    @mock.patch.object(executor, "Pool")
+    def test_workers_are_bounded_by_items(self, pool):
+        self.assertEqual(executor.run(reject_odd, [], workers=4), [])
+        self.assertEqual(executor.run(reject_odd, [2], workers=4), [])
+
+        pool.assert_not_called()
+
+        imap = pool.return_value.__enter__.return_value.imap_unordered
+        imap.return_value = [(1, None), (3, "ValueError: odd 3")]
+        failures = executor.run(reject_odd, [1, 3], workers=4, chunk_size=5)
+
+        pool.assert_called_once_with(2)
+        self.assertEqual(imap.call_args[0][2], 5)
+        self.assertEqual(failures, [executor.Failure(3, "ValueError: odd 3")])
+
+    @mock.patch.object(executor, "logger")
+    def test_progress(self, logger):
+        with mock.patch.object(executor, "PROGRESS_INTERVAL", 3600):
+            executor.run(reject_odd, range(4), workers=1, label="odd")
+
+        # Reported once, when everything is done
+        logger.info.assert_called_once()
+        self.assertTrue(
+            logger.info.call_args[0][0].startswith("odd: 4/4 done (2 failed)")
+        )
+
+        logger.reset_mock()
+        with mock.patch.object(executor, "PROGRESS_INTERVAL", 0):
+            executor.run(reject_odd, range(4), workers=1)
+
+        self.assertEqual(logger.info.call_count, 4)
+        self.assertTrue(
+            logger.info.call_args_list[0][0][0].startswith("reject_odd: 1/4")
+        )
+
+
+def serially(fn, args):
+    """ fetch_concurrently without the threads """
+    return [fn(*x) for x in args]
+
+
+class TraceQueueTest(TestCase):
+    def setUp(self):
+        patchers = [
+            mock.patch.object(store, "memory", cache.LRU(100)),
+            mock.patch.object(traces, "connection"),
+            mock.patch.object(traces, "fetch_concurrently", serially),
+            mock.patch.object(
+                traces,
+                "debug_trace_transaction",
+                return_value={"result": {"calls": []}}
+            ),
+            mock.patch.object(
+                traces,
+                "get_internal_txs_bt_txhash",
+                return_value=[{"value": "1"}]
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def transaction(self, tx_hash=TX_HASH, age=timedelta(days=1)):
+        return Transaction.objects.create(
+            tx_hash=tx_hash,
+            block_number=1,
+            block_time=timezone.now() - age,
+            notes="",
+        )
+
+    def test_enqueue(self):
+        traces.enqueue([TX_HASH])
+        request = TraceRequest.objects.get()
+        request.attempts = 2
+        request.save()
+
+        # Queueing again keeps the request as it is
+        traces.enqueue([TX_HASH, "0x" + word(2)])
+
+        self.assertEqual(TraceRequest.objects.count(), 2)
+        self.assertEqual(TraceRequest.objects.get(tx_hash=TX_HASH).attempts, 2)
+
+    def test_claim(self):
+        now = timezone.now()
+        for i, delay in enumerate([-2, -1, 60]):
+            TraceRequest.objects.create(
+                tx_hash="0x" + word(i),
+                available_at=now + timedelta(seconds=delay)
+            )
+
+        claimed = traces.claim(10)
+
+        # Due requests, oldest first, hidden from the next claim
+        self.assertEqual(
+            [x.tx_hash for x in claimed],
+            ["0x" + word(0), "0x" + word(1)]
+        )
+        self.assertEqual(traces.claim(10), [])
+        self.assertGreater(
+            TraceRequest.objects.get(tx_hash="0x" + word(0)).available_at,
+            now + traces.LEASE - timedelta(minutes=1)
+        )
+
+    def test_process_request(self):
+        self.transaction()
+        traces.enqueue([TX_HASH])
+
+        self.assertTrue(traces.process_request(traces.claim(1)[0], None))
+
+        tx = Transaction.objects.get()
+        self.assertEqual(tx.debug_data, {"result": {"calls": []}})
+        self.assertEqual(tx.internal_transactions, [{"value": "1"}])
+        self.assertFalse(TraceRequest.objects.exists())
+
+    @mock.patch.object(traces, "trace_bucket")
+    def test_only_trace_requests_are_rate_limited(self, bucket):
+        traces.get_trace(TX_HASH)
+        store.put(store.TRACE, "0x" + word(2), {"result": {}})
+        traces.get_trace("0x" + word(2))
+
+        bucket.acquire.assert_called_once_with()
+
+    def test_failed_request_backs_off(self):
+        self.transaction()
+        traces.enqueue([TX_HASH])
+        traces.debug_trace_transaction.side_effect = ValueError("down")
+
+        for attempts in [1, 2]:
+            request = TraceRequest.objects.get()
+            self.assertFalse(traces.process_request(request, None))
+
+            request = TraceRequest.objects.get()
+            self.assertEqual(request.attempts, attempts)
+            self.assertEqual(request.last_error, "ValueError: down")
+            delay = request.available_at - timezone.now()
+            self.assertAlmostEqual(
+                delay.total_seconds(),
+                30 * 2 ** attempts,
+                delta=5
+            )
+
+        self.assertEqual(Transaction.objects.get().debug_data, {})
+
+    def test_waits_for_etherscan_to_index(self):
+        tx = self.transaction(age=timedelta(minutes=1))
+        traces.enqueue([TX_HASH])
+        traces.get_internal_txs_bt_txhash.return_value = []
+
+        self.assertFalse(
+            traces.process_request(TraceRequest.objects.get(), None)
+        )
+
+        # The trace is stored, internal transactions are retried once
+        # Etherscan has had time to index the block
+        request = TraceRequest.objects.get()
+        self.assertEqual(
+            request.available_at,
+            tx.block_time + traces.ETHERSCAN_INDEX_DELAY
+        )
+        tx = Transaction.objects.get()
+        self.assertEqual(tx.debug_data, {"result": {"calls": []}})
+        self.assertEqual(tx.internal_transactions, {})
+
+    def test_process_queue(self):
+        for i in range(5):
+            self.transaction("0x" + word(i))
+        traces.enqueue(["0x" + word(i) for i in range(5)])
+
+        with mock.patch.object(
+            traces,
+            "process_request",
+            return_value=True
+        ) as process_request:
+            self.assertEqual(traces.process_queue(limit=3, concurrency=2), 3)
+            self.assertEqual(process_request.call_count, 3)
+
+            self.assertEqual(traces.process_queue(concurrency=2), 2)
+            self.assertEqual(process_request.call_count, 5)
+
+    def test_ensure_traced(self):
+        tx = self.transaction()
+        traces.enqueue([TX_HASH])
+
+        traces.debug_trace_transaction.side_effect = ValueError("down")
+        traces.ensure_traced(tx)
+
+        # Failures leave the transaction and its request as they were
+        self.assertEqual(Transaction.objects.get().debug_data, {})
+        self.assertTrue(TraceRequest.objects.exists())
+
+        traces.debug_trace_transaction.side_effect = None
+        traces.ensure_traced(tx)
+
+        self.assertEqual(
+            Transaction.objects.get().debug_data,
+            {"result": {"calls": []}}
+        )
+        self.assertFalse(TraceRequest.objects.exists())
+
+        # Complete transactions aren't fetched again
+        traces.ensure_traced(tx)
+        self.assertEqual(traces.debug_trace_transaction.call_count, 2)
+
+    def test_backfill_internal_transactions(self):
+        self.transaction("0x" + word(1))
+        self.transaction("0x" + word(2), age=timedelta(minutes=1))
+        self.transaction("0x" + word(3))
+
+        def internal_transactions(tx_hash):
+            if tx_hash == "0x" + word(3):
+                raise ValueError("down")
+            return []
+
+        traces.get_internal_txs_bt_txhash.side_effect = internal_transactions
+
+        self.assertEqual(
+            traces.backfill_internal_transactions(batch_size=2),
+            1
+        )
+
+        # Recent empty lists and failures are left for the next run
+        self.assertEqual(
+            dict(Transaction.objects.values_list(
+                "tx_hash",
+                "internal_transactions"
+            )),
+            {"0x" + word(1): [], "0x" + word(2): {}, "0x" + word(3): {}}
+        )
+
+
+def raw_block(block_number, timestamp=1600000000, parent=None):
+    return {
+        "number": hex(block_number),
+        "timestamp": hex(timestamp),
+        "hash": block_hash(block_number),
+        "parentHash": parent or block_hash(block_number - 1),
+    }
+
+
+class EnsureBlocksTest(TestCase):
+    def setUp(self):
+        patchers = [
+            mock.patch.object(blocks, "cache", cache.LRU(100)),
+            mock.patch.object(store, "memory", cache.LRU(100)),
+            mock.patch.multiple(
+                cache,
+                _generation=None,
+                _generation_checked=None,
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.provider = FakeProvider(
+            lambda method, params: {"result": raw_block(int(params[0], 16))}
+        )
+
+    def requested(self):
+        """ Block numbers requested from the provider, per request """
+        return [
+            sorted(int(x["params"][0], 16) for x in payload)
+            if isinstance(payload, list) else [int(payload["params"][0], 16)]
+            for payload in self.provider.payloads
+        ]
+
+    def test_fetches_missing_blocks_in_one_batch(self):
+        with self.provider.patch():
+            found = blocks.ensure_blocks([5, 3, 4, 3])
+
+        self.assertEqual(sorted(found), [3, 4, 5])
+        self.assertEqual(self.requested(), [[3, 4, 5]])
+        self.assertEqual(found[4].block_hash, block_hash(4))
+        self.assertEqual(found[4].parent_hash, block_hash(3))
+        self.assertEqual(found[4].block_time.timestamp(), 1600000000)
+        self.assertEqual(
+            sorted(Block.objects.values_list("block_number", flat=True)),
+            [3, 4, 5]
+        )
+        self.assertEqual(store.get(store.BLOCK, 4), raw_block(4))
+
+        # Served from memory afterwards
+        with self.provider.patch(), self.assertNumQueries(0):
+            self.assertEqual(blocks.ensure_blocks([3, 5])[5], found[5])
+        self.assertEqual(len(self.provider.payloads), 1)
+
+    def test_uses_stored_blocks(self):
+        Block.objects.create(block_number=1, block_time=timezone.now())
+        store.put(store.BLOCK, 2, raw_block(2))
+        blocks.cache.set(3, Block(block_number=3, block_time=timezone.now()))
+
+        with self.provider.patch():
+            found = blocks.ensure_blocks([1, 2, 3, 4])
+
+        self.assertEqual(sorted(found), [1, 2, 3, 4])
+        self.assertEqual(self.requested(), [[4]])
+        self.assertEqual(found[2].block_hash, block_hash(2))
+
+    def test_given_raw_blocks_are_not_fetched(self):
+        with self.provider.patch():
+            block = blocks.ensure_block(7, raw_block(7, timestamp=1))
+
+        self.assertEqual(block.block_time.timestamp(), 1)
+        self.assertEqual(self.provider.payloads, [])
+        self.assertTrue(Block.objects.filter(block_number=7).exists())
+
+    def test_missing_block(self):
+        def handler(method, params):
+            if params[0] == hex(9):
+                return {"result": None}
+            return {"result": raw_block(int(params[0], 16))}
+
+        provider = FakeProvider(handler)
+
+        with provider.patch():
+            with self.assertRaisesRegex(ValueError, "Block 9 not found"):
+                blocks.ensure_blocks([8, 9])
+
+        self.assertFalse(Block.objects.exists())
+
+    def test_concurrent_insert(self):
+        fetch_raw_blocks = blocks.fetch_raw_blocks
+
+        def insert_first(block_numbers):
+            # Another worker stores one of the blocks in the meantime
+            Block.objects.create(
+                block_number=2,
+                block_time=timezone.now(),
+                block_hash=block_hash(2),
+            )
+            return fetch_raw_blocks(block_numbers)
+
+        with self.provider.patch(), mock.patch.object(
+            blocks,
+            "fetch_raw_blocks",
+            side_effect=insert_first
+        ):
+            found = blocks.ensure_blocks([1, 2])
+
+        self.assertEqual(sorted(found), [1, 2])
+        self.assertEqual(Block.objects.count(), 2)
+
+    @mock.patch.object(blocks, "logger")
+    def test_warns_about_unexpected_parents(self, logger):
+        Block.objects.create(
+            block_number=10,
+            block_time=timezone.now(),
+            block_hash=block_hash(10, "a"),
+        )
+
+        with self.provider.patch():
+            blocks.ensure_blocks([11])
+
+        logger.warning.assert_called_once()
+        self.assertIn("Block 11 has parent", logger.warning.call_args[0][0])
+
+    def test_rollback_clears_cache(self):
+        with self.provider.patch():
+            blocks.ensure_blocks([1])
+        Block.objects.all().delete()
+        Rollback.objects.create(fork_block=1)
+        cache._generation_checked = None
+
+        with self.provider.patch():
+            blocks.ensure_blocks([1])
+
+        # Stored again from the chain object store
+        self.assertTrue(Block.objects.filter(block_number=1).exists())
+        self.assertEqual(self.requested(), [[1]])
+
+
+class FollowerTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            follower,
+            latest_block=mock.DEFAULT,
+            refresh_transactions=mock.DEFAULT,
+            snap=mock.DEFAULT,
+            run_all=mock.DEFAULT,
+            enrich=mock.DEFAULT,
+            fetch_traces=mock.DEFAULT,
+            CONFIRMATIONS=2,
+        )
+        self.patched = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.patched["latest_block"].return_value = 102
+        self.patched["enrich"].return_value = 0
+        self.patched["fetch_traces"].return_value = 0
+        self.clock = 1000
+
+        patcher = mock.patch.object(
+            follower.time,
+            "time",
+            side_effect=lambda: self.clock
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cursors(self):
+        return dict(
+            FollowerCursor.objects.values_list("stage", "block_number")
+        )
+
+    def test_stages_follow_the_chain(self):
+        chain = follower.Follower()
+
+        self.assertTrue(chain.step())
+
+        self.patched["refresh_transactions"].assert_called_once_with(100)
+        self.patched["snap"].assert_called_once_with(100)
+        self.patched["run_all"].assert_called_once_with()
+        self.assertEqual(
+            self.cursors(),
+            {"ingest": 100, "snapshot": 100, "notify": 100}
+        )
+
+        # Nothing to do until a new block arrives
+        self.assertFalse(chain.step())
+        self.patched["refresh_transactions"].assert_called_once_with(100)
+
+        # Blocks that arrived in the meantime are handled in one go
+        self.patched["latest_block"].return_value = 110
+        self.assertTrue(chain.step())
+        self.patched["refresh_transactions"].assert_called_with(108)
+
+    def test_restart_carries_on_from_cursors(self):
+        follower.Follower().step()
+        self.assertFalse(follower.Follower().step())
+
+        self.assertEqual(self.patched["refresh_transactions"].call_count, 1)
+
+    def test_failed_stage_backs_off(self):
+        ingest = self.patched["refresh_transactions"]
+        ingest.side_effect = ValueError("down")
+        chain = follower.Follower()
+
+        chain.step()
+
+        # Later stages don't run past blocks the failed stage hasn't done
+        self.patched["snap"].assert_not_called()
+        self.assertEqual(self.cursors()["ingest"], 0)
+
+        self.clock += 1
+        chain.step()
+        self.assertEqual(ingest.call_count, 1)
+
+        self.clock += 1
+        chain.step()
+        self.assertEqual(ingest.call_count, 2)
+        self.assertEqual(chain.stages[0].retry_at, self.clock + 4)
+
+        ingest.side_effect = None
+        self.clock += 4
+        chain.step()
+
+        self.assertEqual(chain.stages[0].failures, 0)
+        self.patched["snap"].assert_called_once_with(100)
+
+    def test_failed_stage_does_not_hold_up_earlier_ones(self):
+        self.patched["snap"].side_effect = ValueError("down")
+        chain = follower.Follower()
+
+        chain.step()
+        self.patched["latest_block"].return_value = 105
+        chain.step()
+
+        self.assertEqual(self.cursors()["ingest"], 103)
+        self.assertEqual(self.cursors()["snapshot"], 0)
+        self.patched["run_all"].assert_not_called()
+
+    @mock.patch.object(follower, "SNAPSHOT_INTERVAL", 5)
+    def test_snapshot_interval(self):
+        chain = follower.Follower()
+        chain.step()
+
+        for head in range(103, 108):
+            self.patched["latest_block"].return_value = head
+            chain.step()
+
+        self.assertEqual(
+            [x[0][0] for x in self.patched["snap"].call_args_list],
+            [100, 105]
+        )
+
+    def test_rollback_while_running(self):
+        FollowerCursor.objects.create(stage="ingest", block_number=90)
+
+        def rollback(target):
+            FollowerCursor.objects.filter(stage="ingest").update(
+                block_number=80
+            )
+
+        self.patched["refresh_transactions"].side_effect = rollback
+        chain = follower.Follower()
+        chain.step()
+
+        # The rolled back blocks are done again on the next step
+        self.assertEqual(self.cursors()["ingest"], 80)
+        self.patched["snap"].assert_called_once_with(80)
+
+    def test_idle_work(self):
+        chain = follower.Follower()
+        chain.step()
+
+        with self.settings(LOG_FIRST_HARVEST=True, DEFER_TRACES=True):
+            self.patched["enrich"].return_value = 5
+            self.assertTrue(chain.step())
+            self.patched["fetch_traces"].assert_not_called()
+
+            self.patched["enrich"].return_value = 0
+            self.patched["fetch_traces"].return_value = 3
+            self.assertTrue(chain.step())
+
+            self.patched["fetch_traces"].return_value = 0
+            self.assertFalse(chain.step())
+
+            # Not while there are new blocks
+            self.patched["latest_block"].return_value = 103
+            self.assertTrue(chain.step())
+
+        self.assertEqual(
+            self.patched["enrich"].call_args_list,
+            [mock.call(follower.ENRICH_BATCH)] * 3
+        )
+        self.assertEqual(self.patched["fetch_traces"].call_count, 2)
+
+        with self.settings(LOG_FIRST_HARVEST=False, DEFER_TRACES=False):
+            self.assertFalse(chain.step())
+        self.assertEqual(self.patched["enrich"].call_count, 3)
+
+    @mock.patch.object(follower, "signal")
+    def test_stop(self, signal):
+        chain = follower.Follower()
+        steps = []
+
+        def step():
+            steps.append(len(steps))
+            if len(steps) == 1:
+                raise ValueError("down")
+            if len(steps) == 2:
+                return True
+            chain.stop()
+            return False
+
+        with mock.patch.object(chain, "step", side_effect=step), \
+                mock.patch.object(chain.stopping, "wait") as wait:
+            chain.run()
+
+        signal.signal.assert_any_call(signal.SIGTERM, chain.stop)
+        signal.signal.assert_any_call(signal.SIGINT, chain.stop)
+        # A failed check waits for the next poll, like an idle one
+        self.assertEqual(steps, [0, 1, 2])
+        self.assertEqual(wait.call_count, 2)
+
+    def test_stop_skips_remaining_stages(self):
+        chain = follower.Follower()
+        self.patched["refresh_transactions"].side_effect = (
+            lambda target: chain.stop()
+        )
+
+        chain.step()
+
+        self.assertEqual(self.cursors()["ingest"], 100)
+        self.patched["snap"].assert_not_called()
@@ -0,0 +1,263 @@
+""" Shared HTTP transport for RPC providers and third-party APIs
+
+All outgoing HTTP requests go through a single pooled keep-alive session with
+connect/read timeouts, a cap on concurrent in-flight requests and jittered
+exponential backoff retries for rate limits and server errors.
+
+Configuration (environment variables):
+
+ - HTTP_CONNECT_TIMEOUT - Seconds to wait for a connection (default: 5)
+ - HTTP_READ_TIMEOUT - Seconds to wait for a response (default: 30)
+ - HTTP_MAX_RETRIES - Retries after the first attempt (default: 5)
+ - HTTP_BACKOFF_BASE - Seconds for the first retry delay (default: 0.5)
+ - HTTP_BACKOFF_MAX - Max seconds for any retry delay (default: 30)
+ - HTTP_MAX_IN_FLIGHT - Max concurrent requests per process (default: 16)
+"""
+import os
+import time
+import random
+import threading
+import requests
+from json.decoder import JSONDecodeError
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+from core import cassette
+from core.logging import get_logger
+
+log = get_logger(__name__)
+
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30))
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 5))
+BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", 30))
+MAX_IN_FLIGHT = int(os.environ.get("HTTP_MAX_IN_FLIGHT", 16))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# JSON-RPC error codes providers use for rate limiting
+RATE_LIMIT_ERROR_CODES = (-32005, -32029, 429)
+RATE_LIMIT_MESSAGES = ("rate limit", "too many requests", "limit exceeded")
+
+# Errors for requests that match too much data (some providers use rate limit
+# error codes for these too)
+RESULT_LIMIT_MESSAGES = (
+    "query returned more than",
+    "response size exceeded",
+    "response size should not greater",
+    "block range is too wide",
+    "limit the query to",
+)
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+
+class TransportError(Exception):
+    """ A request failed after exhausting all retries """
+    pass
+
+
+def get_session():
+    """ Get the process-wide pooled session.  A new session is created after a
+    fork so processes never share sockets.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+
+    with _lock:
+        if _session is None or _session_pid != pid:
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=MAX_IN_FLIGHT,
+                pool_maxsize=MAX_IN_FLIGHT,
+            )
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session_pid = pid
+
+    return _session
+
+
+def host(url):
+    """ Host of a URL, for logging without leaking API keys """
+    return urlparse(url).netloc
+
+
+def is_rate_limited(data):
+    """ Check if a decoded JSON body is a rate limit error.  Handles JSON-RPC
+    error objects, batch responses and Etherscan's `result` messages.
+    """
+    if isinstance(data, list):
+        return any(is_rate_limited(x) for x in data)
+
+    if not isinstance(data, dict):
+        return False
+
+    error = data.get("error")
+
+    if isinstance(error, dict):
+        if is_result_limit(data):
+            return False
+        if error.get("code") in RATE_LIMIT_ERROR_CODES:
+            return True
+        message = str(error.get("message", "")).lower()
+        return any(x in message for x in RATE_LIMIT_MESSAGES)
+
+    result = data.get("result")
+
+    if data.get("status") == "0" and isinstance(result, str):
+        return any(x in result.lower() for x in RATE_LIMIT_MESSAGES)
+
+    return False
+
+
+def is_result_limit(data):
+    """ Check if a decoded JSON-RPC response is an error for matching too
+    much data
+    """
+    error = data.get("error") if isinstance(data, dict) else None
+
+    if not isinstance(error, dict):
+        return False
+
+    message = str(error.get("message", "")).lower()
+    return any(x in message for x in RESULT_LIMIT_MESSAGES)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """ Seconds to wait before the given retry attempt (full jitter) """
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def should_retry(response):
+    """ Check if a response is worth retrying """
+    if response.status_code in RETRY_STATUS_CODES:
+        return True
+
+    # Rate limit errors are tiny, don't bother decoding large payloads
+    if response.status_code != 200 or len(response.content) > 4096:
+        return False
+
+    try:
+        return is_rate_limited(response.json())
+    except (JSONDecodeError, ValueError):
+        return False
+
+
+def send(method, url, max_retries=None, **kwargs):
+    """ Send an HTTP request, retrying on connection errors, timeouts, rate
+    limits and server errors.  Returns the final requests.Response.
+    """
+    if max_retries is None:
+        max_retries = MAX_RETRIES
+
+    if cassette.MODE == cassette.REPLAY:
+        return replay(method, url, **kwargs)
+
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+
+    attempt = 0
+
+    while True:
+        response = None
+        error = None
+
+        with _in_flight:
+            try:
+                response = get_session().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                error = err
+
+        if response is not None and not should_retry(response):
+            return maybe_record(method, url, response, **kwargs)
+
+        if attempt >= max_retries:
+            if response is not None:
+                log.error("Giving up on {} {} after {} retries ({})".format(
+                    method,
+                    host(url),
+                    attempt,
+                    response.status_code,
+                ))
+                return maybe_record(method, url, response, **kwargs)
+            raise TransportError(
+                "{} {} failed after {} retries: {}".format(
+                    method,
+                    host(url),
+                    attempt,
+                    error,
+                )
+            )
+
+        delay = backoff_delay(
+            attempt,
+            response.headers.get("Retry-After") if response is not None
+            else None
+        )
+
+        log.warning("Retrying {} {} in {:.2f}s ({})".format(
+            method,
+            host(url),
+            delay,
+            error if error is not None else response.status_code,
+        ))
+
+        time.sleep(delay)
+        attempt += 1
+
+
+def maybe_record(method, url, response, **kwargs):
+    """ Record a response to the cassette when recording """
+    if cassette.MODE == cassette.RECORD:
+        cassette.record(
+            cassette.request_key(
+                method,
+                url,
+                kwargs.get("params"),
+                kwargs.get("json"),
+            ),
+            response.status_code,
+            response.text,
+        )
+
+    return response
+
+
+def replay(method, url, **kwargs):
+    """ Build a response from the cassette """
+    status, body = cassette.replay(cassette.request_key(
+        method,
+        url,
+        kwargs.get("params"),
+        kwargs.get("json"),
+    ))
+
+    if cassette.LATENCY:
+        time.sleep(cassette.LATENCY)
+
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+
+    return response
+
+
+def get(url, **kwargs):
+    return send("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return send("POST", url, **kwargs)
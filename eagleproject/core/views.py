@@ -22,7 +22,13 @@ from core.blockchain.const import (
     report_stats,
     curve_report_stats
 )
-from core.blockchain.harvest import reload_all, refresh_transactions, snap
+from core.blockchain.harvest import (
+    fetch_traces,
+    reload_all,
+    refresh_transactions,
+    snap,
+)
+from core.blockchain.harvest.traces import ensure_traced
 from core.blockchain.harvest.snapshots import (
     ensure_asset,
     ensure_supply_snapshot,
@@ -36,7 +42,6 @@ from core.blockchain.apy import (
     to_apy
 )
 from core.blockchain.harvest.transactions import (
-    get_internal_transactions,
     ensure_transaction_and_downstream
 )
 from core.blockchain.harvest.transaction_history import (
@@ -55,10 +60,11 @@ from core.blockchain.rpc import (
     totalSupply,
 )
 
+from core import metrics
 from core.coingecko import get_price
 from core.common import dict_append
 from core.logging import get_logger
-from core.models import Log, SupplySnapshot, OgnStaked, OusdTransfer, AnalyticsReport, Transaction
+from core.models import Log, SupplySnapshot, OgnStaked, OusdTransfer, AnalyticsReport
 from django.conf import settings
 import json
 
@@ -134,7 +140,17 @@ def dashboard(request):
     return _cache(20, render(request, "dashboard.html", locals()))
 
 
+def metrics_export(request):
+    return HttpResponse(
+        metrics.render(),
+        content_type="text/plain; version=0.0.4"
+    )
+
+
 def reload(request):
+    if settings.CHAIN_FOLLOWER:
+        # Done by the follow_chain command
+        return HttpResponse("ok")
     latest = latest_block()
     reload_all(latest - 2)
     return HttpResponse("ok")
@@ -179,16 +195,30 @@ def make_specific_week_report(request, week):
 
 
 def take_snapshot(request):
+    if settings.CHAIN_FOLLOWER:
+        # Done by the follow_chain command
+        return HttpResponse("ok")
     latest = latest_block()
     snap(latest - 2)
     return HttpResponse("ok")
 
 
 def fetch_transactions(request):
+    if settings.CHAIN_FOLLOWER:
+        # Done by the follow_chain command
+        return HttpResponse("ok")
     latest = latest_block()
     refresh_transactions(latest - 2)
     return HttpResponse("ok")
 
+def fetch_transaction_traces(request):
+    if settings.CHAIN_FOLLOWER:
+        # Done by the follow_chain command
+        return HttpResponse("ok")
+    limit = request.GET.get("limit")
+    fetch_traces(int(limit) if limit else None)
+    return HttpResponse("ok")
+
 def apr_index(request):
     latest_block_number = latest_snapshot_block_number()
     rows = _daily_rows(30, latest_block_number)
@@ -519,21 +549,8 @@ def reports(request):
 
     return render(request, "analytics_reports.html", locals())
     
-def backfill_internal_transactions(request):
-    transactions = Transaction.objects.filter(internal_transactions={})[:6000]
-    total = len(transactions)
-    print("All transactions:", total)
-    count = 0
-    for transaction in transactions:
-        count += 1
-        print("DOING THIS TRANSACTION {} on {} and {} to go".format(transaction.tx_hash, count, total - count))
-        transaction.internal_transactions = get_internal_transactions(transaction.tx_hash)
-        transaction.save()
-
-    return HttpResponse("ok")
-
 def tx_debug(request, tx_hash):
-    transaction = ensure_transaction_and_downstream(tx_hash)
+    transaction = ensure_traced(ensure_transaction_and_downstream(tx_hash))
     logs = Log.objects.filter(transaction_hash=tx_hash)
     return _cache(1200, render(request, "debug_tx.html", locals()))
 
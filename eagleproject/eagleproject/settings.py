@@ -67,6 +67,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.metrics_middleware",
 ]
 
 ROOT_URLCONF = "eagleproject.urls"
@@ -188,6 +189,20 @@ EMAIL_PORT = os.environ.get("EMAIL_PORT", 25)
 EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS") == "true"
 ENABLE_REPORTS = os.environ.get("ENABLE_REPORTS") == "true"
 
+# Harvest logs and transactions with the concurrent asyncio client
+ASYNC_HARVEST = os.environ.get("ASYNC_HARVEST") == "true"
+
+# Store records straight from logs and fetch full transactions afterwards,
+# from the chain follower or the enrich_transactions command
+LOG_FIRST_HARVEST = os.environ.get("LOG_FIRST_HARVEST") == "true"
+
+# Queue traces and internal transactions instead of fetching them on ingest
+DEFER_TRACES = os.environ.get("DEFER_TRACES") == "true"
+
+# Harvesting is done by the follow_chain command, not the /reload, /fetch,
+# /snap and /runtriggers URLs
+CHAIN_FOLLOWER = os.environ.get("CHAIN_FOLLOWER") == "true"
+
 ADMINS = [("Engineering", "engineering@originprotocol.com")]
 DISCORD_BOT_NAME = os.environ.get("DISCORD_BOT_NAME", "OUSD Analytics Bot")
 DISCORD_WEBHOOK_URL = os.environ.get("DISCORD_WEBHOOK_URL")
@@ -23,7 +23,6 @@ redirect_to_ousd_dapp = RedirectView.as_view(url='https://ousd.com/', permanent=
 urlpatterns = [
     path("", core_views.dashboard),
     path("tx/debug/<slug:tx_hash>", core_views.tx_debug),
-    path("backfill_internal_transactions", core_views.backfill_internal_transactions),
     path("reports", core_views.reports),
     path("reports/monthly/<int:year>/<int:month>", core_views.report_monthly),
     path("reports/weekly/<int:year>/<int:week>", core_views.report_weekly),
@@ -44,8 +43,10 @@ urlpatterns = [
     path("reload", core_views.reload),
     path("snap", core_views.take_snapshot),
     path("fetch", core_views.fetch_transactions),
+    path("fetch_traces", core_views.fetch_transaction_traces),
     path("runtriggers", notify_views.run_triggers),
     path("notifygc", notify_views.gc),
+    path("metrics", core_views.metrics_export),
 
     path("api/v1/apr/trailing", core_views.api_apr_trailing),
     path("api/v1/apr/history", core_views.api_apr_history),
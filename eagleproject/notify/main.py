@@ -1,5 +1,7 @@
 from datetime import timedelta
 
+from core import metrics
+
 from notify.actions import execute_all_actions, create_actions_from_events
 from notify.events import seen_filter
 from notify.triggers import run_all_triggers
@@ -8,7 +10,8 @@ EVENT_DUPE_WINDOW_SECONDS = timedelta(seconds=3600)  # 1hr
 
 
 def run_all():
-    events = run_all_triggers()
-    events = seen_filter(events, since=EVENT_DUPE_WINDOW_SECONDS)
-    actions = create_actions_from_events(events)
-    execute_all_actions(actions)
+    with metrics.run(metrics.NOTIFY):
+        events = run_all_triggers()
+        events = seen_filter(events, since=EVENT_DUPE_WINDOW_SECONDS)
+        actions = create_actions_from_events(events)
+        execute_all_actions(actions)
@@ -30,6 +30,7 @@ from datetime import datetime, timedelta, timezone
 from importlib import import_module
 from django.db.models import Max
 
+from core.blockchain.events import decode_logs
 from core.logging import get_logger
 from core.models import (
     AssetBlock,
@@ -241,6 +242,10 @@ def run_all_triggers():
         ),
     }
 
+    # Triggers read decoded args.  New logs are decoded when stored, this
+    # only catches ones stored before that.
+    decode_logs(logs(transaction_cursor.block_number))
+
     for mod in mods:
         # Figure out the kwargs it wants
         func_spec = inspect.getfullargspec(mod.run_trigger)
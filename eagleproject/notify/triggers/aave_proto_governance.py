@@ -2,8 +2,6 @@
 import re
 from decimal import Decimal
 from django.db.models import Q
-from eth_utils import decode_hex, encode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import AAVE_PROTO_GOVERNANCE_V1
 from core.blockchain.const import BLOCKS_PER_DAY
@@ -87,25 +85,14 @@ def run_trigger(new_logs):
                 address proposalExecutor
             )
             """
-            proposal_id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
-            ipfs_hash = decode_single("(bytes32)", decode_hex(ev.topic_2))[0]
-            # proposal_type = decode_single(
-            #     "(bytes32)",
-            #     decode_hex(ev.topic_3)
-            # )[0]
-            (
-                proposition_power_of_creator,
-                threshold,
-                max_moves_to_voting_allowed,
-                voting_blocks_duration,
-                validating_blocks_duration,
-                proposal_executor,
-            ) = decode_single(
-                "(uint256,uint256,uint256,uint256,uint256,address)",
-                decode_hex(ev.data)
-            )
-
-            b58_ipfs_data = decode_ipfs_hash(encode_hex(ipfs_hash))
+            proposal_id = ev.args["proposal_id"]
+            ipfs_hash = ev.args["ipfs_hash"]
+            threshold = ev.args["threshold"]
+            voting_blocks_duration = ev.args["voting_blocks_duration"]
+            validating_blocks_duration = ev.args["validating_blocks_duration"]
+            proposal_executor = ev.args["proposal_executor"]
+
+            b58_ipfs_data = decode_ipfs_hash(ipfs_hash)
             ipfs_data = fetch_ipfs_json(b58_ipfs_data)
             prop_headers = parse_prop_headers(ipfs_data)
             aip = prop_headers.get('aip')
@@ -144,7 +131,7 @@ def run_trigger(new_logs):
                         2
                     ),
                     proposal_executor,
-                    decode_ipfs_hash(encode_hex(ipfs_hash)),
+                    decode_ipfs_hash(ipfs_hash),
                     aip_link,
                 ),
                 log_model=ev
@@ -152,7 +139,7 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_STATUS_CHANGE_TO_VALIDATING:
             # StatusChangeToValidating(uint256 indexed proposalId)
-            proposal_id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
+            proposal_id = ev.args["proposal_id"]
 
             events.append(event_high(
                 "Aave proposal moved to validating   🗳️ 🔍",
@@ -170,7 +157,7 @@ def run_trigger(new_logs):
                 uint256 movesToVoting
             )
             """
-            proposal_id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
+            proposal_id = ev.args["proposal_id"]
 
             events.append(event_high(
                 "Aave proposal moved to voting   🗳️ 📥",
@@ -182,7 +169,7 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_STATUS_CHANGE_TO_EXECUTED:
             """ StatusChangeToExecuted(uint256 indexed proposalId) """
-            proposal_id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
+            proposal_id = ev.args["proposal_id"]
 
             events.append(event_normal(
                 "Aave proposal has been resolved   🗳️ ⚙️",
@@ -201,10 +188,7 @@ def run_trigger(new_logs):
                 uint256 noVotingPower
             )
             """
-            proposal_id = decode_single(
-                "(uint256)",
-                decode_hex(ev.topic_1)
-            )[0]
+            proposal_id = ev.args["proposal_id"]
 
             events.append(event_high(
                 "Aave proposal has been passed   🗳️ ✅",
@@ -223,10 +207,7 @@ def run_trigger(new_logs):
                 uint256 noVotingPower
             )
             """
-            proposal_id = decode_single(
-                "(uint256)",
-                decode_hex(ev.topic_1)
-            )[0]
+            proposal_id = ev.args["proposal_id"]
 
             events.append(event_high(
                 "Aave proposal has failed   🗳️ ❎",
@@ -245,10 +226,7 @@ def run_trigger(new_logs):
                 uint256 noVotingPower
             )
             """
-            proposal_id = decode_single(
-                "(uint256)",
-                decode_hex(ev.topic_1)
-            )[0]
+            proposal_id = ev.args["proposal_id"]
 
             events.append(event_high(
                 "Aave proposal has failed by abstention   🗳️ 〰️",
@@ -2,7 +2,6 @@
 from datetime import datetime
 from django.db.models import Q
 from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import (
     CONTRACT_ADDR_TO_NAME,
@@ -64,20 +63,14 @@ def run_trigger(new_logs):
 
         if ev.topic_0 == SIG_EVENT_PROPOSAL_CREATED:
             # ProposalCreated(uint id, address proposer, address[] targets, uint[] values, string[] signatures, bytes[] calldatas, uint startBlock, uint endBlock, string description)
-            (
-                proposal_id,
-                proposer,
-                targets,
-                values,
-                signatures,
-                calldatas,
-                start_block,
-                end_block,
-                description
-            ) = decode_single(
-                "(uint256,address,address[],uint256[],string[],bytes[],uint256,uint256,string)",
-                decode_hex(ev.data)
-            )
+            proposal_id = ev.args["id"]
+            proposer = ev.args["proposer"]
+            targets = ev.args["targets"]
+            signatures = ev.args["signatures"]
+            calldatas = [decode_hex(x) for x in ev.args["calldatas"]]
+            start_block = ev.args["start_block"]
+            end_block = ev.args["end_block"]
+            description = ev.args["description"]
 
             details = create_prop_details(
                 proposal_id,
@@ -116,7 +109,7 @@ def run_trigger(new_logs):
             ))
 
         elif ev.topic_0 == SIG_EVENT_PROPOSAL_CANCELED:
-            proposal_id = decode_single("(uint256)", decode_hex(ev.data))[0]
+            proposal_id = ev.args["id"]
 
             events.append(event_high(
                 "Compound GovernorAlpha proposed cancelled   🗳️ ❌",
@@ -127,10 +120,8 @@ def run_trigger(new_logs):
             ))
 
         elif ev.topic_0 == SIG_EVENT_PROPOSAL_QUEUED:
-            proposal_id, eta_stamp = decode_single(
-                "(uint256,uint256)",
-                decode_hex(ev.data)
-            )
+            proposal_id = ev.args["id"]
+            eta_stamp = ev.args["eta"]
 
             eta = datetime.utcfromtimestamp(eta_stamp)
 
@@ -145,7 +136,7 @@ def run_trigger(new_logs):
             ))
 
         elif ev.topic_0 == SIG_EVENT_PROPOSAL_EXECUTED:
-            proposal_id = decode_single("(uint256)", decode_hex(ev.data))[0]
+            proposal_id = ev.args["id"]
 
             events.append(event_high(
                 "Compound GovernorAlpha proposed executed   🗳️ ⚙️",
@@ -160,15 +151,9 @@ def run_trigger(new_logs):
         #
         # elif ev.topic_0 == SIG_EVENT_VOTE_CAST:
         #     # VoteCast(address voter, uint proposalId, bool support, uint votes)
-        #     (
-        #         voter,
-        #         proposal_id,
-        #         support,
-        #         votes
-        #     ) = decode_single(
-        #         "(address,uint256,bool,uint256)",
-        #         decode_hex(ev.data)
-        #     )
+        #     voter = ev.args["voter"]
+        #     proposal_id = ev.args["proposal_id"]
+        #     support = ev.args["support"]
 
         #     events.append(event_low(
         #         "Compound GovernorAlpha vote   🗳️",
@@ -1,6 +1,4 @@
 """ Trigger for GovernorBravi implementation change """
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import COMPOUND_GOVERNOR_BRAVO
 from core.blockchain.sigs import SIG_EVENT_NEW_IMPLEMENTATION_BRAVO
@@ -21,10 +19,8 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        old_address, new_address = decode_single(
-            "(address,address)",
-            decode_hex(ev.data)
-        )
+        old_address = ev.args["old_implementation"]
+        new_address = ev.args["new_implementation"]
         new_link = 'https://etherscan.io/address/{}'.format(new_address)
 
         events.append(event_high(
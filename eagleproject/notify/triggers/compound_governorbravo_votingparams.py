@@ -1,8 +1,6 @@
 """ Trigger for GovernorBravo voting parameter change """
 from decimal import Decimal
 from django.db.models import Q
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import COMPOUND_GOVERNOR_BRAVO
 from core.blockchain.const import E_18
@@ -31,10 +29,8 @@ def run_trigger(new_logs):
 
     for ev in get_events(new_logs):
         if ev.topic_0 == SIG_EVENT_VOTING_DELAY_SET:
-            old_delay, new_delay = decode_single(
-                "(uint256,uint256)",
-                decode_hex(ev.data)
-            )
+            old_delay = ev.args["old_voting_delay"]
+            new_delay = ev.args["new_voting_delay"]
 
             events.append(event_normal(
                 "Compound GovernorBravo voting delay changed   🗳️ 🕖",
@@ -45,10 +41,8 @@ def run_trigger(new_logs):
             ))
 
         elif ev.topic_0 == SIG_EVENT_VOTING_PERIOD_SET:
-            old_period, new_period = decode_single(
-                "(uint256,uint256)",
-                decode_hex(ev.data)
-            )
+            old_period = ev.args["old_voting_period"]
+            new_period = ev.args["new_voting_period"]
 
             events.append(event_normal(
                 "Compound GovernorBravo voting delay changed   🗳️ 🕗",
@@ -59,10 +53,8 @@ def run_trigger(new_logs):
             ))
 
         elif ev.topic_0 == SIG_EVENT_PROPOSAL_THRESHOLD_SET:
-            old_threshold, new_threshold = decode_single(
-                "(uint256,uint256)",
-                decode_hex(ev.data)
-            )
+            old_threshold = ev.args["old_proposal_threshold"]
+            new_threshold = ev.args["new_proposal_threshold"]
 
             old_human = Decimal(old_threshold) / E_18
             new_human = Decimal(new_threshold) / E_18
@@ -1,7 +1,5 @@
 """ Trigger for timelock admin changes """
 from datetime import timedelta
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import COMPOUND_TIMELOCK
 from core.blockchain.sigs import SIG_EVENT_DELAY
@@ -20,7 +18,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        delay_seconds = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
+        delay_seconds = ev.args["new_delay"]
         delay = timedelta(seconds=delay_seconds)
 
         events.append(event_high(
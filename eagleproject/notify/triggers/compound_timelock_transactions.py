@@ -1,7 +1,6 @@
 """ Trigger for timelock transactions """
 from datetime import datetime
 from eth_utils import decode_hex
-from eth_abi import decode_single
 from django.db.models import Q
 
 from core.blockchain.addresses import CONTRACT_ADDR_TO_NAME, COMPOUND_TIMELOCK
@@ -42,12 +41,11 @@ def run_trigger(new_logs):
             action = "executed"
 
         # They all have the same args so most of thise can be reused
-        # tx_hash = decode_single("(bytes32)", decode_hex(ev.topic_1))[0]
-        target = decode_single("(address)", decode_hex(ev.topic_2))[0]
-        value, signature, data, eta_stamp = decode_single(
-            "(uint256,string,bytes,uint256)",
-            decode_hex(ev.data)
-        )
+        # tx_hash = ev.args["tx_hash"]
+        target = ev.args["target"]
+        signature = ev.args["signature"]
+        data = decode_hex(ev.args["data"])
+        eta_stamp = ev.args["eta"]
 
         eta = datetime.utcfromtimestamp(eta_stamp)
         call = decode_call(signature, data)
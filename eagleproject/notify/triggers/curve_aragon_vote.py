@@ -1,7 +1,5 @@
 from datetime import timedelta
 from django.db.models import Q
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import (
     CURVE_ARAGON_51,
@@ -46,18 +44,13 @@ def run_trigger(new_logs):
             #     uint256 totalSupply,
             #     uint256 creatorVotingPower
             # )
-            vote_id = decode_single('(uint256)', decode_hex(ev.topic_1))[0]
-            creator = decode_single('(address)', decode_hex(ev.topic_2))[0]
-            (
-                metadata_hash,
-                min_balance,
-                min_time,
-                total_supply,
-                creator_voting_power,
-            ) = decode_single(
-                "(string,uint256,uint256,uint256,uint256)",
-                decode_hex(ev.data)
-            )
+            vote_id = ev.args["vote_id"]
+            creator = ev.args["creator"]
+            metadata_hash = ev.args["metadata"]
+            min_balance = ev.args["min_balance"]
+            min_time = ev.args["min_time"]
+            total_supply = ev.args["total_supply"]
+            creator_voting_power = ev.args["creator_voting_power"]
 
             metadata = fetch_ipfs_json(
                 strip_terrible_ipfs_prefix(metadata_hash)
@@ -100,7 +93,7 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_EXECUTE_VOTE:
             # ExecuteVote(uint256 indexed voteId)
-            vote_id = decode_single('(uint256)', decode_hex(ev.topic_1))[0]
+            vote_id = ev.args["vote_id"]
 
             events.append(event_high(
                 "{} - Vote Executed ({})   🗳️ ⚙️".format(
@@ -125,11 +118,10 @@ def run_trigger(new_logs):
             #     bytes input,
             #     bytes returnData
             # )
-            executor = decode_single('(address)', decode_hex(ev.topic_1))[0]
-            # script, input_data, return_data = decode_single(
-            #     "(bytes,bytes,bytes)",
-            #     decode_hex(ev.data),
-            # )
+            executor = ev.args["executor"]
+            # script = ev.args["script"]
+            # input_data = ev.args["input"]
+            # return_data = ev.args["return_data"]
 
             """ TODO: Decode this further?  Right now I don't think it's worth
             the effort, though we're putting a bit of trust into the prop that
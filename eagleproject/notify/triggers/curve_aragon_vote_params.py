@@ -1,8 +1,6 @@
 from decimal import Decimal
 from datetime import timedelta
 from django.db.models import Q
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import (
     CURVE_ARAGON_51,
@@ -48,10 +46,7 @@ def run_trigger(new_logs):
 
         if ev.topic_0 == SIG_EVENT_CHANGE_SUPPORT_REQUIRED:
             # ChangeSupportRequired(uint64 supportRequiredPct)
-            support_required = decode_single(
-                '(uint64)',
-                decode_hex(ev.data)
-            )[0]
+            support_required = ev.args["support_required_pct"]
 
             events.append(event_high(
                 "{} - Support Required Changed   🎚️".format(
@@ -65,10 +60,7 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_CHANGE_MIN_QUORUM:
             # ChangeMinQuorum(uint64 minAcceptQuorumPct)
-            min_quorum = decode_single(
-                '(uint64)',
-                decode_hex(ev.data)
-            )[0]
+            min_quorum = ev.args["min_accept_quorum_pct"]
 
             events.append(event_normal(
                 "{} - Support Minimum Quorum   🎚️".format(
@@ -82,10 +74,7 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_MIN_BALANCE_SET:
             # MinimumBalanceSet(uint256 minBalance)
-            min_balance = decode_single(
-                '(uint256)',
-                decode_hex(ev.data)
-            )[0]
+            min_balance = ev.args["min_balance"]
 
             events.append(event_normal(
                 "{} - Minimum Balance   🎚️".format(
@@ -100,10 +89,7 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_MIN_TIME_SET:
             # MinimumTimeSet(uint256 minTime)
-            min_time = decode_single(
-                '(uint256)',
-                decode_hex(ev.data)
-            )[0]
+            min_time = ev.args["min_time"]
 
             events.append(event_normal(
                 "{} - Minimum Time   🕓".format(
@@ -118,18 +104,9 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_SET_APP:
             # SetApp(bytes32 indexed namespace, bytes32 indexed appId, address app)
-            namespace = decode_single(
-                '(bytes32)',
-                decode_hex(ev.topic_1)
-            )[0]
-            app_id = decode_single(
-                '(bytes32)',
-                decode_hex(ev.topic_1)
-            )[0]
-            app_address = decode_single(
-                '(address)',
-                decode_hex(ev.data)
-            )[0]
+            namespace = ev.args["namespace"]
+            app_id = ev.args["app_id"]
+            app_address = ev.args["app"]
 
             events.append(event_high(
                 "{} - New App Set   📛".format(
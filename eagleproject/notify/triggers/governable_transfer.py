@@ -1,7 +1,5 @@
 """ Governable transfers of governorship """
 from django.db.models import Q
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.sigs import SIG_EVENT_PENDING_TRANSFER, SIG_EVENT_TRANSFER
 from notify.events import event_high
@@ -20,8 +18,8 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        former_governor = decode_single('(address)', decode_hex(ev.topic_1))[0]
-        new_governor = decode_single('(address)', decode_hex(ev.topic_2))[0]
+        former_governor = ev.args["previous_governor"]
+        new_governor = ev.args["new_governor"]
 
         if ev.topic_0 == SIG_EVENT_PENDING_TRANSFER:
             events.append(event_high(
@@ -1,35 +1,26 @@
 from datetime import datetime
-from eth_hash.auto import keccak
-from eth_abi import decode_single
-from eth_utils import encode_hex, decode_hex
+from eth_utils import decode_hex
 from django.db.models import Q
 from core.blockchain.addresses import CONTRACT_ADDR_TO_NAME
 from core.blockchain.decode import decode_calls
+from core.blockchain.sigs import (
+    SIG_EVENT_GOVERNOR_PROPOSAL_CREATED,
+    SIG_EVENT_GOVERNOR_PROPOSAL_CANCELLED,
+    SIG_EVENT_PROPOSAL_QUEUED,
+    SIG_EVENT_PROPOSAL_EXECUTED,
+)
 from notify.events import event_high
 
-
-SIG_EVENT_PROPOSAL_CREATED = encode_hex(
-    keccak(
-        b"ProposalCreated(uint256,address,address[],string[],bytes[],string)"
-    )
-)
-SIG_EVENT_PROPOSAL_QUEUED = encode_hex(
-    keccak(b"ProposalQueued(uint256,uint256)")
-)
-SIG_EVENT_PROPOSAL_EXECUTED = encode_hex(keccak(b"ProposalExecuted(uint256)"))
-SIG_EVENT_PROPOSAL_CANCELLED = encode_hex(
-    keccak(b"ProposalCancelled(uint256)")
-)
 HUMAN_DATETIME_FORMAT = '%A, %B %e, %Y @ %H:%M UTC'
 
 
 def get_proposal_events(logs):
     """ Get Mint/Redeem events """
     return logs.filter(
-        Q(topic_0=SIG_EVENT_PROPOSAL_CREATED)
+        Q(topic_0=SIG_EVENT_GOVERNOR_PROPOSAL_CREATED)
         | Q(topic_0=SIG_EVENT_PROPOSAL_QUEUED)
         | Q(topic_0=SIG_EVENT_PROPOSAL_EXECUTED)
-        | Q(topic_0=SIG_EVENT_PROPOSAL_CANCELLED)
+        | Q(topic_0=SIG_EVENT_GOVERNOR_PROPOSAL_CANCELLED)
     ).order_by('block_number')
 
 
@@ -38,18 +29,13 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_proposal_events(new_logs):
-        if ev.topic_0 == SIG_EVENT_PROPOSAL_CREATED:
-            (
-                proposal_id,
-                proposer,
-                targets,
-                signatures,
-                calldatas,
-                description
-            ) = decode_single(
-                '(uint256,address,address[],string[],bytes[],string)',
-                decode_hex(ev.data)
-            )
+        if ev.topic_0 == SIG_EVENT_GOVERNOR_PROPOSAL_CREATED:
+            proposal_id = ev.args["id"]
+            proposer = ev.args["proposer"]
+            targets = ev.args["targets"]
+            signatures = ev.args["signatures"]
+            calldatas = [decode_hex(x) for x in ev.args["calldatas"]]
+            description = ev.args["description"]
 
             title = "New Proposal   🗳️"
             details = (
@@ -70,10 +56,8 @@ def run_trigger(new_logs):
             )
 
         elif ev.topic_0 == SIG_EVENT_PROPOSAL_QUEUED:
-            (proposal_id, eta_seconds) = decode_single(
-                '(uint256,uint256)',
-                decode_hex(ev.data)
-            )
+            proposal_id = ev.args["id"]
+            eta_seconds = ev.args["eta"]
             eta = datetime.utcfromtimestamp(eta_seconds)
 
             title = "Proposal Queued   🗳️ ✔️"
@@ -83,12 +67,12 @@ def run_trigger(new_logs):
             )
 
         elif ev.topic_0 == SIG_EVENT_PROPOSAL_EXECUTED:
-            (proposal_id,) = decode_single('(uint256)', decode_hex(ev.data))
+            proposal_id = ev.args["id"]
             title = "Proposal Executed   🗳️ ⚙️"
             details = "Prop {} was executed.".format(proposal_id)
 
-        elif ev.topic_0 == SIG_EVENT_PROPOSAL_CANCELLED:
-            (proposal_id,) = decode_single('(uint256)', decode_hex(ev.data))
+        elif ev.topic_0 == SIG_EVENT_GOVERNOR_PROPOSAL_CANCELLED:
+            proposal_id = ev.args["id"]
             title = "Proposal Cancelled   🗳️ ❌"
             details = "Prop {} was cancelled.".format(proposal_id)
 
@@ -1,5 +1,3 @@
-from eth_abi import decode_single
-from eth_utils import decode_hex
 from django.db.models import Q
 from core.common import format_token_human
 from core.blockchain.const import OUSD_KEEPER_UPKEEP_ID
@@ -37,10 +35,10 @@ def run_trigger(new_logs):
                 bytes performData
             );
             """
-            _id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
-            success = decode_single("(bool)", decode_hex(ev.topic_2))[0]
-            from_address = decode_single("(address)", decode_hex(ev.topic_3))[0]
-            payment, _ = decode_single("(uint96,bytes)", decode_hex(ev.data))
+            _id = ev.args["id"]
+            success = ev.args["success"]
+            from_address = ev.args["from"]
+            payment = ev.args["payment"]
 
             if _id != OUSD_KEEPER_UPKEEP_ID:
                 continue
@@ -65,8 +63,8 @@ def run_trigger(new_logs):
                 uint64 indexed atBlockHeight
             );
             """
-            _id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
-            block_number = decode_single("(uint64)", decode_hex(ev.topic_2))[0]
+            _id = ev.args["id"]
+            block_number = ev.args["at_block_height"]
 
             if _id != OUSD_KEEPER_UPKEEP_ID:
                 continue
@@ -88,9 +86,9 @@ def run_trigger(new_logs):
                 uint96 amount
             );
             """
-            _id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
-            from_address = decode_single("(address)", decode_hex(ev.topic_2))[0]
-            amount = decode_single("(uint96)", decode_hex(ev.data))[0]
+            _id = ev.args["id"]
+            from_address = ev.args["from"]
+            amount = ev.args["amount"]
 
             if _id != OUSD_KEEPER_UPKEEP_ID:
                 continue
@@ -114,10 +112,9 @@ def run_trigger(new_logs):
                 address to
             );
             """
-            _id = decode_single("(uint256)", decode_hex(ev.topic_1))[0]
-            amount, to_address = decode_single(
-                "(uint256,address)", decode_hex(ev.data)
-            )
+            _id = ev.args["id"]
+            amount = ev.args["amount"]
+            to_address = ev.args["to"]
 
             if _id != OUSD_KEEPER_UPKEEP_ID:
                 continue
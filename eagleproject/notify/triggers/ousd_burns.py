@@ -15,10 +15,7 @@ def get_tx_logs(tx_hash):
 
 
 def is_redeem(transfer):
-    """ Check if a transfer tx is part of a redeem
-
-    NOTE: event_name on the Log model is not currently populated
-    """
+    """ Check if a transfer tx is part of a redeem """
     tx_hash = str(transfer.tx_hash_id)
     logs = get_tx_logs(tx_hash)
     return any(map(lambda l: l.topic_0 == SIG_EVENT_REDEEM, logs))
@@ -1,6 +1,4 @@
 from decimal import Decimal
-from eth_abi import decode_single
-from eth_utils import decode_hex
 from django.db.models import Q
 from core.common import format_ousd_human
 from core.blockchain.sigs import SIG_EVENT_MINT, SIG_EVENT_REDEEM
@@ -21,7 +19,7 @@ def run_trigger(new_logs):
 
     for ev in get_mint_redeem_events(new_logs):
         is_mint = ev.topic_0 == SIG_EVENT_MINT
-        addr, value = decode_single('(address,uint256)', decode_hex(ev.data))
+        value = ev.args["value"]
 
         events.append(
             event_normal(
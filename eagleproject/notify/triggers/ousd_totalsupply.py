@@ -1,6 +1,4 @@
 from decimal import Decimal
-from eth_abi import decode_single
-from eth_utils import decode_hex
 from django.db.models import Q
 from core.common import format_ousd_human
 from core.blockchain.addresses import OUSD
@@ -58,11 +56,7 @@ def run_trigger(new_logs):
         if has_mint_or_burn(new_logs, ev.transaction_hash):
             continue
 
-        (
-            total_supply,
-            rebasing_credits,
-            rebasing_credits_per_token,
-        ) = decode_single("(uint256,uint256,uint256)", decode_hex(ev.data))
+        total_supply = ev.args["total_supply"]
 
         total_supply_converted = Decimal(total_supply) / E_18
         prev_total_supply = totalSupply(OUSD, 18, block=ev.block_number - 1)
@@ -1,7 +1,4 @@
 """ Proxy upgrades """
-from eth_utils import decode_hex
-from eth_abi import decode_single
-
 from core.blockchain.addresses import CONTRACT_ADDR_TO_NAME
 from core.blockchain.sigs import SIG_EVENT_UPGRADED
 from notify.events import event_high
@@ -17,7 +14,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        implementation = decode_single('(address)', decode_hex(ev.topic_1))[0]
+        implementation = ev.args["implementation"]
         contract = CONTRACT_ADDR_TO_NAME.get(ev.address, ev.address)
 
         events.append(event_high(
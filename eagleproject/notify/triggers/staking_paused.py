@@ -1,7 +1,5 @@
-from eth_abi import decode_single
 from core.blockchain.addresses import OGN_STAKING
 from core.blockchain.sigs import SIG_EVENT_STAKING_PAUSED
-from core.blockchain.const import TRUE_256BIT
 from notify.events import event_high
 
 EVENT_TAGS = ['ogn']
@@ -19,8 +17,8 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_pause_events(new_logs):
-        address = decode_single("(address)", ev.topic_1)
-        is_pause = ev.data == TRUE_256BIT
+        address = ev.args["user"]
+        is_pause = ev.args["yes"]
 
         events.append(
             event_high(
@@ -1,15 +1,9 @@
 from datetime import timedelta
 from decimal import Decimal
-from eth_hash.auto import keccak
-from eth_utils import encode_hex, decode_hex
-from eth_abi import decode_single
+from core.blockchain.sigs import SIG_EVENT_NEW_DURATIONS, SIG_EVENT_NEW_RATES
 from notify.events import event_high
 
 EVENT_TAGS = ['ogn']
-SIG_EVENT_NEW_DURATIONS = encode_hex(
-    keccak(b"NewDurations(address,uint256[])")
-)
-SIG_EVENT_NEW_RATES = encode_hex(keccak(b"NewRates(address,uint256[])"))
 DAYS_365_SECONDS = 31536000
 
 
@@ -35,11 +29,8 @@ def run_trigger(new_logs):
 
     for ev in get_rates_events(new_logs):
         duration_event = get_durations_event(new_logs, ev.transaction_hash)
-        (rates,) = decode_single("(uint256[])", decode_hex(ev.data))
-        (durations,) = decode_single(
-            "(uint256[])",
-            decode_hex(duration_event.data)
-        )
+        rates = ev.args["rates"]
+        durations = duration_event.args["durations"]
 
         durations_string = ""
 
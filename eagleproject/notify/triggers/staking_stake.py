@@ -1,7 +1,5 @@
 from datetime import timedelta
 from decimal import Decimal
-from eth_abi import decode_single
-from eth_utils import decode_hex
 from django.db.models import Q
 from core.common import format_ousd_human
 from core.models import OgnStaked
@@ -46,7 +44,7 @@ def run_trigger(new_logs):
         ):
             is_staked = ev.topic_0 == DEPRECATED_SIG_EVENT_STAKED
 
-            (amount,) = decode_single('(uint256)', decode_hex(ev.data))
+            amount = ev.args["amount"]
 
             events.append(
                 event_normal(
@@ -62,10 +60,9 @@ def run_trigger(new_logs):
         elif ev.topic_0 == SIG_EVENT_STAKED:
             verb = 'staked'
 
-            amount, duration, rate = decode_single(
-                '(uint256,uint256,uint256)',
-                decode_hex(ev.data)
-            )
+            amount = ev.args["amount"]
+            duration = ev.args["duration"]
+            rate = ev.args["rate"]
             stakes = OgnStaked.objects.filter(tx_hash=ev.transaction_hash)
 
             # There should be a stake in the DB
@@ -101,10 +98,7 @@ def run_trigger(new_logs):
                 )
             )
         elif ev.topic_0 == SIG_EVENT_WITHDRAWN:
-            amount,staked_amount = decode_single(
-                '(uint256,uint256)',
-                decode_hex(ev.data)
-            )
+            amount = ev.args["amount"]
 
             events.append(
                 event_normal(
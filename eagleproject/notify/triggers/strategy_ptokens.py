@@ -5,8 +5,6 @@ Events:
 - PTokenRemoved(address indexed _asset, address _pToken);
 """
 from django.db.models import Q
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import CONTRACT_ADDR_TO_NAME
 from core.blockchain.const import SYMBOL_FOR_CONTRACT
@@ -30,8 +28,8 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        asset = decode_single('(address)', decode_hex(ev.topic_1))[0]
-        ptoken = decode_single('(address)', decode_hex(ev.data))[0]
+        asset = ev.args["asset"]
+        ptoken = ev.args["p_token"]
 
         asset_name = SYMBOL_FOR_CONTRACT.get(asset, asset)
         contract_name = CONTRACT_ADDR_TO_NAME.get(ev.address, ev.address)
@@ -3,8 +3,6 @@
 Events:
 - RewardTokenCollected(address recipient, uint256 amount)
 """
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import (
     STRATAAVEDAI,
@@ -31,9 +29,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        recipient, amount = decode_single(
-            "(address,uint256)", decode_hex(ev.data)
-        )
+        amount = ev.args["amount"]
 
         if amount == 0:
             continue
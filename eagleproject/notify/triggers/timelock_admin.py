@@ -1,7 +1,5 @@
 """ Trigger for timelock admin changes """
 from django.db.models import Q
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.addresses import TIMELOCK
 from core.blockchain.sigs import (
@@ -24,7 +22,10 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        admin_address = decode_single("(address)", decode_hex(ev.topic_1))[0]
+        admin_address = ev.args.get(
+            "new_admin",
+            ev.args.get("new_pending_admin")
+        )
 
         if ev.topic_0 == SIG_EVENT_NEW_ADMIN:
             events.append(event_high(
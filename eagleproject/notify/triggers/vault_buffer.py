@@ -1,7 +1,5 @@
 """ Vault buffer related events """
 from decimal import Decimal
-from eth_utils import decode_hex
-from eth_abi import decode_single
 from core.blockchain.sigs import SIG_EVENT_BUFFER_UPDATE
 from notify.events import event_normal
 
@@ -18,10 +16,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        buffer_percent_bigint = decode_single(
-            '(uint256)',
-            decode_hex(ev.data)
-        )[0]
+        buffer_percent_bigint = ev.args["vault_buffer"]
 
         events.append(
             event_normal(
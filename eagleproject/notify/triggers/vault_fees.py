@@ -1,7 +1,5 @@
 """ Vault fee related events """
 from decimal import Decimal
-from eth_utils import decode_hex
-from eth_abi import decode_single
 from core.blockchain.sigs import SIG_EVENT_REDEEM_FEE
 from notify.events import event_normal
 
@@ -19,7 +17,7 @@ def run_trigger(new_logs):
 
     for ev in get_events(new_logs):
         # Basis points in 18 decimal bigint
-        bps_int = decode_single('(uint256)', decode_hex(ev.data))[0]
+        bps_int = ev.args["redeem_fee_bps"]
         bps = Decimal(bps_int) / Decimal(10000)
 
         events.append(event_normal(
@@ -1,5 +1,3 @@
-from eth_utils import decode_hex
-from eth_abi import decode_single
 from core.blockchain.sigs import SIG_EVENT_ASSET_SUPPORTED
 from notify.events import event_high
 
@@ -16,7 +14,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_asset_events(new_logs):
-        asset_address = decode_single('(address)', decode_hex(ev.data))[0]
+        asset_address = ev.args["asset"]
         events.append(
             event_high(
                 "New asset supported    🆕",
@@ -1,6 +1,4 @@
 """ Vault fee related events """
-from eth_utils import decode_hex
-from eth_abi import decode_single
 from core.blockchain.sigs import SIG_EVENT_PRICE_PROVIDER
 from notify.events import event_normal
 
@@ -18,7 +16,7 @@ def run_trigger(new_logs):
 
     for ev in get_events(new_logs):
         # Basis points in 18 decimal bigint
-        oracle_address = decode_single('(address)', decode_hex(ev.data))[0]
+        oracle_address = ev.args["price_provider"]
 
         events.append(event_normal(
             "Vault Oracle Changed   🧙",
@@ -1,5 +1,3 @@
-from eth_abi import decode_single
-from eth_utils import decode_hex
 from django.db.models import Q
 
 from core.blockchain.const import SYMBOL_FOR_CONTRACT
@@ -34,7 +32,8 @@ def run_trigger(new_logs):
 
         if ev.topic_0 == SIG_EVENT_DEFAULT_STRATEGY:
             title = 'Asset Default Strategy Set   ♟️'
-            asset, strat_addr = decode_single('(address,address)', decode_hex(ev.data))
+            asset = ev.args["asset"]
+            strat_addr = ev.args["strategy"]
             description = (
                 'New default strategy for {} has been set to {}'
             ).format(
@@ -44,27 +43,25 @@ def run_trigger(new_logs):
 
         elif ev.topic_0 == SIG_EVENT_STRATEGY_APPROVED:
             title = 'Strategy Added To Vault    🏦♟️'
-            strat_addr = decode_single('(address)', decode_hex(ev.data))
+            strat_addr = ev.args["addr"]
             description = 'New strategy {} has been added to the vault'.format(
                 strat_addr,
             )
 
         elif ev.topic_0 == SIG_EVENT_STRATEGY_ADDED:
             title = 'Strategy Added   ♘'
-            strat_addr = decode_single('(address)', decode_hex(ev.data))
+            strat_addr = ev.args["addr"]
             description = 'https://etherscan.io/address/{}'.format(strat_addr)
 
         elif ev.topic_0 == SIG_EVENT_STRATEGY_REMOVED:
             title = 'Strategy Removed   ♞'
-            strat_addr = decode_single('(address)', decode_hex(ev.data))
+            strat_addr = ev.args["addr"]
             description = 'https://etherscan.io/address/{}'.format(strat_addr)
 
         elif ev.topic_0 == SIG_EVENT_WEIGHTS_UPDATED:
             title = 'Strategy Weights Updated   ⚖️'
-            addresses, weights = decode_single(
-                '(address[],uint256[])',
-                decode_hex(ev.data)
-            )
+            addresses = ev.args["assets"]
+            weights = ev.args["weights"]
             for i, address in enumerate(addresses):
                 description += '\n{} {}'.format(address, weights[i])
 
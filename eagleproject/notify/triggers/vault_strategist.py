@@ -1,7 +1,4 @@
 """ Vault UnswapUpdated event trigger """
-from eth_utils import decode_hex
-from eth_abi import decode_single
-
 from core.blockchain.sigs import SIG_EVENT_STRATEGIST
 from notify.events import event_normal
 
@@ -16,7 +13,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        address = decode_single('(address)', decode_hex(ev.data))[0]
+        address = ev.args["addr"]
 
         events.append(event_normal(
             "Vault Strategist Changed   🕴️",
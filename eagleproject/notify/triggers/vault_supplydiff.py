@@ -1,7 +1,5 @@
 """ Vault UnswapUpdated event trigger """
 from decimal import Decimal
-from eth_utils import decode_hex
-from eth_abi import decode_single
 
 from core.blockchain.sigs import SIG_EVENT_MAX_SUPPLY_DIFF
 from notify.events import event_high
@@ -17,7 +15,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        diff = decode_single('(uint256)', decode_hex(ev.data))[0]
+        diff = ev.args["max_supply_diff"]
 
         events.append(event_high(
             "Vault Max Supply Differential Changed   🔢",
@@ -1,6 +1,4 @@
 """ Vault fee related events """
-from eth_utils import decode_hex
-from eth_abi import decode_single
 from django.db.models import Q
 
 from core.blockchain.sigs import (
@@ -23,7 +21,7 @@ def run_trigger(new_logs):
     events = []
 
     for ev in get_events(new_logs):
-        threshold = decode_single('(uint256)', decode_hex(ev.data))[0]
+        threshold = ev.args["threshold"]
 
         if ev.topic_0 == SIG_EVENT_ALLOCATE_THRESHOLD:
             events.append(event_normal(
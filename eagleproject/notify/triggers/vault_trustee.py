@@ -1,7 +1,5 @@
 from decimal import Decimal
 
-from eth_abi import decode_single
-from eth_utils import decode_hex
 from django.db.models import Q
 
 from core.blockchain.addresses import VAULT
@@ -29,10 +27,9 @@ def run_trigger(new_logs):
 
     for ev in get_pause_events(new_logs):
         if ev.topic_0 == SIG_EVENT_YIELD_DISTRIBUTION:
-            trustee, yield_amount, fee = decode_single(
-                "(address,uint256,uint256)",
-                decode_hex(ev.data)
-            )
+            trustee = ev.args["to"]
+            yield_amount = ev.args["yield"]
+            fee = ev.args["fee"]
 
             events.append(
                 event_low(
@@ -49,7 +46,7 @@ def run_trigger(new_logs):
             )
 
         elif ev.topic_0 == SIG_EVENT_TRUSTEE_ADDRESS_CHANGED:
-            trustee = decode_single("(address)", decode_hex(ev.data))[0]
+            trustee = ev.args["addr"]
 
             events.append(
                 event_low(
@@ -60,7 +57,7 @@ def run_trigger(new_logs):
             )
 
         elif ev.topic_0 == SIG_EVENT_TRUSTEE_FEE_CHANGED:
-            bps = decode_single("(uint256)", decode_hex(ev.data))[0]
+            bps = ev.args["bps"]
 
             events.append(
                 event_low(
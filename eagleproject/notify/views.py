@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.http import HttpResponse
 
 from core.logging import get_logger
@@ -9,6 +10,9 @@ log = get_logger(__name__)
 
 
 def run_triggers(request):
+    if settings.CHAIN_FOLLOWER:
+        # Done by the follow_chain command
+        return HttpResponse("ok")
     run_all()
     return HttpResponse("ok")
 